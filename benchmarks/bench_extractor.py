@@ -0,0 +1,77 @@
+"""
+Micro-benchmark: extrator rápido (home/extractors.py) vs. parse com
+BeautifulSoup (home.extractors.parse_watch_page_soup) em páginas salvas.
+
+Uso:
+    python benchmarks/bench_extractor.py [pagina.html ...] [--repeat N]
+
+Sem arquivos, gera uma página sintética de ~1 MB parecida com a do YouTube.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yt_transcription.settings')
+
+import django
+
+django.setup()
+
+from home.extractors import extract_watch_page, parse_watch_page_soup
+
+
+def synthetic_page(size=1_000_000):
+    player_response = {
+        "videoDetails": {"videoId": "dQw4w9WgXcQ", "title": "Vídeo de teste"},
+        "microformat": {"description": "chaves {dentro} de strings"},
+        "captions": {"playerCaptionsTracklistRenderer": {"captionTracks": [
+            {"baseUrl": "https://www.youtube.com/api/timedtext?v=dQw4w9WgXcQ&lang=pt", "languageCode": "pt"},
+            {"baseUrl": "https://www.youtube.com/api/timedtext?v=dQw4w9WgXcQ&lang=en", "languageCode": "en"},
+        ]}},
+    }
+    filler = '<div class="style-scope ytd-app"><span>conteúdo</span></div>\n'
+    parts = [
+        '<html><head><meta property="og:title" content="Vídeo de teste &amp; benchmark">',
+        '<script>var ytcfg = {"x": 1};</script></head><body>',
+    ]
+    parts.append(filler * (size // 2 // len(filler)))
+    parts.append(f'<script>var ytInitialPlayerResponse = {json.dumps(player_response)};var meta = 1;</script>')
+    parts.append('<script>var ytInitialData = {"dateText": {"simpleText": "Enviado em 1 de jan. de 2024"}};</script>')
+    parts.append(filler * (size // 2 // len(filler)))
+    parts.append('</body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def bench(func, content, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pages', nargs='*')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = [(path, open(path, 'rb').read()) for path in args.pages]
+    if not pages:
+        pages = [('<sintética>', synthetic_page())]
+
+    for name, content in pages:
+        fast = bench(extract_watch_page, content, args.repeat)
+        soup = bench(parse_watch_page_soup, content, args.repeat)
+        print(f"{name} ({len(content) / 1024:.0f} KB): "
+              f"rápido {fast * 1000:.2f} ms | BeautifulSoup {soup * 1000:.2f} ms | {soup / fast:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
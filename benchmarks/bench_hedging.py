@@ -0,0 +1,103 @@
+"""
+Latência de cauda por vídeo com e sem hedge (home/hedging.py), contra o
+stub com uma fração de respostas lentas injetadas. Vários clientes pedem
+um vídeo por vez (como a view com uma URL) e o relatório traz p50/p95/p99
+de cada modo. Com --budget, uma última rodada mostra os vídeos que saem
+como "tempo esgotado" em vez de segurar a resposta.
+
+Uso:
+    python benchmarks/bench_hedging.py --slow-ratio 0.02 --slow-latency 2
+    python benchmarks/bench_hedging.py --slow-ratio 0.05 --slow-latency 5 --budget 1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yt_transcription.settings')
+# Limites do upstream abertos: o que se mede é a cauda do próprio upstream
+os.environ.setdefault('UPSTREAM_RATE_PER_HOST', '100000')
+os.environ.setdefault('UPSTREAM_BURST_PER_HOST', '100000')
+os.environ.setdefault('UPSTREAM_CONCURRENCY_INITIAL', '1000')
+os.environ.setdefault('UPSTREAM_CONCURRENCY_MAX', '1000')
+
+import django
+
+django.setup()
+
+from home.engine import FetchEngine
+from home.http_client import close_shared_async_client
+from home.hedging import hedging
+
+from stub_server import start_stub_server, add_stub_arguments, stub_options
+
+
+def percentile(ordered, p):
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3) if ordered else None
+
+
+async def measure(base_url, tag, clients, requests_per_client, **engine_options):
+    latencies, timed_out = [], 0
+
+    async def client(n):
+        nonlocal timed_out
+        for i in range(requests_per_client):
+            url = f"{base_url}/watch?v={tag}c{n}r{i}"
+            start = time.perf_counter()
+            async for result in FetchEngine(**engine_options).run([url]):
+                timed_out += result.timed_out
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    await close_shared_async_client()
+    latencies.sort()
+    return {
+        'videos': len(latencies),
+        'timed_out': timed_out,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': round(latencies[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50, help='vídeos por cliente')
+    parser.add_argument('--budget', type=float, default=None, help='orçamento por vídeo na última rodada')
+    add_stub_arguments(parser)
+    parser.set_defaults(latency=0.05, jitter=0.02, slow_ratio=0.02, slow_latency=2.0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    server = start_stub_server(**stub_options(args))
+    run = f"h{os.getpid()}x{int(time.time())}"
+    report = {'slow_ratio': args.slow_ratio, 'slow_latency': args.slow_latency}
+    try:
+        # Aquecimento: o limiar do hedge vem das latências observadas
+        asyncio.run(measure(server.base_url, f"{run}w", args.clients, 5))
+        for mode, enabled in (('sem_hedge', False), ('com_hedge', True)):
+            hedging.enabled = enabled
+            before = hedging.stats()
+            report[mode] = asyncio.run(measure(server.base_url, f"{run}{mode}", args.clients, args.requests))
+            after = hedging.stats()
+            report[mode]['hedges'] = after['sent'] - before['sent']
+            report[mode]['hedge_wins'] = after['won'] - before['won']
+        report['thresholds'] = hedging.stats()['thresholds']
+        if args.budget:
+            hedging.enabled = False
+            report['orcamento'] = asyncio.run(measure(
+                server.base_url, f"{run}b", args.clients, args.requests, budget=args.budget))
+    finally:
+        server.shutdown()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
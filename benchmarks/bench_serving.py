@@ -0,0 +1,167 @@
+"""
+Mede um worker do gunicorn servindo a página principal contra o upstream
+lento (stub_server.py --fixtures com latência): tempo de boot do worker
+(do processo até o primeiro GET / respondido), tempo de import da
+aplicação e quantas transcrições um único worker atende por segundo com
+vários clientes ao mesmo tempo.
+
+Uso:
+    python benchmarks/bench_serving.py --server wsgi
+    python benchmarks/bench_serving.py --server asgi --clients 50 --latency 1
+
+'wsgi' é o worker síncrono (yt_transcription.wsgi); 'asgi' é o worker do
+uvicorn com a view assíncrona (yt_transcription.asgi). DATABASE_URL precisa
+apontar para um banco migrado.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+SERVERS = {
+    'wsgi': ['yt_transcription.wsgi:application'],
+    'asgi': ['yt_transcription.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_env(server):
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = 'bench_settings'
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, BENCH_DIR, env.get('PYTHONPATH')]))
+    env['TRANSCRIPT_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench-cache-')
+    # Limites do upstream abertos: o que se mede é o modelo do worker
+    env.setdefault('UPSTREAM_RATE_PER_HOST', '100000')
+    env.setdefault('UPSTREAM_BURST_PER_HOST', '100000')
+    env.setdefault('UPSTREAM_CONCURRENCY_INITIAL', '1000')
+    env.setdefault('UPSTREAM_CONCURRENCY_MAX', '1000')
+    if server == 'wsgi':
+        env.pop('ASYNC_VIEWS', None)
+    return env
+
+
+def import_seconds(server):
+    # Só o import da aplicação + URLconf (o que um worker faz antes de servir)
+    code = (
+        "import time; start = time.perf_counter()\n"
+        f"import yt_transcription.{server}\n"
+        "import home.urls\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', code], env=server_env(server), text=True)
+    return round(float(output.strip().splitlines()[-1]), 3)
+
+
+def start_server(server, port, workers=1, log=None):
+    command = [sys.executable, '-m', 'gunicorn', *SERVERS[server],
+               '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--timeout', '300', '--log-level', 'warning']
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=server_env(server), cwd=ROOT_DIR, stdout=log, stderr=log)
+    url = f'http://127.0.0.1:{port}/'
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'servidor {server} terminou com código {process.returncode}')
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    response.read()
+            except urllib.error.HTTPError:
+                pass  # respondeu: o worker está de pé
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                time.sleep(0.01)
+                continue
+            return process, round(time.perf_counter() - started, 3)
+    except BaseException:
+        # Sem deixar o gunicorn órfão quando o boot falha ou é interrompido
+        process.kill()
+        process.wait()
+        raise
+
+
+def load(port, base_url, clients, requests_per_client):
+    # Cada cliente pede um vídeo diferente por vez, sem cache
+    run = f"{os.getpid()}x{int(time.time())}"
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(n):
+        for i in range(requests_per_client):
+            body = urllib.parse.urlencode({'video_url': f'{base_url}/watch?v=short-{run}c{n}r{i}'}).encode()
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', data=body, timeout=300) as response:
+                    response.read()
+                    ok = response.headers.get('Content-Disposition') is not None
+            except Exception as e:
+                ok = False
+                with lock:
+                    errors.append(str(e))
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': clients * requests_per_client,
+        'ok': len(latencies),
+        'errors': len(errors),
+        'elapsed': round(elapsed, 3),
+        'requests_per_sec': round(len(latencies) / elapsed, 2),
+        'latency_p50': round(latencies[len(latencies) // 2], 3) if latencies else None,
+        'latency_max': round(latencies[-1], 3) if latencies else None,
+    }
+
+
+def main():
+    sys.path.insert(0, BENCH_DIR)
+    from stub_server import start_stub_server, add_stub_arguments, stub_options
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server', choices=sorted(SERVERS), default='asgi')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=3, help='requisições por cliente')
+    add_stub_arguments(parser)
+    parser.set_defaults(latency=0.5, page_size=20_000)
+    args = parser.parse_args()
+
+    args.fixtures = True
+    stub = start_stub_server(**stub_options(args))
+    port = free_port()
+    report = {'server': args.server, 'clients': args.clients, 'upstream_latency': args.latency,
+              'import_seconds': import_seconds(args.server)}
+    process, report['boot_seconds'] = start_server(args.server, port)
+    try:
+        report.update(load(port, stub.base_url, args.clients, args.requests))
+    finally:
+        process.terminate()
+        process.wait()
+        stub.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+# Settings dos benchmarks que sobem o servidor de verdade (bench_serving.py):
+# HTTP simples em 127.0.0.1, sem o redirecionamento para HTTPS.
+from yt_transcription.settings import *  # noqa: F401,F403
+
+SECURE_SSL_REDIRECT = False
+# Sem depender do collectstatic (manifesto do whitenoise) para o GET /
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+ALLOWED_HOSTS = ['*']
+# O "*" do settings não passa nas checagens dos comandos (manage.py worker)
+CSRF_TRUSTED_ORIGINS = ['http://127.0.0.1']
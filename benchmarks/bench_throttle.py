@@ -0,0 +1,62 @@
+"""
+Roda o engine contra o stub com throttling injetado e mostra como o
+controlador AIMD (home/throttle.py) ajusta o limite de concorrência.
+
+Uso:
+    python benchmarks/bench_throttle.py --videos 300 --max-rps 40 --retry-after 0.5
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yt_transcription.settings')
+
+import django
+
+django.setup()
+
+from home.engine import iter_transcripts
+from home.throttle import upstream
+
+from stub_server import start_stub_server, add_stub_arguments, stub_options
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--videos', type=int, default=300)
+    parser.add_argument('--interval', type=float, default=0.5)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    server = start_stub_server(**stub_options(args))
+    urls = [f"{server.base_url}/watch?v=v{i:010d}" for i in range(args.videos)]
+
+    done = threading.Event()
+
+    def report():
+        while not done.wait(args.interval):
+            print(f"limite={upstream.snapshot()['limit']:>6} stub={server.state.counters}")
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+
+    start = time.perf_counter()
+    results = list(iter_transcripts(urls))
+    elapsed = time.perf_counter() - start
+    done.set()
+
+    ok = sum(1 for r in results if r.transcript)
+    print(f"{ok}/{len(results)} vídeos em {elapsed:.2f}s ({ok / elapsed:.1f} vídeos/s)")
+    print(f"upstream: {upstream.snapshot()}")
+    print(f"stub: {server.state.counters}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Roda vários `manage.py worker` ao mesmo tempo contra a fila do banco e o
+stub_server.py, e confere o resultado: todo item concluído uma vez só,
+itens de um worker morto (SIGKILL no meio do lote) devolvidos à fila
+quando a lease vence, e falhas do upstream (--error-ratio) refeitas até
+o limite de tentativas. No final imprime o painel de vazão por worker
+(home/workqueue.py worker_throughput).
+
+Uso:
+    DATABASE_URL=postgres://... python benchmarks/bench_workqueue.py --workers 4 --videos 2000
+    python benchmarks/bench_workqueue.py --workers 3 --videos 500 --error-ratio 0.3
+
+Sem DATABASE_URL usa um SQLite temporário (sem SKIP LOCKED: a reserva
+continua correta, mas os workers disputam o lock do arquivo).
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+
+def worker_env():
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = 'bench_settings'
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, BENCH_DIR, env.get('PYTHONPATH')]))
+    env.setdefault('TRANSCRIPT_CACHE_DIR', tempfile.mkdtemp(prefix='bench-cache-'))
+    env.setdefault('UPSTREAM_RATE_PER_HOST', '100000')
+    env.setdefault('UPSTREAM_BURST_PER_HOST', '100000')
+    # Nova tentativa logo, para o teste não esperar o backoff de produção
+    env.setdefault('WORK_QUEUE_RETRY_DELAY', '0.2')
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--videos', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=25)
+    parser.add_argument('--lease', type=int, default=3)
+    parser.add_argument('--no-kill', action='store_true', help='não mata o primeiro worker')
+    sys.path.insert(0, BENCH_DIR)
+    from stub_server import start_stub_server, add_stub_arguments, stub_options
+    add_stub_arguments(parser)
+    parser.set_defaults(latency=0.05, error_ratio=0.02)
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp(prefix='bench-queue-')}/queue.sqlite3"
+    env = worker_env()
+    os.environ.update(env)
+    sys.path.insert(0, ROOT_DIR)
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0, skip_checks=True)
+    from home import workqueue
+    from home.models import WorkItem
+
+    stub = start_stub_server(**stub_options(args))
+    run = f"q{os.getpid()}x{int(time.time())}"
+    urls = [f"{stub.base_url}/watch?v={run}v{i}" for i in range(args.videos)]
+    workqueue.enqueue(urls)
+
+    command = [sys.executable, '-W', 'ignore', os.path.join(ROOT_DIR, 'manage.py'), 'worker',
+               '--exit-when-empty', '--idle-sleep', '0.2', '--batch', str(args.batch), '--lease', str(args.lease)]
+    log = tempfile.NamedTemporaryFile(prefix='bench-workers-', suffix='.log', delete=False)
+    started = time.perf_counter()
+    processes = [
+        subprocess.Popen(command + ['--worker-id', f"bench-{n}"], env=env, cwd=ROOT_DIR,
+                         stdout=log, stderr=log)
+        for n in range(args.workers)
+    ]
+    killed = []
+    try:
+        while any(process.poll() is None for process in processes):
+            if not args.no_kill and not killed:
+                # Worker morto no meio de um lote: a lease dele vence e os
+                # itens voltam à fila para os outros
+                holding = list(WorkItem.objects.filter(worker='bench-0', status=WorkItem.STATUS_RUNNING)
+                               .values_list('pk', flat=True))
+                if holding:
+                    processes[0].send_signal(signal.SIGKILL)
+                    killed = holding
+            time.sleep(0.05)
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        stub.shutdown()
+    elapsed = time.perf_counter() - started
+
+    items = WorkItem.objects.filter(url__in=urls)
+    summary = {status: items.filter(status=status).count() for status, _ in WorkItem.STATUS_CHOICES}
+    report = {
+        'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+        'workers': args.workers,
+        'videos': args.videos,
+        'elapsed': round(elapsed, 2),
+        'videos_per_sec': round(summary['done'] / elapsed, 1),
+        'items': summary,
+        'retried_items': items.filter(attempts__gt=1).count(),
+        'held_by_killed': len(killed),
+        'reclaimed_from_killed': items.filter(pk__in=killed, status=WorkItem.STATUS_DONE).exclude(worker='bench-0').count(),
+        'exit_codes': [process.returncode for process in processes],
+        'log': log.name,
+        'throughput': workqueue.worker_throughput(minutes=60),
+    }
+    print(json.dumps(report, indent=2, default=str))
+    # Todo item termina: concluído ou falho depois das tentativas
+    assert summary['pending'] == summary['running'] == 0, summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Fixtures de página de vídeo e XML de legendas para o servidor de replay.
+
+Casos:
+    short        vídeo comum (~200 segmentos)
+    livestream   live longa (~30.000 segmentos)
+    no_captions  página sem 'captions' no ytInitialPlayerResponse
+    malformed    página sem player response reconhecível + XML quebrado
+
+Páginas gravadas podem substituir as sintéticas: coloque <caso>.html,
+<caso>.json (resposta do player API) e/ou <caso>.xml num diretório e passe-o em FixtureSource(recorded_dir=...). As
+URLs https://www.youtube.com/api/timedtext das páginas gravadas são
+reescritas para apontar para o servidor de replay.
+
+O ID do vídeo define o caso: "<caso>-<n>", ex.: "short-000042".
+"""
+
+import json
+import os
+
+CASES = ('short', 'livestream', 'no_captions', 'malformed')
+SEGMENTS = {'short': 200, 'livestream': 30000, 'no_captions': 0, 'malformed': 200}
+
+_FILLER = '<div class="style-scope ytd-watch-flexy"><span class="yt-core-attributed-string">…</span></div>\n'
+
+
+def case_of(video_id):
+    case = video_id.rsplit('-', 1)[0]
+    return case if case in CASES else 'short'
+
+
+def synthetic_player_response(case, caption_url, video_id):
+    if case == 'malformed':
+        # Player sem videoDetails: o engine cai na raspagem da página
+        return {"playabilityStatus": {"status": "ERROR", "reason": "fixture malformada"}}
+    player_response = {
+        "videoDetails": {"videoId": video_id, "title": f"Vídeo {video_id}", "isLiveContent": case == 'livestream'},
+        "microformat": {"playerMicroformatRenderer": {"publishDate": "2024-01-01", "description": {"simpleText": "texto com {chaves} e \"aspas\""}}},
+    }
+    if case != 'no_captions':
+        player_response["captions"] = {"playerCaptionsTracklistRenderer": {"captionTracks": [
+            {"baseUrl": f"{caption_url}&lang=pt", "languageCode": "pt", "kind": "asr"},
+            {"baseUrl": f"{caption_url}&lang=en", "languageCode": "en"},
+        ]}}
+    return player_response
+
+
+def synthetic_watch_page(case, caption_url, video_id, page_size):
+    player_response = synthetic_player_response(case if case != 'malformed' else 'short', caption_url, video_id)
+    head = f'<html><head><meta property="og:title" content="Vídeo {video_id} &amp; fixtures"></head><body>'
+    if case == 'malformed':
+        script = f'<script>var ytInitialPlayerResponse = {json.dumps(player_response)[:200]}</script>'
+    else:
+        script = f'<script>var ytInitialPlayerResponse = {json.dumps(player_response)};var meta = 1;</script>'
+    date = '<script>var ytInitialData = {"dateText": {"simpleText": "Enviado em 1 de jan. de 2024"}};</script>'
+    padding = max(0, page_size - len(head) - len(script) - len(date)) // 2
+    filler = _FILLER * (padding // len(_FILLER))
+    return ''.join([head, filler, script, date, filler, '</body></html>']).encode('utf-8')
+
+
+def synthetic_timedtext(case):
+    segments = ''.join(
+        f'<text start="{i * 2.5:.2f}" dur="2.5">segmento {i} com &amp;#39;entidades&amp;#39; &amp;amp; texto</text>'
+        for i in range(SEGMENTS[case])
+    )
+    xml = f'<?xml version="1.0" encoding="utf-8" ?><transcript>{segments}</transcript>'
+    if case == 'malformed':
+        # '&' sem escape e documento truncado: força o fallback do parser
+        xml = xml.replace('segmento 1 ', 'segmento 1 & ', 1)[:-len('</transcript>') - 20]
+    return xml.encode('utf-8')
+
+
+class FixtureSource:
+    def __init__(self, recorded_dir=None, page_size=300_000):
+        self.page_size = page_size
+        self.recorded = {}
+        if recorded_dir:
+            for name in os.listdir(recorded_dir):
+                with open(os.path.join(recorded_dir, name), 'rb') as f:
+                    self.recorded[name] = f.read()
+        self._xml = {}
+
+    def watch_page(self, base_url, video_id):
+        case = case_of(video_id)
+        caption_url = f"{base_url}/api/timedtext/{case}?v={video_id}"
+        recorded = self.recorded.get(f"{case}.html")
+        if recorded is not None:
+            return recorded.replace(b'https://www.youtube.com/api/timedtext?', f"{caption_url}&".encode())
+        return synthetic_watch_page(case, caption_url, video_id, self.page_size)
+
+    def player(self, base_url, video_id):
+        case = case_of(video_id)
+        caption_url = f"{base_url}/api/timedtext/{case}?v={video_id}"
+        recorded = self.recorded.get(f"{case}.json")
+        if recorded is not None:
+            return recorded.replace(b'https://www.youtube.com/api/timedtext?', f"{caption_url}&".encode())
+        return json.dumps(synthetic_player_response(case, caption_url, video_id)).encode('utf-8')
+
+    def timedtext(self, path):
+        case = path.rstrip('/').rsplit('/', 1)[-1]
+        case = case if case in CASES else 'short'
+        if case not in self._xml:
+            self._xml[case] = self.recorded.get(f"{case}.xml") or synthetic_timedtext(case)
+        return self._xml[case]
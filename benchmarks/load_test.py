@@ -0,0 +1,279 @@
+"""
+Teste de carga do POST / (formulário de transcrição) com usuários
+simultâneos, contra o upstream de replay (stub_server.py --fixtures) com
+latência ajustável. Cada configuração de servidor (sync/async x número de
+workers do gunicorn) roda com a mesma carga e o relatório traz vazão,
+taxa de erro (status, timeouts, conexão), latência p50/p90/p95/p99 até o
+primeiro byte e até o fim do download, e o uso de CPU/RSS do gunicorn
+(master + workers, lido de /proc).
+
+Cada usuário repete, durante --duration segundos, um pedido de um vídeo
+ou, na fração --channel-ratio, um pedido "de canal": --channel-size
+vídeos no mesmo formulário (a listagem de canais usa o youtube_dl e não
+passa pelo stub; o que pesa no servidor é o fetch dos vídeos).
+
+Uso:
+    python benchmarks/load_test.py --servers wsgi,asgi --workers 1,3 --users 50
+    python benchmarks/load_test.py --servers asgi --workers 3 --users 200 --latency 1 --channel-ratio 0.1
+    python benchmarks/load_test.py --compare benchmarks/results/load-20240101-120000.json
+
+Os resultados ficam em benchmarks/results/load-<timestamp>.json.
+DATABASE_URL precisa apontar para um banco migrado.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p / 100))], 3)
+
+
+def process_tree(pid):
+    # O master do gunicorn e os workers (filhos diretos)
+    pids = [pid]
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            pids.append(int(name))
+    return pids
+
+
+def process_usage(pids):
+    # (segundos de CPU, bytes de RSS) somados
+    cpu = rss = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{pid}/statm') as f:
+                rss += int(f.read().split()[1]) * PAGE_SIZE
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu, rss
+
+
+class ResourceSampler(threading.Thread):
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.cpu_percent = []
+        self.rss = []
+        self.cpu_seconds = 0.0
+
+    def run(self):
+        pids = process_tree(self.pid)
+        start_cpu, _ = last_cpu, _ = process_usage(pids)
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            pids = process_tree(self.pid)
+            cpu, rss = process_usage(pids)
+            now = time.perf_counter()
+            self.cpu_percent.append(100 * (cpu - last_cpu) / (now - last))
+            self.rss.append(rss)
+            last_cpu, last = cpu, now
+        self.cpu_seconds = last_cpu - start_cpu
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return {
+            'cpu_seconds': round(self.cpu_seconds, 2),
+            'cpu_percent_avg': round(sum(self.cpu_percent) / len(self.cpu_percent), 1) if self.cpu_percent else None,
+            'cpu_percent_max': round(max(self.cpu_percent), 1) if self.cpu_percent else None,
+            'rss_mb_max': round(max(self.rss) / 1e6, 1) if self.rss else None,
+        }
+
+
+def load(port, base_url, users, duration, channel_ratio, channel_size, timeout, run):
+    # Usuários em laço fechado: cada um só manda o próximo pedido depois
+    # de baixar a resposta do anterior
+    samples, errors = [], {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def request(body):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', data=body, timeout=timeout) as response:
+                chunk = response.read(1)
+                first_byte = time.perf_counter() - start
+                size = len(chunk) + len(response.read())
+                if response.headers.get('Content-Disposition') is None:
+                    return None, 'sem transcrição'
+            return (first_byte, time.perf_counter() - start, size), None
+        except urllib.error.HTTPError as e:
+            return None, f'status {e.code}'
+        except TimeoutError:
+            return None, 'timeout'
+        except urllib.error.URLError as e:
+            return None, 'timeout' if isinstance(e.reason, TimeoutError) else 'conexão'
+        except OSError:
+            return None, 'conexão'
+
+    def user(n):
+        i = 0
+        while time.perf_counter() < deadline:
+            # Fração channel_ratio dos pedidos, espalhada entre os usuários
+            channel = int((n + i + 1) * channel_ratio) > int((n + i) * channel_ratio)
+            videos = channel_size if channel else 1
+            urls = [f'{base_url}/watch?v=short-{run}u{n}r{i}v{v}' for v in range(videos)]
+            body = urllib.parse.urlencode([('video_url', url) for url in urls]).encode()
+            sample, error = request(body)
+            with lock:
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+                else:
+                    samples.append((channel, videos) + sample)
+            i += 1
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    failed = sum(errors.values())
+    total = len(samples) + failed
+    report = {
+        'requests': total,
+        'ok': len(samples),
+        'errors': errors,
+        'error_rate': round(failed / total, 4) if total else None,
+        'elapsed': round(elapsed, 2),
+        'requests_per_sec': round(len(samples) / elapsed, 2),
+        'videos_per_sec': round(sum(videos for _, videos, *_ in samples) / elapsed, 2),
+        'mb_out': round(sum(size for *_, size in samples) / 1e6, 2),
+    }
+    for kind, selected in (('single', False), ('channel', True)):
+        rows = [sample for sample in samples if sample[0] is selected]
+        if rows:
+            report[f'{kind}_latency'] = {f'p{p}': percentile([total for _, _, _, total, _ in rows], p)
+                                         for p in (50, 90, 95, 99)}
+            report[f'{kind}_latency']['max'] = round(max(total for _, _, _, total, _ in rows), 3)
+            report[f'{kind}_first_byte'] = {f'p{p}': percentile([first for _, _, first, _, _ in rows], p)
+                                            for p in (50, 95, 99)}
+    return report
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = {(run['server'], run['workers']): run for run in json.load(f)['runs']}
+    print(f"\nComparação com {previous_path}:")
+    for run in current['runs']:
+        before = previous.get((run['server'], run['workers']))
+        if not before:
+            continue
+        for label, now, then in (
+            ('req/s', run['requests_per_sec'], before['requests_per_sec']),
+            ('erros', run['error_rate'], before['error_rate']),
+            ('p95', (run.get('single_latency') or {}).get('p95'), (before.get('single_latency') or {}).get('p95')),
+            ('CPU %', run['server_usage']['cpu_percent_avg'], before['server_usage']['cpu_percent_avg']),
+            ('RSS MB', run['server_usage']['rss_mb_max'], before['server_usage']['rss_mb_max']),
+        ):
+            change = f"{(now - then) / then * 100:+.1f}%" if now is not None and then else 'n/a'
+            print(f"  {run['server']} x{run['workers']}  {label:<6} {then} -> {now} ({change})")
+
+
+def main():
+    sys.path.insert(0, BENCH_DIR)
+    from bench_serving import SERVERS, free_port, start_server
+    from run_suite import git_commit
+    from stub_server import start_stub_server, add_stub_arguments, stub_options
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--servers', default='wsgi,asgi', help=f"entre {','.join(sorted(SERVERS))}")
+    parser.add_argument('--workers', default=os.environ.get('GUNICORN_WORKERS', '3'),
+                        help='workers do gunicorn, ex.: 1,3,6')
+    parser.add_argument('--users', type=int, default=20, help='usuários simultâneos')
+    parser.add_argument('--duration', type=float, default=30, help='segundos de carga por configuração')
+    parser.add_argument('--channel-ratio', type=float, default=0.0, help='fração de pedidos de canal')
+    parser.add_argument('--channel-size', type=int, default=20, help='vídeos por pedido de canal')
+    parser.add_argument('--timeout', type=float, default=60, help='timeout do cliente por pedido')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help='JSON de uma execução anterior')
+    add_stub_arguments(parser)
+    parser.set_defaults(latency=0.3, page_size=20_000)
+    args = parser.parse_args()
+
+    args.fixtures = True
+    stub = start_stub_server(**stub_options(args))
+    run_id = f"{os.getpid()}x{int(time.time())}"
+    # Logs do gunicorn/Django fora do terminal; o caminho vai no relatório
+    log = tempfile.NamedTemporaryFile(prefix='load-test-', suffix='.log', delete=False)
+    runs = []
+    try:
+        for server in args.servers.split(','):
+            for workers in (int(n) for n in args.workers.split(',')):
+                port = free_port()
+                process, boot_seconds = start_server(server, port, workers, log=log)
+                sampler = ResourceSampler(process.pid)
+                sampler.start()
+                try:
+                    result = load(port, stub.base_url, args.users, args.duration, args.channel_ratio,
+                                  args.channel_size, args.timeout, f"{run_id}{server}{workers}")
+                finally:
+                    usage = sampler.stop()
+                    process.terminate()
+                    process.wait()
+                result = dict(server=server, workers=workers, boot_seconds=boot_seconds, **result)
+                usage['cpu_ms_per_request'] = round(usage['cpu_seconds'] * 1000 / result['ok'], 1) if result['ok'] else None
+                result['server_usage'] = usage
+                runs.append(result)
+                print(
+                    f"{server} x{workers}: {result['requests_per_sec']} req/s, erros {result['error_rate']} "
+                    f"{result['errors']}, latência {result.get('single_latency')}, CPU {usage['cpu_percent_avg']}% "
+                    f"RSS {usage['rss_mb_max']} MB"
+                )
+    finally:
+        stub.shutdown()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'cpus': os.cpu_count(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('compare', 'output')},
+        'upstream': stub.state.counters,
+        'server_log': log.name,
+        'runs': runs,
+    }
+    path = args.output or os.path.join(RESULTS_DIR, time.strftime('load-%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados em {path}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
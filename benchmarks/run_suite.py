@@ -0,0 +1,237 @@
+"""
+Suíte de benchmark offline do pipeline de transcrição.
+
+Sobe o servidor de replay (stub_server.py --fixtures) e roda cada tamanho
+de job num subprocesso separado, para que o pico de RSS seja de um job só.
+Mede vídeos/s, tempo de CPU por etapa (parse dos metadados, parse do XML,
+renderização no formato de saída, --format), pico de RSS e latência p50/p95/p99 (do início do job até o
+resultado de cada vídeo sair do engine).
+
+Uso:
+    python benchmarks/run_suite.py
+    python benchmarks/run_suite.py --sizes 1,100 --latency 0.05 --bandwidth 2000000
+    python benchmarks/run_suite.py --source watch_page
+    python benchmarks/run_suite.py --format jsonl.gz
+    python benchmarks/run_suite.py --compare benchmarks/results/20240101-120000.json
+
+Os resultados ficam em benchmarks/results/<timestamp>.json.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+def case_for(i):
+    # Mistura fixa: maioria 'short', algumas lives longas, sem legenda e quebradas
+    if i % 100 == 99:
+        return 'livestream'
+    if i % 20 == 7:
+        return 'no_captions'
+    if i % 50 == 13:
+        return 'malformed'
+    return 'short'
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return round(values[index], 4)
+
+
+def run_job(size, base_url, concurrency, source=None, export_format='txt'):
+    # Executado no subprocesso: importa Django só aqui, com cache isolado e
+    # o token bucket aberto (o ritmo é controlado pelo servidor de replay).
+    os.environ['TRANSCRIPT_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench-cache-')
+    os.environ.setdefault('UPSTREAM_RATE_PER_HOST', '100000')
+    os.environ.setdefault('UPSTREAM_BURST_PER_HOST', '100000')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yt_transcription.settings')
+    sys.path.insert(0, ROOT_DIR)
+
+    import logging
+    import threading
+
+    import django
+
+    django.setup()
+    logging.disable(logging.WARNING)
+
+    from home import engine
+    from home.http_client import http_stats
+    from home.metadata import SOURCES
+    from home.output import stream_text, stream_jsonl
+
+    cpu = {'metadata': 0.0, 'timedtext': 0.0, 'render': 0.0}
+    lock = threading.Lock()
+
+    def timed(stage, fn):
+        def wrapper(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with lock:
+                    cpu[stage] += time.thread_time() - start
+        return wrapper
+
+    for metadata_source in SOURCES.values():
+        metadata_source.parse = timed('metadata', metadata_source.parse)
+    engine.parse_transcript_xml = timed('timedtext', engine.parse_transcript_xml)
+
+    run = f"{os.getpid()}x{int(time.time())}"
+    # Gerador, como a enumeração de um canal: o pico de RSS deve ficar
+    # estável com o tamanho do job (fila limitada, saída em streaming)
+    urls = (f"{base_url}/watch?v={case_for(i)}-{run}{i:06d}" for i in range(size))
+    options = {'concurrency': concurrency} if concurrency else {}
+    if source:
+        options['source'] = source
+
+    latencies, counts = [], {'ok': 0, 'failed': 0}
+
+    def results():
+        for result in engine.iter_transcripts(urls, **options):
+            latencies.append(time.perf_counter() - start)
+            if not result.transcript:
+                counts['failed'] += 1
+                continue
+            counts['ok'] += 1
+            yield result
+
+    if export_format == 'txt':
+        output = (chunk.encode('utf-8') for chunk in stream_text(results()))
+    else:
+        output = stream_jsonl(results(), compression=export_format.partition('.')[2] or None)
+
+    # O engine roda na própria thread: o tempo de CPU desta thread é o da
+    # renderização/serialização (a espera pelos resultados não conta).
+    output_bytes = 0
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    render_start = time.thread_time()
+    start = time.perf_counter()
+    for chunk in output:
+        output_bytes += len(chunk)
+    elapsed = time.perf_counter() - start
+    cpu['render'] = time.thread_time() - render_start
+    ok, failed = counts['ok'], counts['failed']
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    total_cpu = (usage.ru_utime - usage_start.ru_utime) + (usage.ru_stime - usage_start.ru_stime)
+    cpu = {stage: round(seconds, 4) for stage, seconds in cpu.items()}
+    cpu['total'] = round(total_cpu, 4)
+    cpu['other'] = round(max(0.0, total_cpu - cpu['metadata'] - cpu['timedtext'] - cpu['render']), 4)
+    return {
+        'videos': size,
+        'ok': ok,
+        'failed': failed,
+        'elapsed': round(elapsed, 4),
+        'videos_per_sec': round(size / elapsed, 2) if elapsed else None,
+        'cpu_seconds': cpu,
+        # ru_maxrss em KiB no Linux
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'latency': {f"p{p}": percentile(latencies, p) for p in (50, 95, 99)},
+        'output_bytes': output_bytes,
+        'bytes_in_per_video': round(http_stats.snapshot()['bytes'] / size) if size else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = {job['videos']: job for job in json.load(f)['jobs']}
+    print(f"\nComparação com {previous_path}:")
+    for job in current['jobs']:
+        before = previous.get(job['videos'])
+        if not before:
+            continue
+        for label, now, then in (
+            ('vídeos/s', job['videos_per_sec'], before['videos_per_sec']),
+            ('CPU total', job['cpu_seconds']['total'], before['cpu_seconds']['total']),
+            ('RSS MB', job['peak_rss_mb'], before['peak_rss_mb']),
+            ('p95', job['latency']['p95'], before['latency']['p95']),
+        ):
+            change = f"{(now - then) / then * 100:+.1f}%" if then else 'n/a'
+            print(f"  {job['videos']:>5} vídeos  {label:<10} {then} -> {now} ({change})")
+
+
+def main():
+    sys.path.insert(0, BENCH_DIR)
+    from stub_server import start_stub_server, add_stub_arguments, stub_options
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1,100,5000')
+    parser.add_argument('--concurrency', type=int, default=None)
+    parser.add_argument('--source', default=None, help='fonte de metadados (player_api, watch_page)')
+    parser.add_argument('--format', default='txt', choices=('txt', 'jsonl', 'jsonl.gz', 'jsonl.zst'),
+                        help='formato de saída renderizado em cada job')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help='JSON de uma execução anterior')
+    parser.add_argument('--job', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', default=None, help=argparse.SUPPRESS)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    if args.job is not None:
+        print(json.dumps(run_job(args.job, args.base_url, args.concurrency, args.source, args.format)))
+        return
+
+    args.fixtures = True
+    server = start_stub_server(**stub_options(args))
+    jobs = []
+    try:
+        for size in (int(s) for s in args.sizes.split(',')):
+            command = [sys.executable, '-W', 'ignore', os.path.abspath(__file__),
+                       '--job', str(size), '--base-url', server.base_url]
+            if args.concurrency:
+                command += ['--concurrency', str(args.concurrency)]
+            if args.source:
+                command += ['--source', args.source]
+            command += ['--format', args.format]
+            output = subprocess.check_output(command, text=True)
+            job = json.loads(output.strip().splitlines()[-1])
+            jobs.append(job)
+            print(
+                f"{size:>5} vídeos: {job['videos_per_sec']} vídeos/s, CPU {job['cpu_seconds']}, "
+                f"RSS {job['peak_rss_mb']} MB, latência {job['latency']}, falhas {job['failed']}, "
+                f"saída {job['output_bytes'] / 1e6:.1f} MB"
+            )
+    finally:
+        server.shutdown()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('job', 'base_url', 'compare')},
+        'replay': server.state.counters,
+        'jobs': jobs,
+    }
+    path = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados em {path}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Servidor HTTP local que imita o upstream do YouTube (página do vídeo e
+XML de legendas), com latência e banda configuráveis e injeção de
+throttling. Com --fixtures, serve as fixtures de benchmarks/fixtures.py
+(replay), escolhendo o caso pelo ID do vídeo.
+
+Uso:
+    python benchmarks/stub_server.py --port 8765 --max-rps 50 --retry-after 1
+    python benchmarks/stub_server.py --fixtures --latency 0.05 --bandwidth 5000000
+
+As URLs de vídeo são http://127.0.0.1:<porta>/watch?v=<id>; o baseUrl das
+legendas aponta de volta para o próprio servidor. POST /youtubei/v1/player
+responde só o JSON do player (fonte 'player_api' de home/metadata.py).
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+def player_response(base_url, video_id):
+    # baseUrl assinados como os do YouTube: vencem em `expire` (6h)
+    signed = f"v={video_id}&expire={int(time.time()) + 21600}"
+    return {
+        "videoDetails": {"videoId": video_id, "title": f"Vídeo {video_id}"},
+        "microformat": {"playerMicroformatRenderer": {"publishDate": "2024-01-01"}},
+        "captions": {"playerCaptionsTracklistRenderer": {"captionTracks": [
+            {"baseUrl": f"{base_url}/api/timedtext?{signed}&lang=pt", "languageCode": "pt"},
+            {"baseUrl": f"{base_url}/api/timedtext?{signed}&lang=en", "languageCode": "en"},
+            {"baseUrl": f"{base_url}/api/timedtext?{signed}&lang=en&kind=asr", "languageCode": "en", "kind": "asr"},
+        ]}},
+    }
+
+
+def watch_page(base_url, video_id):
+    return (
+        f'<html><head><meta property="og:title" content="Vídeo {video_id}"></head><body>'
+        f'<script>var ytInitialPlayerResponse = {json.dumps(player_response(base_url, video_id))};var meta = 1;</script>'
+        '<script>var ytInitialData = {"dateText": {"simpleText": "Enviado em 1 de jan. de 2024"}};</script>'
+        '</body></html>'
+    ).encode('utf-8')
+
+
+def timedtext(segments=50):
+    body = ''.join(
+        f'<text start="{i * 2.5:.2f}" dur="2.5">segmento {i} &amp;#39;ok&amp;#39;</text>'
+        for i in range(segments)
+    )
+    return f'<?xml version="1.0" encoding="utf-8" ?><transcript>{body}</transcript>'.encode('utf-8')
+
+
+class SyntheticSource:
+    def __init__(self, segments=50):
+        self.xml = timedtext(segments)
+
+    def watch_page(self, base_url, video_id):
+        return watch_page(base_url, video_id)
+
+    def player(self, base_url, video_id):
+        return json.dumps(player_response(base_url, video_id)).encode('utf-8')
+
+    def timedtext(self, path):
+        return self.xml
+
+
+class StubState:
+    def __init__(self, latency=0.0, jitter=0.0, max_rps=None, throttle_ratio=0.0,
+                 error_ratio=0.0, retry_after=None, segments=50, bandwidth=None, source=None,
+                 slow_ratio=0.0, slow_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        # Cauda: uma fração das respostas demora slow_latency a mais
+        self.slow_ratio = slow_ratio
+        self.slow_latency = slow_latency
+        self.max_rps = max_rps
+        self.throttle_ratio = throttle_ratio
+        self.error_ratio = error_ratio
+        self.retry_after = retry_after
+        self.bandwidth = bandwidth  # bytes/s por resposta
+        self.source = source or SyntheticSource(segments)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.counters = {'requests': 0, 'throttled': 0, 'errors': 0}
+
+    def decide(self):
+        # Retorna o status a responder: 429 acima de max_rps (janela de 1s) ou
+        # por sorteio, 503 por sorteio, senão 200.
+        with self.lock:
+            self.counters['requests'] += 1
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.window_count = now, 0
+            self.window_count += 1
+            if (self.max_rps and self.window_count > self.max_rps) or random.random() < self.throttle_ratio:
+                self.counters['throttled'] += 1
+                return 429
+            if random.random() < self.error_ratio:
+                self.counters['errors'] += 1
+                return 503
+            return 200
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.respond()
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                payload = {}
+            self.respond(payload)
+
+        def respond(self, payload=None):
+            delay = state.latency + random.uniform(0, state.jitter)
+            if random.random() < state.slow_ratio:
+                delay += state.slow_latency
+            if delay:
+                time.sleep(delay)
+            status = state.decide()
+            if status != 200:
+                self.send_response(status)
+                if status == 429 and state.retry_after is not None:
+                    self.send_header('Retry-After', str(state.retry_after))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            parsed = urlparse(self.path)
+            video_id = parse_qs(parsed.query).get('v', ['unknown'])[0]
+            base_url = f"http://{self.headers.get('Host')}"
+            if parsed.path.startswith('/api/timedtext'):
+                body, content_type = state.source.timedtext(parsed.path), 'text/xml; charset=utf-8'
+            elif parsed.path.startswith('/youtubei/v1/player'):
+                video_id = (payload or {}).get('videoId', video_id)
+                body, content_type = state.source.player(base_url, video_id), 'application/json'
+            else:
+                body, content_type = state.source.watch_page(base_url, video_id), 'text/html; charset=utf-8'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if not state.bandwidth:
+                self.wfile.write(body)
+                return
+            chunk = max(1024, int(state.bandwidth / 20))
+            for start in range(0, len(body), chunk):
+                self.wfile.write(body[start:start + chunk])
+                time.sleep(len(body[start:start + chunk]) / state.bandwidth)
+
+    return Handler
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # Backlog maior: rajadas de conexões (bench_serving.py) não são recusadas
+    request_queue_size = 256
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Cliente que desistiu (a cópia perdedora de um hedge) não é erro
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub_server(port=0, **options):
+    state = StubState(**options)
+    server = StubHTTPServer(('127.0.0.1', port), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.state = state
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    return server
+
+
+def add_stub_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--max-rps', type=int, default=None)
+    parser.add_argument('--throttle-ratio', type=float, default=0.0)
+    parser.add_argument('--error-ratio', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=None)
+    parser.add_argument('--segments', type=int, default=50)
+    parser.add_argument('--bandwidth', type=float, default=None, help='bytes/s por resposta')
+    parser.add_argument('--slow-ratio', type=float, default=0.0, help='fração de respostas lentas')
+    parser.add_argument('--slow-latency', type=float, default=0.0, help='atraso extra das respostas lentas')
+    parser.add_argument('--fixtures', action='store_true', help='servir benchmarks/fixtures.py')
+    parser.add_argument('--recorded-dir', default=None, help='páginas/XML gravados (<caso>.html/.xml)')
+    parser.add_argument('--page-size', type=int, default=300_000)
+
+
+def stub_options(args):
+    options = {
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'max_rps': args.max_rps,
+        'throttle_ratio': args.throttle_ratio,
+        'error_ratio': args.error_ratio,
+        'retry_after': args.retry_after,
+        'segments': args.segments,
+        'bandwidth': args.bandwidth,
+        'slow_ratio': args.slow_ratio,
+        'slow_latency': args.slow_latency,
+    }
+    if args.fixtures or args.recorded_dir:
+        from fixtures import FixtureSource
+        options['source'] = FixtureSource(recorded_dir=args.recorded_dir, page_size=args.page_size)
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server = start_stub_server(args.port, **stub_options(args))
+    print(f"Stub em {server.base_url}", flush=True)
+    try:
+        while True:
+            time.sleep(5)
+            print(server.state.counters)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
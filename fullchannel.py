@@ -1,5 +1,4 @@
 import os
-import requests
 from bs4 import BeautifulSoup
 import re
 import json
@@ -7,7 +6,8 @@ import youtube_dl
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.shortcuts import render
 from django.http import HttpResponse
-from .forms import YouTubeURLForm
+from home.forms import YouTubeURLForm
+from home.http_client import http_get
 from django.views.decorators.csrf import csrf_exempt
 import logging
 
@@ -16,7 +16,7 @@ logger = logging.getLogger(__name__)
 
 def get_youtube_transcript_and_title(video_url):
     try:
-        response = requests.get(video_url)
+        response = http_get(video_url)
         if response.status_code != 200:
             logger.error(f"Falha ao acessar a página do vídeo. Status code: {response.status_code}")
             return None, None
@@ -44,7 +44,7 @@ def get_youtube_transcript_and_title(video_url):
         caption_tracks = captions['playerCaptionsTracklistRenderer']['captionTracks']
         transcript_url = caption_tracks[0]['baseUrl']
 
-        transcript_response = requests.get(transcript_url)
+        transcript_response = http_get(transcript_url)
         transcript_soup = BeautifulSoup(transcript_response.content, 'html.parser')
         transcript_segments = transcript_soup.find_all('text')
         full_transcript = ' '.join([segment.get_text() for segment in transcript_segments])
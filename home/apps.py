@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+
+
+def _maintain_jobs(**kwargs):
+    from .jobs import maintain_jobs
+
+    maintain_jobs()
 
 
 class HomeConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "home"
+
+    def ready(self):
+        # Jobs órfãos e arquivos vencidos (home/jobs.py); o banco não é
+        # consultado aqui, só na primeira requisição
+        request_started.connect(_maintain_jobs, dispatch_uid='home.maintain_jobs')
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+from django.conf import settings
+from django.core.cache import caches
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    # Camada em memória do processo: tamanho máximo + expiração por TTL
+    def __init__(self, max_size=1024, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TranscriptCache:
+    # Cache de duas camadas: LRU local + cache compartilhado do Django
+    # (arquivo/banco), que sobrevive entre workers do gunicorn e reinícios.
+    # VERSION muda quando o formato do valor armazenado muda.
+    VERSION = 3
+
+    def __init__(self, alias='transcripts', max_size=1024, ttl=3600, shared_ttl=86400):
+        self.alias = alias
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.shared_ttl = shared_ttl
+        self._lock = threading.Lock()
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'sets': 0}
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(video_id, lang=None):
+        return f"transcript:{video_id}:{lang or 'default'}"
+
+    def _incr(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, video_id, lang=None, count=True):
+        key = self.make_key(video_id, lang)
+        value = self.local.get(key)
+        if value is not None:
+            if count:
+                self._incr('local_hits')
+            return value
+
+        try:
+            value = self.shared.get(key, version=self.VERSION)
+        except Exception as e:
+            logger.warning(f"Falha ao ler o cache compartilhado: {e}")
+            value = None
+        if value is not None:
+            if count:
+                self._incr('shared_hits')
+            self.local.set(key, value)
+            return value
+
+        if count:
+            self._incr('misses')
+        return None
+
+    def set(self, video_id, value, lang=None):
+        key = self.make_key(video_id, lang)
+        self.local.set(key, value)
+        self._incr('sets')
+        try:
+            self.shared.set(key, value, self.shared_ttl, version=self.VERSION)
+        except Exception as e:
+            logger.warning(f"Falha ao gravar no cache compartilhado: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['hits'] = stats['local_hits'] + stats['shared_hits']
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['local_size'] = len(self.local)
+        return stats
+
+
+class ManifestCache:
+    # Lista de legendas de cada vídeo (title, upload_date, caption_tracks),
+    # para trocar de idioma sem baixar a página/player de novo. Os baseUrl
+    # são assinados e vencem (parâmetro expire): a entrada dura até pouco
+    # antes disso, limitada a max_ttl.
+    VERSION = 1
+
+    def __init__(self, alias='transcripts', max_size=4096, max_ttl=21600, margin=300):
+        self.alias = alias
+        self.local = LRUCache(max_size=max_size, ttl=max_ttl)
+        self.max_ttl = max_ttl
+        self.margin = margin
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0}
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(video_id):
+        return f"manifest:{video_id}"
+
+    def _incr(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def ttl(self, caption_tracks, now=None):
+        # Segundos até o primeiro baseUrl vencer, menos a margem
+        now = now or time.time()
+        ttl = self.max_ttl
+        for track in caption_tracks:
+            expire = parse_qs(urlparse(track.get('baseUrl', '')).query).get('expire')
+            if expire and expire[0].isdigit():
+                ttl = min(ttl, int(expire[0]) - now - self.margin)
+        return int(ttl)
+
+    def get(self, video_id):
+        key = self.make_key(video_id)
+        value = self.local.get(key)
+        if value is None:
+            try:
+                value = self.shared.get(key, version=self.VERSION)
+            except Exception as e:
+                logger.warning(f"Falha ao ler o cache compartilhado: {e}")
+            if value is not None:
+                # O TTL local não pode passar do que resta dos baseUrl
+                ttl = self.ttl(value[2])
+                if ttl <= 0:
+                    value = None
+                else:
+                    self.local.set(key, value, ttl)
+        self._incr('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, video_id, value):
+        # Só vídeos com legendas: as automáticas podem aparecer depois
+        if not value[2]:
+            return
+        ttl = self.ttl(value[2])
+        if ttl <= 0:
+            return
+        key = self.make_key(video_id)
+        self.local.set(key, value, ttl)
+        self._incr('sets')
+        try:
+            self.shared.set(key, value, ttl, version=self.VERSION)
+        except Exception as e:
+            logger.warning(f"Falha ao gravar no cache compartilhado: {e}")
+
+    def invalidate(self, video_id):
+        # baseUrl recusado antes do prazo (assinatura revogada etc.)
+        key = self.make_key(video_id)
+        self.local.delete(key)
+        self._incr('invalidations')
+        try:
+            self.shared.delete(key, version=self.VERSION)
+        except Exception as e:
+            logger.warning(f"Falha ao remover do cache compartilhado: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['local_size'] = len(self.local)
+        return stats
+
+
+transcript_cache = TranscriptCache(
+    max_size=getattr(settings, 'TRANSCRIPT_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'TRANSCRIPT_CACHE_TTL', 3600),
+    shared_ttl=getattr(settings, 'TRANSCRIPT_CACHE_SHARED_TTL', 86400),
+)
+
+manifest_cache = ManifestCache(
+    max_size=getattr(settings, 'MANIFEST_CACHE_SIZE', 4096),
+    max_ttl=getattr(settings, 'MANIFEST_CACHE_MAX_TTL', 21600),
+    margin=getattr(settings, 'MANIFEST_CACHE_MARGIN', 300),
+)
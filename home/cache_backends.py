@@ -0,0 +1,25 @@
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class UnculledFileBasedCache(FileBasedCache):
+    # O FileBasedCache do Django chama _cull() em todo set()/add(), e o
+    # _cull() lista o diretório inteiro: com MAX_ENTRIES alto, cada gravação
+    # fica mais lenta conforme o cache cresce. Aqui a escrita não limpa
+    # nada; entradas vencidas e o excesso sobre MAX_ENTRIES saem em prune(),
+    # fora do caminho da requisição (manage.py prunecache).
+    def _cull(self):
+        pass
+
+    def prune(self):
+        # Retorna (vencidas removidas, removidas pelo limite de entradas)
+        expired = 0
+        for fname in self._list_cache_files():
+            try:
+                with open(fname, 'rb') as f:
+                    # _is_expired apaga o arquivo vencido
+                    expired += self._is_expired(f)
+            except FileNotFoundError:
+                pass
+        before = len(self._list_cache_files())
+        super()._cull()
+        return expired, before - len(self._list_cache_files())
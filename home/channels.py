@@ -0,0 +1,67 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import Channel, ChannelVideo
+from .youtube import iter_channel_video_ids, canonical_video_url
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_channel_url(url):
+    url = url.strip().rstrip('/')
+    if url.endswith('/videos'):
+        url = url[:-len('/videos')]
+    return url
+
+def refresh_channel_index(channel_url):
+    # Atualiza o índice persistido do canal. A listagem vem dos mais
+    # recentes para os mais antigos, então paramos no primeiro ID já
+    # conhecido: um re-crawl só busca o que é novo.
+    channel, _ = Channel.objects.get_or_create(url=normalize_channel_url(channel_url))
+    known = set(channel.videos.values_list('video_id', flat=True))
+
+    new_ids = []
+    try:
+        with metrics.timer('channel_enumeration'):
+            for video_id in iter_channel_video_ids(channel.url):
+                if video_id in known:
+                    break
+                if video_id not in new_ids:
+                    new_ids.append(video_id)
+    except Exception as e:
+        # Sem acesso à listagem: seguimos com o que já está no índice
+        logger.error(f"Falha ao listar o canal {channel.url}: {e}")
+        return channel
+
+    now = timezone.now()
+    with transaction.atomic():
+        ChannelVideo.objects.bulk_create(
+            [ChannelVideo(channel=channel, video_id=video_id, first_seen_at=now, position=i)
+             for i, video_id in enumerate(new_ids)],
+            ignore_conflicts=True,
+        )
+        channel.last_refreshed_at = now
+        channel.save(update_fields=['last_refreshed_at'])
+    logger.info(f"Canal {channel.url}: {len(new_ids)} vídeos novos, {len(known)} já conhecidos")
+    return channel
+
+def get_channel_video_urls(channel_url, only_new=False, watermarks=None):
+    channel = refresh_channel_index(channel_url)
+    videos = channel.videos.all()
+    if only_new:
+        # Apenas vídeos vistos depois da última exportação deste canal
+        if channel.last_exported_at:
+            videos = videos.filter(first_seen_at__gt=channel.last_exported_at)
+        # A nova marca vai para quem chamou e só é gravada (mark_exported)
+        # depois que a exportação terminar: uma falha no meio não perde vídeos
+        if watermarks is not None:
+            watermarks[channel.pk] = channel.last_refreshed_at or timezone.now()
+    return [canonical_video_url(video_id) for video_id in videos.values_list('video_id', flat=True)]
+
+def mark_exported(watermarks):
+    # {channel.pk: momento da listagem} de get_channel_video_urls
+    for pk, exported_at in watermarks.items():
+        Channel.objects.filter(pk=pk).update(last_exported_at=exported_at)
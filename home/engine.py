@@ -0,0 +1,573 @@
+import asyncio
+import contextlib
+import logging
+import queue
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import httpx
+from django.conf import settings
+
+from . import metrics
+from .cache import transcript_cache, manifest_cache
+from .extractors import ExtractionError
+from .hedging import hedging
+from .http_client import async_request, close_shared_async_client, shared_async_client
+from .metadata import get_sources
+from .singleflight import singleflight
+from .throttle import upstream, parse_retry_after
+from .writer import transcript_writer
+from .youtube import (
+    extract_video_id,
+    canonical_video_url,
+    select_caption_track,
+    parse_track_spec,
+    parse_track_specs,
+    track_kind,
+    track_key,
+    parse_transcript_xml,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TranscriptResult:
+    url: str
+    video_id: str = None
+    title: str = None
+    transcript: str = None
+    upload_date: str = None
+    lang: str = None
+    kind: str = None  # 'asr' (automática) ou 'manual'
+    track: str = None  # faixa pedida, quando a requisição pede mais de uma
+    error: str = None
+    timed_out: bool = False
+    cached: bool = False
+    coalesced: bool = False
+
+
+_running = weakref.WeakSet()
+
+def queue_depths():
+    # Itens aguardando em cada fila, somados entre os engines em execução
+    depths = {'engine_pages': 0, 'engine_captions': 0, 'engine_out': 0}
+    for engine in list(_running):
+        for name, q in engine._queues.items():
+            depths[name] += q.qsize()
+    return depths
+
+
+class StageTimeout(Exception):
+    pass
+
+
+# Valor do single-flight quando o líder estourou o prazo
+_TIMED_OUT = object()
+
+
+class FetchEngine:
+    # Pipeline assíncrono em dois estágios: página do vídeo -> legenda.
+    # Os downloads de legenda acontecem em paralelo com os de páginas.
+    # Cada download tem prazo (stage_timeout, com novas tentativas e hedge
+    # incluídos) e a execução inteira pode ter um orçamento (budget): o que
+    # não couber sai como "tempo esgotado" em vez de segurar a resposta.
+    # lang pode pedir várias faixas ('pt,en:asr'): a lista de legendas do
+    # vídeo é buscada (ou lida do cache) uma vez e cada faixa sai como um
+    # resultado próprio, com os downloads de legenda em paralelo.
+    def __init__(self, concurrency=None, per_host=None, lang=None, source=None, stage_timeout=None, budget=None):
+        self.concurrency = concurrency or settings.TRANSCRIPT_FETCH_CONCURRENCY
+        self.per_host = per_host or settings.TRANSCRIPT_FETCH_PER_HOST
+        self.langs = parse_track_specs(lang)
+        self.sources = get_sources(source)
+        self.stage_timeout = stage_timeout or settings.TRANSCRIPT_STAGE_TIMEOUT
+        self.budget = budget if budget is not None else settings.TRANSCRIPT_JOB_BUDGET
+        self._deadline = None
+        self._global = None
+        self._hosts = {}
+        self._flights = {}
+        self._queues = {}
+
+    def _client(self):
+        # Pool keep-alive do event loop, compartilhado entre as execuções
+        return shared_async_client()
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def _send(self, client, method, url, stage, sent=None, **kwargs):
+        # Uma tentativa: ritmo por host (token bucket) e limite adaptativo (AIMD)
+        await upstream.bucket(urlparse(url).netloc).acquire()
+        async with self._global, self._host_semaphore(url):
+            await upstream.limiter.acquire()
+            if sent is not None:
+                sent.set()
+            start = time.monotonic()
+            # Todo acquire() termina em exatamente um release() ou cancel(),
+            # qualquer que seja a saída (inclusive task destruída)
+            outcome = None
+            try:
+                response = await async_request(client, method, url, **kwargs)
+                latency = time.monotonic() - start
+                if response.status_code != 429 and response.status_code < 500:
+                    outcome = 'ok'
+                    hedging.observe(stage, latency)
+                else:
+                    outcome = 'throttled' if response.status_code == 429 else 'error'
+                return response
+            except httpx.TransportError:
+                outcome = 'error'
+                raise
+            finally:
+                if outcome == 'ok':
+                    upstream.limiter.release(ok=True, latency=latency)
+                elif outcome is not None:
+                    upstream.limiter.release(ok=False, throttled=outcome == 'throttled')
+                else:
+                    # Cancelada (hedge perdedor, prazo) ou erro que não é do upstream
+                    upstream.limiter.cancel()
+
+    async def _hedged(self, client, method, url, stage, **kwargs):
+        # Se a tentativa passar do percentil recente da etapa (contado a
+        # partir do envio, não da fila), dispara uma cópia; vale a primeira.
+        delay = hedging.delay(stage)
+        if delay is None:
+            return await self._send(client, method, url, stage, **kwargs)
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._send(client, method, url, stage, sent=sent, **kwargs))
+        tasks = {primary}
+        try:
+            waiter = asyncio.ensure_future(sent.wait())
+            await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not hedging.allow():
+                return await primary
+            hedge = asyncio.ensure_future(self._send(client, method, url, stage, **kwargs))
+            tasks.add(hedge)
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            hedging.record_win()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _time_left(self):
+        timeout = self.stage_timeout
+        if self._deadline is not None:
+            timeout = min(timeout, self._deadline - time.monotonic())
+        return timeout
+
+    async def _request(self, client, method, url, stage=None, **kwargs):
+        timeout = self._time_left()
+        if timeout <= 0:
+            raise StageTimeout(stage)
+        try:
+            return await asyncio.wait_for(self._retrying(client, method, url, stage, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeout(stage)
+
+    async def _retrying(self, client, method, url, stage, **kwargs):
+        # Novas tentativas com jitter em 429/5xx e erros de transporte
+        bucket = upstream.bucket(urlparse(url).netloc)
+        attempt = 0
+        while True:
+            try:
+                response = await self._hedged(client, method, url, stage, **kwargs)
+            except httpx.TransportError as e:
+                if attempt >= upstream.max_retries:
+                    upstream.record_retry(gave_up=True)
+                    raise
+                reason, retry_after = str(e) or type(e).__name__, None
+            else:
+                status = response.status_code
+                if status != 429 and status < 500:
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after:
+                    bucket.pause(retry_after)
+                if attempt >= upstream.max_retries:
+                    upstream.record_retry(gave_up=True)
+                    return response
+                reason = f"status {status}"
+
+            delay = upstream.retry_delay(attempt, retry_after)
+            upstream.record_retry()
+            logger.warning(f"{reason} em {url}; nova tentativa em {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _page_worker(self, client, pages, captions, out):
+        while True:
+            url = await pages.get()
+            if url is None:
+                return
+            video_id = extract_video_id(url)
+            pending = [
+                (TranscriptResult(url=url, video_id=video_id, lang=lang, kind=kind,
+                                  track=spec if len(self.langs) > 1 else None), spec)
+                for spec, (lang, kind) in ((spec, parse_track_spec(spec)) for spec in self.langs)
+            ]
+            try:
+                if video_id:
+                    for item in list(pending):
+                        if await self._lookup(*item):
+                            pending.remove(item)
+                            await self._emit(item[0], out)
+                    if not pending:
+                        continue
+                    url = canonical_video_url(video_id)
+
+                metadata, status, cached = await self._manifest(client, url, video_id)
+                if metadata is None:
+                    for result, _ in pending:
+                        result.error = f"status {status}" if status else "metadados indisponíveis"
+                        metrics.incr('transcript_failures_total', reason='page_status')
+                        await self._emit(result, out)
+                    continue
+
+                title, upload_date, caption_tracks = metadata
+                while pending:
+                    result, spec = pending.pop(0)
+                    result.title, result.upload_date = title, upload_date
+                    track = select_caption_track(caption_tracks, spec)
+                    if not track:
+                        result.error = "sem transcrição"
+                        metrics.incr('transcript_failures_total', reason='no_captions')
+                        await self._emit(result, out)
+                        continue
+                    result.lang = track.get('languageCode') or result.lang
+                    result.kind = track_kind(track)
+                    await captions.put((result, spec, track['baseUrl'], cached))
+            except StageTimeout:
+                for result, _ in pending:
+                    self._timed_out(result)
+                    await self._emit(result, out)
+            except Exception as e:
+                logger.error(f"Erro ao extrair a transcrição: {e}")
+                for result, _ in pending:
+                    result.error = str(e)
+                    metrics.incr('transcript_failures_total', reason='page_error')
+                    await self._emit(result, out)
+
+    async def _manifest(self, client, url, video_id):
+        # Lista de legendas do cache (trocar de idioma num vídeo já visto
+        # custa só o XML) ou das fontes de metadados. Retorna
+        # (metadados ou None, status, veio do cache).
+        if video_id:
+            cached = await asyncio.to_thread(manifest_cache.get, video_id)
+            if cached is not None:
+                return cached, 200, True
+        metadata, status = await self._fetch_metadata(client, url, video_id)
+        if metadata is not None and video_id:
+            await asyncio.to_thread(manifest_cache.set, video_id, metadata)
+        return metadata, status, False
+
+    async def _fetch_metadata(self, client, url, video_id):
+        # Fonte escolhida primeiro e, se não servir (inclusive sem resposta
+        # dentro do prazo), a raspagem da página. Retorna
+        # ((title, upload_date, caption_tracks) ou None, último status); o
+        # erro de rede/prazo só sobe se nenhuma fonte respondeu. Resposta sem
+        # data de publicação vale, mas a data é buscada na próxima fonte.
+        status = None
+        error = None
+        partial = None
+        for source in self.sources:
+            try:
+                method, target, kwargs = source.request(url, video_id)
+                with metrics.timer(source.stage):
+                    response = await self._request(client, method, target, stage=source.stage, **kwargs)
+                status = response.status_code
+                if status != 200:
+                    logger.error(f"Falha ao acessar {source.name}. Status code: {status}")
+                    continue
+                metadata = await asyncio.to_thread(source.parse, response.content)
+                if partial is not None:
+                    title, _, tracks = partial[0]
+                    return (title, metadata[1], tracks), partial[1]
+                if metadata[1] is None and source is not self.sources[-1]:
+                    logger.warning(f"Fonte {source.name} sem data de publicação, tentando a próxima.")
+                    partial = metadata, status
+                    continue
+                return metadata, status
+            except ExtractionError as e:
+                logger.warning(f"Fonte {source.name} falhou ({e}), tentando a próxima.")
+            except (httpx.TransportError, StageTimeout) as e:
+                logger.warning(f"Fonte {source.name} sem resposta ({type(e).__name__}), tentando a próxima.")
+                error = e
+        if partial is not None:
+            return partial
+        if status is None and error is not None:
+            raise error
+        return None, status
+
+    def _timed_out(self, result):
+        result.error = "tempo esgotado"
+        result.timed_out = True
+        metrics.incr('transcript_failures_total', reason='timeout')
+
+    @staticmethod
+    def _value(result):
+        # O que vai para o cache e para quem espera no single-flight: a
+        # faixa resolvida (lang/kind) também, não só a pedida
+        return result.transcript, result.title, result.upload_date, result.lang, result.kind
+
+    def _apply(self, result, value):
+        result.transcript, result.title, result.upload_date, result.lang, result.kind = value
+
+    async def _lookup(self, result, spec):
+        # Cache -> fetch em andamento (mesmo processo) -> lock compartilhado
+        # (outros processos). Retorna True se o resultado já foi resolvido;
+        # senão este worker vira o "líder" e faz o fetch.
+        cached = await asyncio.to_thread(transcript_cache.get, result.video_id, spec)
+        if cached is not None:
+            self._apply(result, cached)
+            result.cached = True
+            return True
+
+        key = f"{result.video_id}:{spec or 'default'}"
+        is_leader, future = singleflight.begin(key)
+        if not is_leader:
+            # Espera dentro do prazo deste vídeo; o shield impede que o
+            # cancelamento chegue ao Future compartilhado (e aos outros)
+            try:
+                value = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                               max(self._time_left(), 0))
+            except asyncio.TimeoutError:
+                value = _TIMED_OUT
+            if value is _TIMED_OUT:
+                self._timed_out(result)
+            elif value is None:
+                result.error = "falha no fetch compartilhado"
+                metrics.incr('transcript_failures_total', reason='shared_fetch')
+            else:
+                self._apply(result, value)
+            result.coalesced = True
+            return True
+
+        locked = True
+        if settings.SINGLEFLIGHT_SHARED_LOCK:
+            locked = await asyncio.to_thread(singleflight.try_lock, key)
+            if not locked:
+                value = await self._wait_remote(result.video_id, spec, key)
+                if value is not None:
+                    singleflight.finish(key, value)
+                    if value is _TIMED_OUT:
+                        self._timed_out(result)
+                    else:
+                        self._apply(result, value)
+                    result.coalesced = True
+                    return True
+        self._flights[id(result)] = (key, locked and settings.SINGLEFLIGHT_SHARED_LOCK)
+        return False
+
+    async def _wait_remote(self, video_id, spec, key):
+        # Outro processo está buscando este vídeo: espera o resultado
+        # aparecer no cache compartilhado enquanto o lock existir. Retorna
+        # o valor, None (lock liberado sem valor: este worker busca) ou
+        # _TIMED_OUT se o prazo deste vídeo acabar antes.
+        singleflight.incr('remote_waits')
+        time_left = self._time_left()
+        deadline = time.monotonic() + min(singleflight.lock_ttl, time_left)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(0.25, deadline - time.monotonic()))
+            value = await asyncio.to_thread(transcript_cache.get, video_id, spec, False)
+            if value is not None:
+                singleflight.incr('remote_hits')
+                return value
+            if not await asyncio.to_thread(singleflight.is_locked, key):
+                return None
+        return _TIMED_OUT if time_left <= singleflight.lock_ttl else None
+
+    async def _release_flight(self, result):
+        flight = self._flights.pop(id(result), None)
+        if flight is None:
+            return
+        key, locked = flight
+        if result.transcript:
+            value = self._value(result)
+        else:
+            value = _TIMED_OUT if result.timed_out else None
+        singleflight.finish(key, value)
+        if locked:
+            await asyncio.to_thread(singleflight.unlock, key)
+
+    async def _emit(self, result, out):
+        await self._release_flight(result)
+        await out.put(result)
+
+    async def _caption_worker(self, client, captions, out):
+        while True:
+            item = await captions.get()
+            if item is None:
+                return
+            result, spec, transcript_url, cached_manifest = item
+            try:
+                with metrics.timer('caption_download'):
+                    response = await self._request(client, 'GET', transcript_url, stage='caption_download')
+                if response.status_code != 200:
+                    # baseUrl vencido ou revogado: a próxima vez busca a lista de novo
+                    if cached_manifest:
+                        await asyncio.to_thread(manifest_cache.invalidate, result.video_id)
+                    result.error = f"status {response.status_code}"
+                    metrics.incr('transcript_failures_total', reason='caption_status')
+                    await self._emit(result, out)
+                    continue
+                result.transcript = await asyncio.to_thread(parse_transcript_xml, response.content)
+                if result.video_id and result.transcript:
+                    await asyncio.to_thread(transcript_cache.set, result.video_id, self._value(result), spec)
+                    if settings.TRANSCRIPT_INDEX_ENABLED:
+                        # Gravação em lote na thread do writer; só espera
+                        # (fora do event loop) se a fila dele encher
+                        row = (result.video_id, track_key(result.lang, result.kind), result.transcript,
+                               result.title, result.upload_date)
+                        if not transcript_writer.put(*row):
+                            await asyncio.to_thread(transcript_writer.put, *row, block=True)
+            except StageTimeout:
+                self._timed_out(result)
+            except Exception as e:
+                logger.error(f"Erro ao extrair a transcrição: {e}")
+                result.error = str(e)
+                metrics.incr('transcript_failures_total', reason='caption_error')
+            await self._emit(result, out)
+
+    async def run(self, urls):
+        # Gerador assíncrono: entrega cada TranscriptResult assim que fica
+        # pronto. urls pode ser qualquer iterável (ex.: a enumeração de um
+        # canal); só `concurrency` URLs ficam à frente dos workers.
+        self._global = asyncio.Semaphore(self.concurrency)
+        self._hosts = {}
+        self._flights = {}
+        self._deadline = time.monotonic() + self.budget if self.budget else None
+        pages = asyncio.Queue(maxsize=self.concurrency)
+        # Filas limitadas: se o consumidor (ex.: download lento) atrasar,
+        # os workers param em vez de acumular transcrições na memória.
+        captions = asyncio.Queue(maxsize=self.concurrency)
+        out = asyncio.Queue(maxsize=self.concurrency)
+        self._queues = {'engine_pages': pages, 'engine_captions': captions, 'engine_out': out}
+        _running.add(self)
+
+        client = self._client()
+        page_workers = [
+            asyncio.create_task(self._page_worker(client, pages, captions, out))
+            for _ in range(self.concurrency)
+        ]
+        caption_workers = [
+            asyncio.create_task(self._caption_worker(client, captions, out))
+            for _ in range(self.concurrency)
+        ]
+
+        async def feed():
+            # Listas são lidas direto; outros iteráveis podem bloquear
+            # (rede, banco) e avançam numa thread, fora do event loop.
+            iterator = iter(urls)
+            blocking = not isinstance(urls, (list, tuple))
+            try:
+                while True:
+                    url = await asyncio.to_thread(next, iterator, None) if blocking else next(iterator, None)
+                    if url is None:
+                        break
+                    await pages.put(url)
+            except Exception as e:
+                logger.error(f"Erro ao enumerar as URLs: {e}")
+            # Cancelado (consumidor saiu): os workers também são
+            # cancelados e ninguém mais lê a fila, então não há o que
+            # sinalizar; um put() aqui poderia não voltar nunca.
+            for _ in page_workers:
+                await pages.put(None)
+
+        feeder = asyncio.create_task(feed())
+
+        async def close():
+            await feeder
+            await asyncio.gather(*page_workers)
+            for _ in caption_workers:
+                await captions.put(None)
+            await asyncio.gather(*caption_workers)
+            await out.put(None)
+
+        closer = asyncio.create_task(close())
+        try:
+            while True:
+                result = await out.get()
+                if result is None:
+                    break
+                yield result
+        finally:
+            for task in [feeder] + page_workers + caption_workers + [closer]:
+                task.cancel()
+            await asyncio.gather(feeder, *page_workers, *caption_workers, closer, return_exceptions=True)
+            # Não deixa outras requisições esperando por fetches cancelados
+            for key, locked in self._flights.values():
+                singleflight.finish(key, None)
+                if locked:
+                    singleflight.unlock(key)
+            self._flights = {}
+            _running.discard(self)
+
+
+_DONE = object()
+
+def iter_transcripts(urls, **options):
+    # Wrapper síncrono (views WSGI): roda o engine num event loop próprio
+    # em outra thread e entrega os resultados conforme ficam prontos.
+    engine = FetchEngine(**options)
+    results = queue.Queue(maxsize=engine.concurrency)
+    loop = asyncio.new_event_loop()
+
+    async def pump():
+        # aclosing: se o consumidor desistir, o finally de run() roda aqui
+        # (cancela os workers, encerra os single-flights) antes do loop fechar
+        async with contextlib.aclosing(engine.run(urls)) as stream:
+            async for result in stream:
+                await asyncio.to_thread(results.put, result)
+
+    main_task = loop.create_task(pump())
+
+    def runner():
+        try:
+            loop.run_until_complete(main_task)
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(_DONE)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(close_shared_async_client())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if thread.is_alive():
+            try:
+                loop.call_soon_threadsafe(main_task.cancel)
+            except RuntimeError:
+                pass  # o loop já terminou
+            # Esvazia a fila para liberar um put() que esteja bloqueado
+            while thread.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
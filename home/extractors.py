@@ -0,0 +1,115 @@
+import re
+import json
+import html
+import logging
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Extrator rápido da página do vídeo: varre o HTML bruto uma única vez,
+# sem montar a árvore do BeautifulSoup. Levanta ExtractionError quando não
+# reconhece a página, para que o chamador use o parser antigo como fallback.
+
+OG_TITLE_RE = re.compile(r'<meta\s+property="og:title"\s+content="([^"]*)"')
+DATE_SPAN_RE = re.compile(
+    r'<span[^>]*class="style-scope yt-formatted-string bold"[^>]*>\s*'
+    r'((?:Transmitido ao vivo em|Estreou em|Enviado em)[^<]*)</span>'
+)
+DATE_TEXT_RE = re.compile(r'"dateText":\s*{\s*"simpleText":\s*"([^"]+)"')
+PLAYER_RESPONSE_RE = re.compile(r'ytInitialPlayerResponse\s*=\s*(?={)')
+
+_decoder = json.JSONDecoder()
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def decode_page(content):
+    if isinstance(content, bytes):
+        return content.decode('utf-8', errors='replace')
+    return content
+
+def extract_player_response(text):
+    # raw_decode lê exatamente um objeto JSON a partir da posição, respeitando
+    # strings e chaves aninhadas (o regex '({.*?});' podia cortar o objeto).
+    for match in PLAYER_RESPONSE_RE.finditer(text):
+        try:
+            data, _ = _decoder.raw_decode(text, match.end())
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+def extract_watch_page(content):
+    with metrics.timer('html_parse'):
+        text = decode_page(content)
+
+        title_match = OG_TITLE_RE.search(text)
+        title = html.unescape(title_match.group(1)) if title_match else "sem_titulo"
+
+        date_match = DATE_SPAN_RE.search(text) or DATE_TEXT_RE.search(text)
+        upload_date = date_match.group(1).strip() if date_match else None
+
+    with metrics.timer('json_decode'):
+        player_response = extract_player_response(text)
+    if player_response is None:
+        raise ExtractionError("ytInitialPlayerResponse não encontrado")
+    return title, upload_date, player_response
+
+def parse_watch_page(content):
+    # Retorna (title, upload_date, caption_tracks); caption_tracks é None
+    # quando a página não tem transcrição disponível.
+    try:
+        title, upload_date, data = extract_watch_page(content)
+    except ExtractionError as e:
+        logger.debug(f"Extrator rápido falhou ({e}), usando BeautifulSoup.")
+        with metrics.timer('html_parse'):
+            return parse_watch_page_soup(content)
+
+    captions = data.get('captions')
+    if not captions:
+        logger.error("Nenhuma transcrição disponível para este vídeo.")
+        return title, upload_date, None
+    return title, upload_date, captions['playerCaptionsTracklistRenderer']['captionTracks']
+
+def parse_watch_page_soup(content):
+    # Só o fallback usa o bs4; importado na primeira vez que é preciso
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    title_element = soup.find("meta", property="og:title")
+    title = title_element["content"] if title_element else "sem_titulo"
+
+    # Extrair a data de envio
+    upload_date = None
+    date_span = soup.find("span", class_="style-scope yt-formatted-string bold", string=re.compile("Transmitido ao vivo em|Estreou em|Enviado em"))
+    if date_span:
+        upload_date = date_span.text.strip()
+    else:
+        # Tentar encontrar a data em um formato alternativo
+        script_data = soup.find("script", string=re.compile("dateText"))
+        if script_data:
+            date_match = re.search(r'"dateText":\s*{\s*"simpleText":\s*"([^"]+)"', script_data.string)
+            if date_match:
+                upload_date = date_match.group(1)
+
+    script = soup.find("script", string=re.compile("ytInitialPlayerResponse"))
+    if not script:
+        logger.error("Não foi possível encontrar o script de dados iniciais.")
+        return title, upload_date, None
+
+    json_text = re.search(r"ytInitialPlayerResponse\s*=\s*({.*?});", script.string)
+    if not json_text:
+        logger.error("Não foi possível extrair os dados JSON.")
+        return title, upload_date, None
+
+    data = json.loads(json_text.group(1))
+    captions = data.get('captions')
+    if not captions:
+        logger.error("Nenhuma transcrição disponível para este vídeo.")
+        return title, upload_date, None
+
+    return title, upload_date, captions['playerCaptionsTracklistRenderer']['captionTracks']
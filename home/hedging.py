@@ -0,0 +1,71 @@
+import threading
+from collections import deque
+
+from django.conf import settings
+
+# Requisições "hedged": se um download passa do percentil HEDGE_PERCENTILE
+# das latências recentes da mesma etapa, o engine dispara uma cópia e usa a
+# primeira resposta. As cópias são limitadas a HEDGE_MAX_RATIO das
+# requisições, para não dobrar a carga quando o upstream inteiro fica lento.
+
+
+class HedgePolicy:
+    def __init__(self, enabled=True, percentile=95, min_delay=0.1, min_samples=20, window=500, max_ratio=0.1):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.max_ratio = max_ratio
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._thresholds = {}
+        self._counts = {}
+        self.counters = {'requests': 0, 'sent': 0, 'won': 0}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self.counters['requests'] += 1
+            # Recalcula o limiar a cada 10 amostras da etapa, não a cada
+            # resposta (a contagem global pularia etapas intercaladas)
+            self._counts[stage] = count = self._counts.get(stage, 0) + 1
+            if len(samples) >= self.min_samples and count % 10 == 0:
+                ordered = sorted(samples)
+                index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+                self._thresholds[stage] = max(self.min_delay, ordered[index])
+
+    def delay(self, stage):
+        # Quanto esperar antes da cópia; None = sem hedge para esta etapa
+        if not self.enabled or stage is None:
+            return None
+        with self._lock:
+            return self._thresholds.get(stage)
+
+    def allow(self):
+        with self._lock:
+            if self.counters['sent'] >= self.max_ratio * self.counters['requests'] + 1:
+                return False
+            self.counters['sent'] += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.counters['won'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['thresholds'] = {stage: round(value, 3) for stage, value in self._thresholds.items()}
+        return stats
+
+
+hedging = HedgePolicy(
+    enabled=settings.HEDGE_ENABLED,
+    percentile=settings.HEDGE_PERCENTILE,
+    min_delay=settings.HEDGE_MIN_DELAY,
+    max_ratio=settings.HEDGE_MAX_RATIO,
+)
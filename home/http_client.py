@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+from urllib.parse import urlparse
+
+import httpx
+from django.conf import settings
+
+try:
+    import brotli  # noqa: F401 (habilita 'br' no requests/urllib3 e no httpx)
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': ACCEPT_ENCODING,
+}
+
+
+class HttpStats:
+    # Bytes e latência por requisição (últimas N) + totais agregados
+    def __init__(self, history=1000):
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=history)
+        self.totals = {'requests': 0, 'errors': 0, 'bytes': 0, 'wire_bytes': 0, 'seconds': 0.0}
+
+    def record(self, url, status, nbytes, wire_bytes, seconds):
+        with self._lock:
+            self.recent.append({
+                'host': urlparse(url).netloc,
+                'status': status,
+                'bytes': nbytes,
+                'wire_bytes': wire_bytes,
+                'seconds': seconds,
+            })
+            self.totals['requests'] += 1
+            self.totals['bytes'] += nbytes
+            self.totals['wire_bytes'] += wire_bytes
+            self.totals['seconds'] += seconds
+            if status is None or status >= 400:
+                self.totals['errors'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.totals)
+        stats['avg_seconds'] = stats['seconds'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+
+http_stats = HttpStats()
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    # Sessão compartilhada (keep-alive) com pool dimensionado pela concorrência
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # requests só é importado pelo caminho síncrono legado
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.HTTP_POOL_SIZE,
+                    pool_maxsize=settings.HTTP_POOL_SIZE,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+def http_request(method, url, **kwargs):
+    import requests
+
+    kwargs.setdefault('timeout', (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+    start = time.perf_counter()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except requests.RequestException:
+        http_stats.record(url, None, 0, 0, time.perf_counter() - start)
+        raise
+    wire_bytes = int(response.headers.get('Content-Length', len(response.content)))
+    http_stats.record(url, response.status_code, len(response.content), wire_bytes, time.perf_counter() - start)
+    return response
+
+def http_get(url, **kwargs):
+    return http_request('GET', url, **kwargs)
+
+_ssl_context = None
+
+def ssl_context():
+    # Carregar os certificados custa ~40ms de CPU: um contexto por processo,
+    # não um por engine/requisição
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+    return _ssl_context
+
+def async_client(max_connections=None, **kwargs):
+    max_connections = max_connections or settings.HTTP_POOL_SIZE
+    kwargs.setdefault('verify', ssl_context())
+    kwargs.setdefault('timeout', httpx.Timeout(settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT))
+    kwargs.setdefault('follow_redirects', True)
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        headers=DEFAULT_HEADERS,
+        **kwargs,
+    )
+
+_loop_clients = weakref.WeakKeyDictionary()
+_loop_clients_lock = threading.Lock()
+
+def shared_async_client():
+    # Um AsyncClient por event loop (o do servidor ASGI, ou o de cada
+    # iter_transcripts): as requisições reaproveitam as conexões abertas
+    # (TLS incluído) em vez de abrir um pool por execução do engine. O pool
+    # cobre o limite do AIMD, que já limita as requisições do processo.
+    loop = asyncio.get_running_loop()
+    with _loop_clients_lock:
+        client = _loop_clients.get(loop)
+        if client is None or client.is_closed:
+            client = _loop_clients[loop] = async_client(
+                max_connections=max(settings.HTTP_POOL_SIZE, settings.UPSTREAM_CONCURRENCY_MAX))
+    return client
+
+async def close_shared_async_client():
+    # No fim do event loop (desligamento do servidor, fim do iter_transcripts)
+    with _loop_clients_lock:
+        client = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+async def async_request(client, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.HTTPError:
+        http_stats.record(url, None, 0, 0, time.perf_counter() - start)
+        raise
+    http_stats.record(url, response.status_code, len(response.content), response.num_bytes_downloaded, time.perf_counter() - start)
+    return response
+
+async def async_get(client, url, **kwargs):
+    return await async_request(client, 'GET', url, **kwargs)
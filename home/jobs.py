@@ -0,0 +1,221 @@
+import contextlib
+import os
+import socket
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import metrics
+from .engine import iter_transcripts
+from .models import TranscriptionJob
+from .output import make_sink, export_file_name
+from .channels import mark_exported
+from .resolver import iter_video_urls
+from .youtube import parse_track_specs
+
+logger = logging.getLogger(__name__)
+
+# Executor próprio para os jobs, separado das threads que atendem requisições
+_executor = ThreadPoolExecutor(
+    max_workers=settings.TRANSCRIPTION_JOB_WORKERS,
+    thread_name_prefix='transcription-job',
+)
+
+PROGRESS_INTERVAL = 1.0  # segundos entre gravações de progresso no banco
+ORPHANED = 'Job interrompido: o processo que o executava terminou.'
+
+# Jobs enviados que ainda não começaram a rodar
+_queued = 0
+_queued_lock = threading.Lock()
+_last_maintenance = None
+_maintenance_lock = threading.Lock()
+
+
+def executor_queue_depth():
+    return _queued
+
+def job_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def jobs_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'jobs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def artifact_path(job):
+    return os.path.join(jobs_dir(), f"{job.pk}.{job.export_format}")
+
+def submit_job(urls, only_new=False, source='', langs=None, export_format='txt', entry_format='txt'):
+    global _queued
+    job = TranscriptionJob.objects.create(
+        urls=urls, only_new=only_new, source=source or '',
+        lang=','.join(spec for spec in langs or () if spec),
+        export_format=export_format, entry_format=entry_format, owner=job_owner(),
+    )
+    with _queued_lock:
+        _queued += 1
+    _executor.submit(_start_job, job.pk)
+    return job
+
+def _start_job(job_id):
+    global _queued
+    with _queued_lock:
+        _queued -= 1
+    run_job(job_id)
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def recover_jobs():
+    # O executor vive no processo: depois de um reinício ou crash, os jobs
+    # que ele tinha ficariam pendentes/em andamento para sempre. Na mesma
+    # máquina o pid do dono diz se ele morreu; de outras (ou de antes do
+    # campo owner), vale o tempo sem progresso.
+    host = socket.gethostname()
+    stale = timezone.now() - timedelta(seconds=settings.TRANSCRIPTION_JOB_STALE_AFTER)
+    orphans = []
+    for job in TranscriptionJob.objects.filter(
+        status__in=[TranscriptionJob.STATUS_PENDING, TranscriptionJob.STATUS_RUNNING]
+    ):
+        owner_host, _, pid = job.owner.rpartition(':')
+        if owner_host == host and pid.isdigit():
+            if int(pid) == os.getpid() or _process_alive(int(pid)):
+                continue
+        elif job.updated_at >= stale:
+            continue
+        orphans.append(job)
+    if not orphans:
+        return 0
+    TranscriptionJob.objects.filter(pk__in=[job.pk for job in orphans]).update(
+        status=TranscriptionJob.STATUS_FAILED, error=ORPHANED, finished_at=timezone.now(),
+    )
+    for job in orphans:
+        # Arquivo parcial de quem parou no meio
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(artifact_path(job))
+    logger.warning(f"{len(orphans)} jobs órfãos marcados como falha")
+    return len(orphans)
+
+def expire_artifacts():
+    # Arquivos prontos ficam TRANSCRIPTION_JOB_ARTIFACT_TTL; depois o job
+    # continua consultável, mas sem download
+    cutoff = timezone.now() - timedelta(seconds=settings.TRANSCRIPTION_JOB_ARTIFACT_TTL)
+    expired = TranscriptionJob.objects.filter(finished_at__lt=cutoff).exclude(artifact='')
+    removed = 0
+    for artifact in expired.values_list('artifact', flat=True):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(artifact)
+            removed += 1
+    expired.update(artifact='')
+    # Sobras sem job (apagado pelo admin, crash antes de gravar o status)
+    directory = jobs_dir()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        with contextlib.suppress(FileNotFoundError):
+            if os.path.getmtime(path) < cutoff.timestamp():
+                os.remove(path)
+                removed += 1
+    return removed
+
+def maintain_jobs(force=False):
+    # Na primeira requisição do processo (request_started, home/apps.py) e
+    # depois a cada TRANSCRIPTION_JOB_MAINTENANCE_INTERVAL
+    global _last_maintenance
+    now = time.monotonic()
+    with _maintenance_lock:
+        if not force and _last_maintenance is not None \
+                and now - _last_maintenance < settings.TRANSCRIPTION_JOB_MAINTENANCE_INTERVAL:
+            return
+        _last_maintenance = now
+    try:
+        recover_jobs()
+        expire_artifacts()
+    except Exception as e:
+        logger.error(f"Falha na manutenção dos jobs: {e}")
+
+def run_job(job_id):
+    close_old_connections()
+    summary = metrics.start_summary()
+    job = TranscriptionJob.objects.get(pk=job_id)
+    if job.finished:
+        # Dado como órfão enquanto esperava na fila
+        return
+    try:
+        job.status = TranscriptionJob.STATUS_RUNNING
+        job.save(update_fields=['status', 'updated_at'])
+
+        # As URLs entram no engine conforme são enumeradas; `discovered`
+        # cresce junto e é gravado com o progresso.
+        def discovered(urls):
+            for url in urls:
+                job.discovered += 1
+                yield url
+
+        watermarks = {}
+        video_urls = iter_video_urls(job.urls, only_new=job.only_new, watermarks=watermarks)
+        head = list(islice(video_urls, 2))
+        langs = parse_track_specs(job.lang)
+        # Um vídeo com várias faixas também sai como vários blocos
+        single = len(head) == 1 and len(langs) == 1
+        sink = make_sink(job.export_format, job.entry_format, single)
+
+        def write(f, chunks):
+            for chunk in metrics.count_output(chunks):
+                f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+        artifact = artifact_path(job)
+        last_save = time.monotonic()
+        first_title = None
+        with open(artifact, 'wb') as f:
+            results = iter_transcripts(discovered(chain(head, video_urls)), source=job.source or None, lang=langs)
+            for result in results:
+                if result.title and result.transcript:
+                    job.fetched += 1
+                    job.cached += result.cached
+                    first_title = first_title or result.title
+                    write(f, sink.feed(result))
+                elif result.timed_out:
+                    # Fica registrado no arquivo em vez de sumir
+                    job.failed += 1
+                    write(f, sink.feed(result))
+                else:
+                    logger.warning(f"Transcrição não encontrada para o vídeo: {result.url}")
+                    job.failed += 1
+
+                if time.monotonic() - last_save >= PROGRESS_INTERVAL:
+                    job.save(update_fields=['discovered', 'fetched', 'failed', 'cached', 'updated_at'])
+                    last_save = time.monotonic()
+            write(f, sink.close())
+
+        if job.fetched:
+            job.status = TranscriptionJob.STATUS_DONE
+            job.artifact = artifact
+            job.file_name = export_file_name(job.export_format, single, first_title)
+            mark_exported(watermarks)
+        else:
+            os.remove(artifact)
+            job.status = TranscriptionJob.STATUS_FAILED
+            job.error = 'Nenhuma transcrição disponível para os vídeos fornecidos.'
+    except Exception as e:
+        logger.exception(f"Erro no job {job_id}: {e}")
+        job.status = TranscriptionJob.STATUS_FAILED
+        job.error = str(e)
+    finally:
+        job.finished_at = timezone.now()
+        job.save()
+        close_old_connections()
+        if summary is not None:
+            logger.info(f"Tempos por etapa do job {job_id}: {summary.as_dict()}")
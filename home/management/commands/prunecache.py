@@ -0,0 +1,31 @@
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove entradas vencidas e o excesso sobre MAX_ENTRIES dos caches em arquivo '
+        '(home/cache_backends.py). Rode pelo cron ou com --interval num processo à parte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Repete a cada N segundos em vez de sair')
+
+    def handle(self, *args, **options):
+        while True:
+            for alias in caches:
+                cache = caches[alias]
+                if not hasattr(cache, 'prune'):
+                    continue
+                start = time.perf_counter()
+                expired, culled = cache.prune()
+                self.stdout.write(
+                    f"{alias}: {expired} vencidas, {culled} acima do limite "
+                    f"({time.perf_counter() - start:.1f}s)"
+                )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from home.channels import mark_exported
+from home.engine import iter_transcripts
+from home.metadata import SOURCES
+from home.output import render_text_block, SEPARATOR
+from home.resolver import resolve_video_urls, video_key
+from home.youtube import parse_track_specs
+from home.writer import WriteError, transcript_writer
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+PROGRESS = '.progress'
+
+
+def read_urls(path):
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        return [line.strip() for line in stream if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def read_progress(path):
+    # Registro de um shard em andamento: uma linha JSON por vídeo terminado.
+    # Retorna (concluídos, com falha, tamanho do shard após o último vídeo).
+    shard = os.path.basename(path)[:-len(PROGRESS)]
+    done, failed, offset = {}, {}, 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # última linha cortada no meio
+            if 'error' in entry:
+                failed[entry['key']] = entry['error']
+            else:
+                done[entry['key']] = shard
+                offset = entry['offset']
+    return done, failed, offset
+
+
+class Manifest:
+    # Checkpoint da execução: IDs concluídos (-> shard), com falha (-> motivo)
+    # e pendentes. Gravado de forma atômica após cada shard; dentro do shard
+    # cada vídeo fica registrado em <shard>.progress assim que termina.
+    def __init__(self, path):
+        self.path = path
+        self.completed = {}
+        self.failed = {}
+        self.pending = []
+        self.shards = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.completed = data.get('completed', {})
+            self.failed = data.get('failed', {})
+            self.pending = data.get('pending', [])
+            self.shards = data.get('shards', 0)
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'completed': self.completed,
+                'failed': self.failed,
+                'pending': self.pending,
+                'shards': self.shards,
+            }, f)
+        os.replace(tmp, self.path)
+
+    def record(self, done, failed, keys):
+        # Resultado de um shard: keys saem dos pendentes
+        self.completed.update(done)
+        self.failed.update(failed)
+        self.pending = [url for url in self.pending if video_key(url) not in keys]
+        self.save()
+
+    def recover_shards(self):
+        # Shards interrompidos (Ctrl-C, processo morto): os vídeos que já
+        # terminaram entram no manifesto e o que veio depois do último deles
+        # é cortado do arquivo; o resto continua pendente.
+        directory = os.path.dirname(self.path)
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith('transcripts-') and name.endswith(PROGRESS)):
+                continue
+            progress = os.path.join(directory, name)
+            done, failed, offset = read_progress(progress)
+            shard = progress[:-len(PROGRESS)]
+            if os.path.exists(shard):
+                with open(shard, 'r+b') as f:
+                    f.truncate(offset)
+            self.record(done, failed, done.keys() | failed.keys())
+            os.remove(progress)
+
+    def remove_orphan_shards(self):
+        # Shards que não chegaram ao manifesto (execução interrompida) seriam
+        # duplicados na retomada: os vídeos deles continuam pendentes.
+        directory = os.path.dirname(self.path)
+        referenced = set(self.completed.values())
+        for name in os.listdir(directory):
+            if name.startswith('transcripts-') and name not in referenced:
+                os.remove(os.path.join(directory, name))
+
+
+def init_worker():
+    # Ctrl-C chega a todo o grupo de processos: só o pai trata (e encerra o
+    # pool); os filhos terminam o shard em andamento
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import django
+    django.setup()
+
+def transcribe_shard(path, urls, options):
+    # Roda num processo do pool: um engine assíncrono por processo, com as
+    # mesmas funções de extração/renderização da view. Com várias faixas
+    # (--lang pt,en:asr) os resultados de um vídeo são juntados: ele conta
+    # como concluído se alguma faixa saiu e só falha se nenhuma saiu.
+    tracks = len(parse_track_specs(options.get('lang')))
+    done, failed, received = {}, {}, {}
+    with open(path, 'ab') as f, open(f"{path}{PROGRESS}", 'a', encoding='utf-8') as progress:
+        def finish(key, results):
+            ok = [result for result in results if result.title and result.transcript]
+            if ok:
+                for result in ok:
+                    f.write(''.join(render_text_block(result)).encode('utf-8'))
+                    f.write(SEPARATOR.encode('utf-8'))
+                f.flush()
+                done[key] = os.path.basename(path)
+                entry = {'key': key, 'offset': f.tell()}
+            else:
+                errors = dict.fromkeys(result.error or 'sem transcrição' for result in results)
+                failed[key] = '; '.join(errors)
+                entry = {'key': key, 'error': failed[key]}
+            progress.write(json.dumps(entry) + '\n')
+            progress.flush()
+
+        for result in iter_transcripts(urls, **options):
+            key = video_key(result.url)
+            results = received.setdefault(key, [])
+            results.append(result)
+            if len(results) == tracks:
+                finish(key, received.pop(key))
+        for key, results in received.items():
+            finish(key, results)
+    written = os.path.getsize(path)
+    if not done:
+        os.remove(path)
+    # Segmentos ainda na fila do writer entram no banco antes do shard contar
+    try:
+        transcript_writer.flush()
+    except WriteError as e:
+        # O arquivo do shard já está completo; só a busca fica sem esses vídeos
+        logger.error(f"Shard {os.path.basename(path)}: {e}")
+    connections.close_all()
+    return done, failed, written
+
+
+class Command(BaseCommand):
+    help = 'Transcreve URLs/canais de um arquivo (ou stdin) em arquivos sharded, com checkpoint para retomar.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', default='-', help="Arquivo com uma URL por linha ('-' = stdin)")
+        parser.add_argument('--output-dir', default='transcripts')
+        parser.add_argument('--shard-size', type=int, default=500, help='Vídeos por arquivo de saída')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processos')
+        parser.add_argument('--concurrency', type=int, default=None, help='Requisições simultâneas por processo')
+        parser.add_argument('--lang', default=None, help="Idiomas/tipos separados por vírgula (ex.: pt,en:asr)")
+        parser.add_argument('--source', default=None, choices=sorted(SOURCES))
+        parser.add_argument('--only-new', action='store_true', help='Canais: apenas vídeos novos')
+        parser.add_argument('--retry-failed', action='store_true', help='Tenta de novo os que falharam')
+
+    def handle(self, *args, **options):
+        try:
+            parse_track_specs(options['lang'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        output_dir = options['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = Manifest(os.path.join(output_dir, MANIFEST))
+        manifest.recover_shards()
+        manifest.remove_orphan_shards()
+
+        urls = []
+        watermarks = {}
+        # Sem arquivo e sem stdin redirecionado: só retoma os pendentes
+        if options['input'] != '-' or not sys.stdin.isatty():
+            urls = resolve_video_urls(read_urls(options['input']), only_new=options['only_new'],
+                                      watermarks=watermarks)
+        # Pendentes de uma execução interrompida + entradas novas, sem repetir
+        queue, seen = [], set()
+        for url in manifest.pending + urls:
+            key = video_key(url)
+            if key in seen or key in manifest.completed:
+                continue
+            if key in manifest.failed and not options['retry_failed']:
+                continue
+            seen.add(key)
+            queue.append(url)
+        if not queue:
+            raise CommandError('Nada a fazer: nenhuma URL pendente.')
+
+        for url in queue:
+            manifest.failed.pop(video_key(url), None)
+        manifest.pending = queue
+        manifest.save()
+
+        size = options['shard_size']
+        shards = []
+        for start in range(0, len(queue), size):
+            path = os.path.join(output_dir, f"transcripts-{manifest.shards:05d}.txt")
+            shards.append((path, queue[start:start + size]))
+            manifest.shards += 1
+        # Nomes de shard nunca se repetem, mesmo se nada terminar
+        manifest.save()
+
+        engine_options = {'lang': options['lang'], 'source': options['source']}
+        if options['concurrency']:
+            engine_options['concurrency'] = options['concurrency']
+
+        self.stdout.write(f"{len(queue)} vídeos em {len(shards)} shards, {options['workers']} processos")
+        # Conexões abertas não podem ser herdadas pelos processos filhos
+        connections.close_all()
+        started = time.perf_counter()
+        ok = failed = written = lost = 0
+        pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker)
+        futures = {pool.submit(transcribe_shard, path, urls, engine_options): (path, urls) for path, urls in shards}
+
+        def record(future):
+            path, urls = futures.pop(future)
+            try:
+                done, errors, nbytes = future.result()
+            except Exception as e:
+                # Os vídeos do shard continuam pendentes (os que terminaram
+                # ficam no .progress e são recuperados na próxima execução)
+                self.stderr.write(f"Shard falhou: {e}")
+                return None
+            manifest.record(done, errors, {video_key(url) for url in urls})
+            if os.path.exists(f"{path}{PROGRESS}"):
+                os.remove(f"{path}{PROGRESS}")
+            return done, errors, nbytes
+
+        try:
+            for future in as_completed(list(futures)):
+                outcome = record(future)
+                if outcome is None:
+                    lost += 1
+                    continue
+                done, errors, nbytes = outcome
+                ok, failed, written = ok + len(done), failed + len(errors), written + nbytes
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{ok + failed}/{len(queue)} vídeos ({ok / elapsed:.1f} vídeos/s)")
+        except KeyboardInterrupt:
+            # Shards na fila são descartados; os em andamento terminam (os
+            # filhos ignoram SIGINT) e entram no manifesto. Um segundo Ctrl-C
+            # sai na hora: o .progress de cada shard guarda os vídeos prontos.
+            self.stderr.write("Interrompido: terminando os shards em andamento (Ctrl-C de novo para sair já)...")
+            pool.shutdown(wait=True, cancel_futures=True)
+            for future in list(futures):
+                if future.done() and not future.cancelled():
+                    record(future)
+            raise CommandError(
+                f"Interrompido: {len(manifest.completed)} concluídos, {len(manifest.pending)} pendentes. "
+                f"Rode de novo com --output-dir {output_dir} para retomar."
+            )
+        pool.shutdown()
+        if not lost:
+            # Todos os shards no manifesto: os vídeos listados deixam de ser novos
+            mark_exported(watermarks)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Concluído em {elapsed:.1f}s: {ok} transcrições, {failed} falhas, "
+            f"{ok / elapsed:.1f} vídeos/s, {written / 1e6:.1f} MB escritos em {output_dir}"
+        ))
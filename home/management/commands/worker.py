@@ -0,0 +1,187 @@
+import json
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, close_old_connections
+
+from home import workqueue
+from home.engine import iter_transcripts
+from home.resolver import iter_video_urls
+from home.writer import WriteError, transcript_writer
+from home.youtube import is_channel_url, is_playlist_url, parse_track_specs, track_key
+
+# Erros que não mudam numa nova tentativa
+PERMANENT_ERRORS = ('sem transcrição',)
+UNSAVED = 'falha ao gravar no banco'
+
+
+class Heartbeat(threading.Thread):
+    # Renova a lease da reserva enquanto o lote roda
+    def __init__(self, token, lease):
+        super().__init__(name='work-heartbeat', daemon=True)
+        self.token = token
+        self.lease = lease
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.lease / 3):
+                workqueue.heartbeat(self.token, self.lease)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa a fila de trabalho (WorkItem) do banco. Rode quantos quiser, em quantos nós '
+        'quiser; enfileire com --enqueue e acompanhe com --stats.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enqueue', metavar='ARQUIVO', help="Enfileira as URLs do arquivo ('-' = stdin) e sai")
+        parser.add_argument('--stats', action='store_true', help='Mostra a fila e a vazão por worker e sai')
+        parser.add_argument('--minutes', type=int, default=60, help='Janela do --stats')
+        parser.add_argument('--worker-id', default=None, help='Padrão: host:pid')
+        parser.add_argument('--batch', type=int, default=None, help='Itens reservados por vez')
+        parser.add_argument('--lease', type=int, default=None, help='Segundos de lease (renovada a cada 1/3)')
+        parser.add_argument('--concurrency', type=int, default=None, help='Requisições simultâneas')
+        parser.add_argument('--lang', default=None, help='--enqueue: idiomas/tipos (ex.: pt,en:asr)')
+        parser.add_argument('--source', default='', help='--enqueue: fonte de metadados')
+        parser.add_argument('--max-attempts', type=int, default=None, help='--enqueue: tentativas por item')
+        parser.add_argument('--exit-when-empty', action='store_true', help='Sai quando não houver nada pendente')
+        parser.add_argument('--idle-sleep', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            return self.enqueue(options)
+        if options['stats']:
+            return self.stats(options['minutes'])
+
+        worker = options['worker_id'] or f"{socket.gethostname()}:{os.getpid()}"
+        batch = options['batch'] or settings.WORK_QUEUE_BATCH
+        lease = options['lease'] or settings.WORK_QUEUE_LEASE
+        stopping = threading.Event()
+        # SIGTERM (deploy, autoscaling): termina o lote atual e sai
+        signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+
+        self.stdout.write(f"Worker {worker}: lotes de {batch}, lease de {lease}s")
+        processed = 0
+        started = time.perf_counter()
+        while not stopping.is_set():
+            token, items = workqueue.claim(worker, batch, lease)
+            if not items:
+                if options['exit_when_empty'] and not workqueue.has_work():
+                    break
+                close_old_connections()
+                stopping.wait(options['idle_sleep'])
+                continue
+
+            heartbeat = Heartbeat(token, lease)
+            heartbeat.start()
+            try:
+                self.process(items, token, options)
+            except KeyboardInterrupt:
+                workqueue.release(token)
+                raise CommandError(f"Interrompido: itens da reserva {token} devolvidos à fila.")
+            finally:
+                heartbeat.stop()
+            processed += len(items)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{worker}: {processed} itens ({processed / elapsed:.1f} itens/s)")
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker} encerrado: {processed} itens."))
+
+    def process(self, items, token, options):
+        videos = {}
+        for item in items:
+            if is_channel_url(item.url) or is_playlist_url(item.url):
+                # Canal/playlist vira um item por vídeo, que qualquer worker pega
+                found = []
+
+                def listed(urls):
+                    for url in urls:
+                        found.append(url)
+                        yield url
+
+                workqueue.enqueue(listed(iter_video_urls([item.url])), lang=item.lang, source=item.source,
+                                  max_attempts=item.max_attempts)
+                if found:
+                    # Vídeos já na fila não entram de novo: nada novo também é sucesso
+                    workqueue.complete(item, token)
+                else:
+                    # Listagem vazia (inclusive falha ao listar): tenta de novo
+                    workqueue.fail(item, token, 'nenhum vídeo encontrado')
+            else:
+                videos.setdefault((item.lang, item.source), []).append(item)
+
+        for (lang, source), group in videos.items():
+            by_url = {item.url: item for item in group}
+            outcomes = {url: [] for url in by_url}
+            engine_options = {'lang': lang or None, 'source': source or None}
+            if options['concurrency']:
+                engine_options['concurrency'] = options['concurrency']
+            single = len(parse_track_specs(lang)) == 1
+
+            for result in iter_transcripts(list(by_url), **engine_options):
+                outcomes[result.url].append(result)
+                if result.video_id and result.transcript and not settings.TRANSCRIPT_INDEX_ENABLED:
+                    # O worker arquiva no banco mesmo com o índice desligado
+                    transcript_writer.put(result.video_id, track_key(result.lang, result.kind), result.transcript,
+                                          result.title, result.upload_date, block=True)
+            # O item só conta como feito com os segmentos gravados
+            try:
+                transcript_writer.flush()
+                unsaved = set()
+            except WriteError as e:
+                unsaved = e.keys
+
+            for url, results in outcomes.items():
+                item = by_url[url]
+                for result in results:
+                    if result.transcript and (result.video_id, track_key(result.lang, result.kind)) in unsaved:
+                        result.transcript, result.error = None, UNSAVED
+                self.settle(item, token, results, single)
+
+    def settle(self, item, token, results, single):
+        # Conclui o item ou devolve à fila só o que pode mudar numa nova
+        # tentativa; faixas já gravadas não são buscadas de novo
+        failed = [result for result in results if not result.transcript]
+        errors = [result.error or 'sem resultado' for result in failed]
+        if not results:
+            workqueue.fail(item, token, 'sem resultado do engine')
+        elif all(error in PERMANENT_ERRORS for error in errors) and len(failed) < len(results):
+            # Pelo menos uma faixa saiu; as outras não existem no vídeo
+            workqueue.complete(item, token)
+        elif all(error in PERMANENT_ERRORS for error in errors):
+            workqueue.fail(item, token, '; '.join(errors), retry=False)
+        elif single or len(failed) == len(results):
+            workqueue.fail(item, token, '; '.join(errors))
+        else:
+            transient = [result.track for result in failed if result.error not in PERMANENT_ERRORS]
+            workqueue.fail(item, token, '; '.join(errors), lang=','.join(transient))
+
+    def enqueue(self, options):
+        from home.management.commands.transcribe import read_urls
+
+        try:
+            parse_track_specs(options['lang'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        urls = read_urls(options['enqueue'])
+        added = workqueue.enqueue(urls, lang=options['lang'], source=options['source'],
+                                  max_attempts=options['max_attempts'])
+        self.stdout.write(self.style.SUCCESS(f"{added} itens enfileirados ({len(urls) - added} já estavam na fila)."))
+
+    def stats(self, minutes):
+        self.stdout.write(json.dumps({
+            'queue': workqueue.queue_summary(),
+            'workers': workqueue.worker_throughput(minutes),
+        }, indent=2, default=str))
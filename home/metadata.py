@@ -0,0 +1,103 @@
+import json
+import logging
+from urllib.parse import urlparse, parse_qs
+
+from django.conf import settings
+
+from . import metrics
+from .extractors import ExtractionError, parse_watch_page
+
+logger = logging.getLogger(__name__)
+
+# Fontes de metadados do vídeo (título, data e lista de legendas). A fonte
+# escolhida é tentada primeiro; se a resposta não servir (ExtractionError ou
+# status != 200), o engine passa para a raspagem da página do vídeo.
+
+
+class MetadataSource:
+    name = None
+    stage = None  # etapa em home/metrics.py para o download
+
+    def request(self, url, video_id):
+        # Retorna (método, url, kwargs) da requisição HTTP
+        raise NotImplementedError
+
+    def parse(self, content):
+        # Retorna (title, upload_date, caption_tracks); caption_tracks é None
+        # quando o vídeo não tem transcrição
+        raise NotImplementedError
+
+
+class WatchPageSource(MetadataSource):
+    # Página HTML completa (centenas de KB a mais de 1 MB)
+    name = 'watch_page'
+    stage = 'watch_page_download'
+
+    def request(self, url, video_id):
+        return 'GET', url, {}
+
+    def parse(self, content):
+        return parse_watch_page(content)
+
+
+class PlayerApiSource(MetadataSource):
+    # Só o JSON do player (endpoint interno youtubei/v1/player), sem o HTML
+    name = 'player_api'
+    stage = 'player_api_download'
+
+    def endpoint(self, url):
+        parsed = urlparse(url)
+        if 'youtube' in parsed.netloc or 'youtu.be' in parsed.netloc:
+            return settings.YOUTUBE_PLAYER_API_URL
+        # Servidor local (stub/replay) fazendo o papel do YouTube
+        return f"{parsed.scheme}://{parsed.netloc}/youtubei/v1/player"
+
+    def request(self, url, video_id):
+        video_id = video_id or parse_qs(urlparse(url).query).get('v', [None])[0]
+        if not video_id:
+            raise ExtractionError("URL sem ID de vídeo")
+        body = {
+            'context': {'client': {
+                'clientName': settings.YOUTUBE_PLAYER_API_CLIENT,
+                'clientVersion': settings.YOUTUBE_PLAYER_API_CLIENT_VERSION,
+                'hl': settings.YOUTUBE_PLAYER_API_HL,
+            }},
+            'videoId': video_id,
+        }
+        return 'POST', self.endpoint(url), {'json': body}
+
+    def parse(self, content):
+        with metrics.timer('json_decode'):
+            try:
+                data = json.loads(content)
+            except ValueError as e:
+                raise ExtractionError(f"JSON do player inválido: {e}")
+        details = data.get('videoDetails') if isinstance(data, dict) else None
+        if not details or 'title' not in details:
+            status = (data.get('playabilityStatus') or {}).get('status') if isinstance(data, dict) else None
+            raise ExtractionError(f"player sem videoDetails (status {status})")
+
+        # Alguns clientes (ANDROID) nem sempre mandam o microformat; sem
+        # data aqui o engine completa com a próxima fonte
+        microformat = (data.get('microformat') or {}).get('playerMicroformatRenderer') or {}
+        upload_date = (microformat.get('publishDate') or microformat.get('uploadDate')
+                       or details.get('publishDate'))
+        captions = data.get('captions')
+        if not captions:
+            logger.error("Nenhuma transcrição disponível para este vídeo.")
+            return details['title'], upload_date, None
+        return details['title'], upload_date, captions['playerCaptionsTracklistRenderer']['captionTracks']
+
+
+SOURCES = {source.name: source for source in (PlayerApiSource(), WatchPageSource())}
+FALLBACK = 'watch_page'
+
+
+def get_sources(name=None):
+    # Fonte pedida (ou METADATA_SOURCE) seguida do fallback por HTML
+    name = name or settings.METADATA_SOURCE
+    if name not in SOURCES:
+        raise ValueError(f"Fonte de metadados desconhecida: {name}")
+    if name == FALLBACK:
+        return [SOURCES[name]]
+    return [SOURCES[name], SOURCES[FALLBACK]]
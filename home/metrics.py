@@ -0,0 +1,240 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+from django.conf import settings
+
+# Instrumentação por etapa do pipeline. Com METRICS_ENABLED=false e sem
+# resumo por requisição, timer() devolve um context manager nulo e os
+# wrappers devolvem o iterável original: o custo é um if por chamada.
+
+ENABLED = settings.METRICS_ENABLED
+
+STAGES = (
+    'channel_enumeration',   # listagem do canal via youtube_dl
+    'watch_page_download',
+    'player_api_download',
+    'html_parse',            # título/data (regex) ou BeautifulSoup no fallback
+    'json_decode',           # ytInitialPlayerResponse ou JSON do player API
+    'caption_download',
+    'xml_parse',
+    'write',                 # renderização + escrita da saída
+    'persist',               # gravação em lote no banco (home/writer.py)
+)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL = nullcontext()
+_summary = contextvars.ContextVar('metrics_summary', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self.counters = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+class RequestSummary:
+    # Tempo acumulado por etapa de uma requisição/job. É compartilhado pelas
+    # threads do engine (asyncio.to_thread e create_task copiam o contexto).
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            count, total = self.stages.get(stage, (0, 0.0))
+            self.stages[stage] = (count + 1, total + seconds)
+
+    def as_dict(self):
+        with self._lock:
+            stages = {stage: {'count': count, 'seconds': round(total, 4)} for stage, (count, total) in self.stages.items()}
+        stages['elapsed'] = round(time.perf_counter() - self.started, 4)
+        return stages
+
+
+registry = Registry()
+
+
+def start_summary():
+    # Chamado no início de cada requisição/job: o resumo fica no contexto
+    # atual (ou é limpo, se o resumo por requisição estiver desligado).
+    summary = RequestSummary() if settings.METRICS_REQUEST_SUMMARY else None
+    _summary.set(summary)
+    return summary
+
+
+class _Timer:
+    __slots__ = ('stage', 'summary', 'start')
+
+    def __init__(self, stage, summary):
+        self.stage = stage
+        self.summary = summary
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if ENABLED:
+            registry.observe(self.stage, elapsed)
+        if self.summary is not None:
+            self.summary.observe(self.stage, elapsed)
+        return False
+
+
+def timer(stage):
+    summary = _summary.get()
+    if not ENABLED and summary is None:
+        return _NULL
+    return _Timer(stage, summary)
+
+
+def incr(name, value=1, **labels):
+    if ENABLED:
+        registry.incr(name, value, **labels)
+
+
+def timed_iter(iterable, stage):
+    # Mede só o tempo gasto produzindo cada item (não o do consumidor)
+    if not ENABLED and _summary.get() is None:
+        return iterable
+    return _timed_iter(iter(iterable), stage)
+
+def _timed_iter(iterator, stage):
+    while True:
+        with timer(stage):
+            item = next(iterator, _NULL)
+        if item is _NULL:
+            return
+        yield item
+
+
+def count_output(chunks):
+    if not ENABLED:
+        return chunks
+    return _count_output(chunks)
+
+def _count_output(chunks):
+    for chunk in chunks:
+        registry.incr('output_bytes_total', len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk))
+        yield chunk
+
+async def acount_output(chunks):
+    async for chunk in chunks:
+        if ENABLED:
+            registry.incr('output_bytes_total', len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk))
+        yield chunk
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+def _app_samples():
+    # Contadores que já existem em outros módulos são lidos só na coleta
+    from .cache import transcript_cache, manifest_cache
+    from .hedging import hedging
+    from .engine import queue_depths
+    from .http_client import http_stats
+    from .jobs import executor_queue_depth
+    from .singleflight import singleflight
+    from .throttle import upstream
+    from .writer import transcript_writer
+
+    http = http_stats.snapshot()
+    cache = transcript_cache.stats()
+    manifests = manifest_cache.stats()
+    flight = singleflight.stats()
+    limiter = upstream.snapshot()
+    writer = transcript_writer.stats()
+    hedges = hedging.stats()
+    depths = dict(queue_depths(), job_executor=executor_queue_depth(), transcript_writer=writer['queued'])
+    return [
+        ('yt_http_requests_total', 'counter', 'Requisições HTTP ao upstream', [((), http['requests'])]),
+        ('yt_http_errors_total', 'counter', 'Requisições HTTP com erro ou status >= 400', [((), http['errors'])]),
+        ('yt_http_bytes_in_total', 'counter', 'Bytes recebidos (descomprimidos)', [((), http['bytes'])]),
+        ('yt_http_wire_bytes_in_total', 'counter', 'Bytes recebidos na rede', [((), http['wire_bytes'])]),
+        ('yt_cache_hits_total', 'counter', 'Acertos no cache de transcrições',
+         [((('tier', 'local'),), cache['local_hits']), ((('tier', 'shared'),), cache['shared_hits'])]),
+        ('yt_cache_misses_total', 'counter', 'Faltas no cache de transcrições', [((), cache['misses'])]),
+        ('yt_manifest_cache_hits_total', 'counter', 'Acertos no cache de listas de legendas', [((), manifests['hits'])]),
+        ('yt_manifest_cache_misses_total', 'counter', 'Faltas no cache de listas de legendas', [((), manifests['misses'])]),
+        ('yt_manifest_cache_invalidations_total', 'counter', 'Listas de legendas descartadas por baseUrl recusado',
+         [((), manifests['invalidations'])]),
+        ('yt_singleflight_saved_total', 'counter', 'Fetches evitados por coalescência', [((), flight['saved_fetches'])]),
+        ('yt_upstream_concurrency_limit', 'gauge', 'Limite AIMD atual', [((), limiter['limit'])]),
+        ('yt_upstream_inflight', 'gauge', 'Requisições ao upstream em andamento', [((), limiter['inflight'])]),
+        ('yt_upstream_waiting', 'gauge', 'Requisições esperando vaga no limite AIMD', [((), limiter['waiting'])]),
+        ('yt_upstream_retries_total', 'counter', 'Novas tentativas ao upstream', [((), limiter['retries'])]),
+        ('yt_hedges_total', 'counter', 'Cópias (hedge) de requisições lentas', [((), hedges['sent'])]),
+        ('yt_hedge_wins_total', 'counter', 'Hedges que responderam primeiro', [((), hedges['won'])]),
+        ('yt_hedge_threshold_seconds', 'gauge', 'Limiar atual do hedge por etapa',
+         [((('stage', stage),), value) for stage, value in sorted(hedges['thresholds'].items())]),
+        ('yt_writer_videos_total', 'counter', 'Vídeos gravados pelo writer em lote', [((), writer['videos'])]),
+        ('yt_writer_batches_total', 'counter', 'Lotes gravados pelo writer', [((), writer['batches'])]),
+        ('yt_writer_errors_total', 'counter', 'Lotes com erro no writer', [((), writer['errors'])]),
+        ('yt_queue_depth', 'gauge', 'Itens aguardando nas filas',
+         [((('queue', name),), depth) for name, depth in sorted(depths.items())]),
+    ]
+
+def render():
+    # Formato texto do Prometheus (exposition format 0.0.4)
+    lines = [
+        '# HELP yt_stage_seconds Tempo por etapa do pipeline',
+        '# TYPE yt_stage_seconds histogram',
+    ]
+    with registry._lock:
+        histograms = {stage: (list(h.counts), h.sum, h.count) for stage, h in registry.histograms.items()}
+        counters = dict(registry.counters)
+    for stage, (counts, total, count) in histograms.items():
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ('+Inf',), counts):
+            cumulative += n
+            lines.append(f'yt_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'yt_stage_seconds_sum{{stage="{stage}"}} {total}')
+        lines.append(f'yt_stage_seconds_count{{stage="{stage}"}} {count}')
+
+    names = sorted({name for name, _ in counters})
+    for name in names:
+        lines.append(f'# TYPE yt_{name} counter')
+        for (sample, labels), value in sorted(counters.items()):
+            if sample == name:
+                lines.append(f'yt_{name}{_labels(labels)} {value}')
+
+    for name, kind, help_text, samples in _app_samples():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
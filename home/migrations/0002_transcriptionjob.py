@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:01
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptionJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('urls', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Em andamento'), ('done', 'Concluído'), ('failed', 'Falhou')], default='pending', max_length=16)),
+                ('discovered', models.PositiveIntegerField(default=0)),
+                ('fetched', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('cached', models.PositiveIntegerField(default=0)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('artifact', models.CharField(blank=True, max_length=500)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0002_transcriptionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Channel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500, unique=True)),
+                ('last_refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_exported_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='only_new',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ChannelVideo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(max_length=32)),
+                ('first_seen_at', models.DateTimeField(db_index=True)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='videos', to='home.channel')),
+            ],
+            options={
+                'ordering': ['-first_seen_at', 'position'],
+                'unique_together': {('channel', 'video_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE home_segment_fts USING fts5("
+    "text, content='home_segment', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER home_segment_ai AFTER INSERT ON home_segment BEGIN "
+    "INSERT INTO home_segment_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER home_segment_ad AFTER DELETE ON home_segment BEGIN "
+    "INSERT INTO home_segment_fts(home_segment_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER home_segment_au AFTER UPDATE ON home_segment BEGIN "
+    "INSERT INTO home_segment_fts(home_segment_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO home_segment_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS home_segment_au",
+    "DROP TRIGGER IF EXISTS home_segment_ad",
+    "DROP TRIGGER IF EXISTS home_segment_ai",
+    "DROP TABLE IF EXISTS home_segment_fts",
+]
+POSTGRES_GIN = ["CREATE INDEX home_segment_text_tsv ON home_segment USING gin (to_tsvector('simple', text))"]
+POSTGRES_GIN_DROP = ["DROP INDEX IF EXISTS home_segment_text_tsv"]
+
+
+def run_statements(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+def create_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        run_statements(schema_editor, POSTGRES_GIN)
+    elif vendor == 'sqlite':
+        run_statements(schema_editor, SQLITE_FTS)
+
+def drop_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        run_statements(schema_editor, POSTGRES_GIN_DROP)
+    elif vendor == 'sqlite':
+        run_statements(schema_editor, SQLITE_FTS_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0003_channel_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('start', models.FloatField()),
+                ('duration', models.FloatField(default=0)),
+                ('text', models.TextField()),
+            ],
+            options={
+                'ordering': ['video', 'position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Video',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(max_length=32)),
+                ('lang', models.CharField(blank=True, default='', max_length=16)),
+                ('title', models.CharField(blank=True, max_length=500)),
+                ('upload_date', models.CharField(blank=True, max_length=100)),
+                ('segment_count', models.PositiveIntegerField(default=0)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('video_id', 'lang')},
+            },
+        ),
+        migrations.DeleteModel(
+            name='TestModel',
+        ),
+        migrations.AddField(
+            model_name='segment',
+            name='video',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='home.video'),
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0004_transcript_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='source',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0005_transcriptionjob_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500)),
+                ('lang', models.CharField(blank=True, default='', max_length=64)),
+                ('source', models.CharField(blank=True, max_length=32)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Em andamento'), ('done', 'Concluído'), ('failed', 'Falhou')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('available_at', models.DateTimeField()),
+                ('worker', models.CharField(blank=True, max_length=200)),
+                ('claim', models.CharField(blank=True, max_length=32)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='workitem_ready_idx'), models.Index(fields=['status', 'lease_expires_at'], name='workitem_lease_idx'), models.Index(fields=['finished_at', 'worker'], name='workitem_finished_idx'), models.Index(fields=['claim'], name='workitem_claim_idx')],
+                'unique_together': {('url', 'lang', 'source')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0006_workitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='entry_format',
+            field=models.CharField(default='txt', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='export_format',
+            field=models.CharField(default='txt', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='lang',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
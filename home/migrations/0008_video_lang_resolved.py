@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0007_transcriptionjob_lang_format'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='video',
+            name='lang',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
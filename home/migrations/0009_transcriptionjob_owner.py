@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_video_lang_resolved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='owner',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+    ]
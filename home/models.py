@@ -1,4 +1,150 @@
+import uuid
+
 from django.db import models
 
-class TestModel(models.Model):
-    name = models.CharField(max_length=100)
\ No newline at end of file
+class TranscriptionJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_RUNNING, 'Em andamento'),
+        (STATUS_DONE, 'Concluído'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    urls = models.JSONField(default=list)
+    only_new = models.BooleanField(default=False)
+    # Fonte de metadados (home/metadata.py); vazio = METADATA_SOURCE
+    source = models.CharField(max_length=32, blank=True)
+    # Faixas pedidas ('pt,en:asr', vazio = padrão) e formato do arquivo (home/output.py)
+    lang = models.CharField(max_length=64, blank=True, default='')
+    export_format = models.CharField(max_length=16, default='txt')
+    entry_format = models.CharField(max_length=8, default='txt')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    discovered = models.PositiveIntegerField(default=0)
+    fetched = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    cached = models.PositiveIntegerField(default=0)
+    # host:pid do processo que roda o job (home/jobs.py recover_jobs)
+    owner = models.CharField(max_length=200, blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    # Vazio depois que o arquivo expira (TRANSCRIPTION_JOB_ARTIFACT_TTL)
+    artifact = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def progress(self):
+        return {
+            'id': str(self.id),
+            'status': self.status,
+            'discovered': self.discovered,
+            'fetched': self.fetched,
+            'failed': self.failed,
+            'cached': self.cached,
+            'error': self.error,
+        }
+
+
+class Channel(models.Model):
+    url = models.CharField(max_length=500, unique=True)
+    last_refreshed_at = models.DateTimeField(null=True, blank=True)
+    last_exported_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.url
+
+class ChannelVideo(models.Model):
+    channel = models.ForeignKey(Channel, related_name='videos', on_delete=models.CASCADE)
+    video_id = models.CharField(max_length=32)
+    first_seen_at = models.DateTimeField(db_index=True)
+    # Posição dentro do lote em que o vídeo foi visto (0 = mais recente)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('channel', 'video_id')]
+        ordering = ['-first_seen_at', 'position']
+
+
+class Video(models.Model):
+    video_id = models.CharField(max_length=32)
+    # Faixa resolvida (home/youtube.py track_key): 'pt' ou 'pt:asr'
+    lang = models.CharField(max_length=32, blank=True, default='')
+    title = models.CharField(max_length=500, blank=True)
+    upload_date = models.CharField(max_length=100, blank=True)
+    segment_count = models.PositiveIntegerField(default=0)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('video_id', 'lang')]
+
+    def __str__(self):
+        return f"{self.video_id} ({self.title})"
+
+class Segment(models.Model):
+    # Índice de texto criado na migração 0004: GIN sobre to_tsvector no
+    # Postgres, tabela FTS5 (home_segment_fts) mantida por triggers no SQLite.
+    video = models.ForeignKey(Video, related_name='segments', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    start = models.FloatField()
+    duration = models.FloatField(default=0)
+    text = models.TextField()
+
+    class Meta:
+        ordering = ['video', 'position']
+
+
+class WorkItem(models.Model):
+    # Fila de trabalho no banco para vários workers (manage.py worker), em
+    # vários nós. O item é reservado com SELECT ... FOR UPDATE SKIP LOCKED e
+    # fica com o worker enquanto a lease for renovada; lease vencida (worker
+    # morto) devolve o item à fila.
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_RUNNING, 'Em andamento'),
+        (STATUS_DONE, 'Concluído'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    url = models.CharField(max_length=500)
+    # Faixas pedidas (home/youtube.py parse_track_specs), '' = padrão
+    lang = models.CharField(max_length=64, blank=True, default='')
+    source = models.CharField(max_length=32, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Pendente só é reservado a partir daqui (espera entre tentativas)
+    available_at = models.DateTimeField()
+    worker = models.CharField(max_length=200, blank=True)
+    # Identifica a reserva: um worker que perdeu a lease não grava mais
+    claim = models.CharField(max_length=32, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [('url', 'lang', 'source')]
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='workitem_ready_idx'),
+            models.Index(fields=['status', 'lease_expires_at'], name='workitem_lease_idx'),
+            models.Index(fields=['finished_at', 'worker'], name='workitem_finished_idx'),
+            models.Index(fields=['claim'], name='workitem_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.url} ({self.status})"
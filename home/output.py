@@ -0,0 +1,254 @@
+import json
+import logging
+import zipfile
+import zlib
+
+from django.utils.text import slugify
+
+from . import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n" + "=" * 50 + "\n\n"  # Separador entre transcrições
+
+
+def is_deliverable(result):
+    # Transcrições e vídeos fora do prazo (que saem como aviso na saída)
+    if result.title and result.transcript:
+        return True
+    if result.timed_out:
+        logger.warning(f"Tempo esgotado para o vídeo: {result.url}")
+        return True
+    logger.warning(f"Transcrição não encontrada para o vídeo: {result.url}")
+    return False
+
+def deliverable(results):
+    # Filtra os resultados do engine, registrando os vídeos sem transcrição
+    return (result for result in results if is_deliverable(result))
+
+async def adeliverable(results):
+    async for result in results:
+        if is_deliverable(result):
+            yield result
+
+def render_text_block(result):
+    header = f"Título do Vídeo: {result.title}\n"
+    if result.upload_date:
+        header += f"Data de Envio: {result.upload_date}\n"
+    if result.track:
+        header += f"Legenda: {result.track}\n"
+    yield header + "\n"
+    yield from result.transcript.render()
+
+def render_timeout_block(result):
+    yield f"Tempo esgotado: {result.title or result.url}\n(transcrição não obtida dentro do prazo)\n"
+
+# Cada formato de saída é um "sink": feed(result) devolve os pedaços de um
+# vídeo assim que ele chega e close() os do final do arquivo. O mesmo sink
+# serve à view síncrona (stream) e à assíncrona (astream).
+
+def stream(sink, results):
+    for result in results:
+        yield from sink.feed(result)
+    yield from sink.close()
+
+async def astream(sink, results):
+    async for result in results:
+        for chunk in sink.feed(result):
+            yield chunk
+    for chunk in sink.close():
+        yield chunk
+
+
+class TextSink:
+    # Cada bloco é enviado assim que o resultado chega; nada vai para o disco
+    def __init__(self, separator=True):
+        self.separator = separator
+
+    def feed(self, result):
+        render = render_timeout_block if result.timed_out else render_text_block
+        yield from metrics.timed_iter(render(result), 'write')
+        if self.separator:
+            yield SEPARATOR
+
+    def close(self):
+        return ()
+
+def stream_text(results, separator=True):
+    return stream(TextSink(separator), results)
+
+def render_segments_jsonl(result):
+    # Uma linha JSON por segmento: {"start", "duration", "text"}
+    lines = []
+    for start, duration, text in result.transcript:
+        lines.append(json.dumps({'start': start, 'duration': duration, 'text': text}, ensure_ascii=False))
+        if len(lines) >= 512:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def render_dataset_record(result):
+    # Um vídeo por linha, no formato usado para montar datasets
+    if result.timed_out:
+        return json.dumps({
+            'video_id': result.video_id,
+            'url': result.url,
+            'title': result.title,
+            'error': 'timed_out',
+        }, ensure_ascii=False) + '\n'
+    return json.dumps({
+        'video_id': result.video_id,
+        'url': result.url,
+        'title': result.title,
+        'upload_date': result.upload_date,
+        'lang': result.lang,
+        'kind': result.kind,
+        'segments': [
+            {'start': start, 'duration': duration, 'text': text}
+            for start, duration, text in result.transcript
+        ],
+    }, ensure_ascii=False) + '\n'
+
+def _gzip_compressor():
+    # wbits=31: stream gzip (cabeçalho + CRC), legível com gzip/zcat
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+def _zstd_compressor():
+    return zstandard.ZstdCompressor(level=3).compressobj()
+
+COMPRESSORS = {
+    'gz': _gzip_compressor,
+    'zst': _zstd_compressor,
+}
+
+class JsonlSink:
+    # Cada registro é serializado (e comprimido) assim que o resultado chega;
+    # o compressor só guarda a própria janela, nunca o dataset inteiro.
+    def __init__(self, compression=None):
+        self.compressor = COMPRESSORS[compression]() if compression else None
+
+    def feed(self, result):
+        with metrics.timer('write'):
+            data = render_dataset_record(result).encode('utf-8')
+            if self.compressor is not None:
+                data = self.compressor.compress(data)
+        if data:
+            yield data
+
+    def close(self):
+        if self.compressor is not None:
+            yield self.compressor.flush()
+
+def stream_jsonl(results, compression=None):
+    return stream(JsonlSink(compression), results)
+
+# Formatos da exportação: tipo de conteúdo e compressão dos .jsonl
+EXPORT_FORMATS = {
+    'txt': 'text/plain; charset=utf-8',
+    'zip': 'application/zip',
+    'jsonl': 'application/x-ndjson',
+    'jsonl.gz': 'application/gzip',
+    'jsonl.zst': 'application/zstd',
+}
+
+def export_available(export_format):
+    return export_format in EXPORT_FORMATS and (export_format != 'jsonl.zst' or zstandard is not None)
+
+ENTRY_RENDERERS = {
+    'txt': render_text_block,
+    'jsonl': render_segments_jsonl,
+}
+
+def entry_name(result, index, ext):
+    slug = slugify(result.title or '')[:80] or 'video'
+    if result.track:
+        # Várias faixas do mesmo vídeo: uma entrada por faixa
+        return f"{slug}-{result.video_id or index}-{slugify(result.track)}.{ext}"
+    return f"{slug}-{result.video_id or index}.{ext}"
+
+
+class _ChunkBuffer:
+    # Destino do ZipFile: sem seek(), então o zipfile grava cada entrada com
+    # data descriptor e nada precisa voltar atrás no stream.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class ZipSink:
+    # ZIP com um arquivo por vídeo + manifest.json, comprimido e enviado
+    # conforme cada vídeo termina; a memória fica limitada a um bloco.
+    def __init__(self, entry_format='txt'):
+        self.entry_format = entry_format
+        self.render = ENTRY_RENDERERS[entry_format]
+        self.buffer = _ChunkBuffer()
+        self.archive = zipfile.ZipFile(self.buffer, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.manifest = []
+
+    def feed(self, result):
+        if result.timed_out:
+            # Sem arquivo: o vídeo aparece só no manifest, com o erro
+            self.manifest.append({'file': None, 'video_id': result.video_id, 'url': result.url,
+                                  'title': result.title, 'error': 'timed_out'})
+            return
+        name = entry_name(result, len(self.manifest), self.entry_format)
+        with self.archive.open(name, 'w') as entry:
+            for chunk in metrics.timed_iter(self.render(result), 'write'):
+                entry.write(chunk.encode('utf-8'))
+                data = self.buffer.drain()
+                if data:
+                    yield data
+        self.manifest.append({
+            'file': name,
+            'video_id': result.video_id,
+            'url': result.url,
+            'title': result.title,
+            'upload_date': result.upload_date,
+            'segments': len(result.transcript),
+        })
+        yield self.buffer.drain()
+
+    def close(self):
+        self.archive.writestr('manifest.json', json.dumps(self.manifest, ensure_ascii=False, indent=2))
+        self.archive.close()
+        yield self.buffer.drain()
+
+def stream_zip(results, entry_format='txt'):
+    return stream(ZipSink(entry_format), results)
+
+
+def make_sink(export_format, entry_format='txt', single=False):
+    if export_format == 'zip':
+        return ZipSink(entry_format)
+    if export_format.startswith('jsonl'):
+        return JsonlSink(export_format.partition('.')[2] or None)
+    return TextSink(separator=not single)
+
+def export_file_name(export_format, single, title):
+    # Um vídeo: nome do vídeo; vários: nome fixo por formato
+    if single:
+        return f"{slugify(title or '') or 'transcricao'}.{export_format}"
+    if export_format.startswith('jsonl'):
+        return f"transcriptions_dataset.{export_format}"
+    return 'transcriptions.zip' if export_format == 'zip' else 'all_transcriptions.txt'
@@ -0,0 +1,78 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .channels import get_channel_video_urls
+from .youtube import (
+    extract_video_id,
+    canonical_video_url,
+    is_channel_url,
+    is_playlist_url,
+    iter_playlist_video_ids,
+)
+
+logger = logging.getLogger(__name__)
+
+# Estágio anterior ao fetch: transforma as entradas (vídeos, canais,
+# playlists) em URLs canônicas únicas, na ordem das entradas. Canais e
+# playlists são expandidos em paralelo; a deduplicação acontece antes de
+# qualquer transcrição ser buscada. iter_video_urls entrega as URLs aos
+# poucos, para o engine começar sem esperar a lista inteira.
+
+
+def video_key(url):
+    return extract_video_id(url) or url
+
+def _expand(url, only_new, watermarks):
+    try:
+        if is_channel_url(url):
+            return get_channel_video_urls(url, only_new=only_new, watermarks=watermarks)
+        with metrics.timer('channel_enumeration'):
+            return [canonical_video_url(video_id) for video_id in iter_playlist_video_ids(url)]
+    except Exception as e:
+        logger.error(f"Falha ao expandir {url}: {e}")
+        return []
+    finally:
+        # Conexões abertas nesta thread do pool
+        connections.close_all()
+
+def iter_video_urls(urls, only_new=False, watermarks=None):
+    # only_new: passe um dict em watermarks e chame channels.mark_exported
+    # com ele quando a exportação der certo
+    entries = []
+    pool = ThreadPoolExecutor(max_workers=settings.RESOLVER_WORKERS, thread_name_prefix='resolver')
+    try:
+        for url in urls:
+            url = url.strip()
+            if not url:
+                continue
+            video_id = extract_video_id(url)
+            if video_id:
+                entries.append([canonical_video_url(video_id)])
+            elif is_channel_url(url) or is_playlist_url(url):
+                entries.append(pool.submit(_expand, url, only_new, watermarks))
+            else:
+                entries.append([url])
+
+        # Só as chaves ficam na memória; cada expansão é liberada ao ser lida
+        seen, total = set(), 0
+        for i, entry in enumerate(entries):
+            entries[i] = None
+            for video_url in entry.result() if isinstance(entry, Future) else entry:
+                total += 1
+                key = video_key(video_url)
+                if key not in seen:
+                    seen.add(key)
+                    yield video_url
+    finally:
+        # Consumidor desistiu: expansões ainda na fila não rodam
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if total != len(seen):
+        logger.info(f"{len(entries)} entradas -> {len(seen)} vídeos únicos ({total - len(seen)} duplicados)")
+
+def resolve_video_urls(urls, only_new=False, watermarks=None):
+    return list(iter_video_urls(urls, only_new=only_new, watermarks=watermarks))
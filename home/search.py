@@ -0,0 +1,89 @@
+import re
+import logging
+
+from django.db import connection, DatabaseError
+
+from .models import Segment
+from .timedtext import format_timestamp
+from .writer import write_transcripts
+from .youtube import canonical_video_url
+
+logger = logging.getLogger(__name__)
+
+# Busca por trecho de transcrição. O índice invertido depende do banco
+# (ver migração 0004): GIN sobre to_tsvector('simple', text) no Postgres e
+# FTS5 no SQLite. Outros bancos caem num icontains, sem ranking.
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def index_transcript(video_id, lang, transcript, title=None, upload_date=None):
+    # Grava (ou regrava) os segmentos de um vídeo, na thread atual. Os
+    # triggers/índices do banco atualizam a busca no mesmo commit; o engine
+    # usa o writer em lote (home/writer.py).
+    try:
+        return write_transcripts([(video_id, lang, transcript, title, upload_date)])
+    except DatabaseError as e:
+        logger.error(f"Falha ao indexar a transcrição do vídeo {video_id}: {e}")
+        return None
+
+def deep_link(video_id, start):
+    return f"{canonical_video_url(video_id)}&t={int(start)}s"
+
+def _ranked_ids(query, limit, offset):
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        sql = (
+            "SELECT s.id FROM home_segment s, websearch_to_tsquery('simple', %s) q "
+            "WHERE to_tsvector('simple', s.text) @@ q "
+            "ORDER BY ts_rank(to_tsvector('simple', s.text), q) DESC, s.id "
+            "LIMIT %s OFFSET %s"
+        )
+        params = [query, limit, offset]
+    elif vendor == 'sqlite':
+        terms = TERM_RE.findall(query)
+        if not terms:
+            return []
+        # Cada termo entre aspas: a sintaxe do FTS5 não vaza para o usuário
+        sql = (
+            "SELECT rowid FROM home_segment_fts WHERE home_segment_fts MATCH %s "
+            "ORDER BY bm25(home_segment_fts) LIMIT %s OFFSET %s"
+        )
+        params = [' '.join(f'"{term}"' for term in terms), limit, offset]
+    else:
+        return list(
+            Segment.objects.filter(text__icontains=query)
+            .order_by('id')
+            .values_list('id', flat=True)[offset:offset + limit]
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+def search_segments(query, page=1, per_page=20):
+    query = query.strip()
+    if not query:
+        return {'query': query, 'page': page, 'results': [], 'has_next': False}
+
+    # Um item a mais para saber se existe próxima página sem COUNT(*)
+    ids = _ranked_ids(query, per_page + 1, (page - 1) * per_page)
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    segments = Segment.objects.select_related('video').in_bulk(ids)
+
+    results = []
+    for segment_id in ids:
+        segment = segments.get(segment_id)
+        if segment is None:
+            continue
+        video = segment.video
+        results.append({
+            'video_id': video.video_id,
+            'title': video.title,
+            'lang': video.lang,
+            'start': segment.start,
+            'timestamp': format_timestamp(segment.start),
+            'text': segment.text,
+            'url': deep_link(video.video_id, segment.start),
+        })
+    return {'query': query, 'page': page, 'results': results, 'has_next': has_next}
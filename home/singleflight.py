@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+import time
+import logging
+import uuid
+from concurrent.futures import Future
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    # Chamadas concorrentes para a mesma chave (vídeo + idioma) esperam um
+    # único fetch em andamento. Usa concurrent.futures.Future para funcionar
+    # entre threads e entre event loops diferentes (asyncio.wrap_future).
+    # Opcionalmente, um arquivo de lock (criado com O_CREAT|O_EXCL, que é
+    # atômico) coordena processos na mesma máquina.
+    def __init__(self, lock_dir=None, lock_ttl=60):
+        self.lock_dir = lock_dir
+        self.lock_ttl = lock_ttl
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tokens = {}
+        self.counters = {'leaders': 0, 'coalesced': 0, 'remote_waits': 0, 'remote_hits': 0, 'stale_locks': 0}
+
+    def incr(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def begin(self, key):
+        # Retorna (is_leader, future). Só o líder executa o fetch.
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.counters['coalesced'] += 1
+                return False, future
+            future = Future()
+            self._calls[key] = future
+            self.counters['leaders'] += 1
+            return True, future
+
+    def finish(self, key, value):
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def lock_path(self, key):
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.lock_dir or settings.SINGLEFLIGHT_LOCK_DIR, f"{name}.lock")
+
+    def _stale(self, path):
+        # Lock de um processo que morreu sem liberar
+        try:
+            return time.time() - os.stat(path).st_mtime > self.lock_ttl
+        except FileNotFoundError:
+            return False
+
+    def _create(self, path, token):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(token)
+        return True
+
+    def _break_stale(self, path):
+        # Renomear é atômico: só um processo tira o lock vencido do lugar.
+        # Se entre o stat e o rename outro processo já tinha criado um lock
+        # novo, ele volta para o lugar (link falha se já houver outro).
+        moved = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, moved)
+        except FileNotFoundError:
+            return
+        try:
+            if self._stale(moved):
+                self.incr('stale_locks')
+            else:
+                os.link(moved, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(moved)
+
+    def try_lock(self, key):
+        path = self.lock_path(key)
+        token = f"{os.getpid()}:{uuid.uuid4().hex}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            locked = self._create(path, token)
+            if not locked and self._stale(path):
+                self._break_stale(path)
+                locked = self._create(path, token)
+        except OSError as e:
+            logger.warning(f"Falha ao obter lock compartilhado: {e}")
+            return True
+        if locked:
+            with self._lock:
+                self._tokens[key] = token
+        return locked
+
+    def is_locked(self, key):
+        path = self.lock_path(key)
+        return os.path.exists(path) and not self._stale(path)
+
+    def unlock(self, key):
+        # Só apaga o próprio lock (o dele pode ter vencido e sido retomado)
+        with self._lock:
+            token = self._tokens.pop(key, None)
+        path = self.lock_path(key)
+        try:
+            with open(path) as f:
+                if f.read() != token:
+                    return
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Falha ao liberar lock compartilhado: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self._calls)
+        stats['saved_fetches'] = stats['coalesced'] + stats['remote_hits']
+        return stats
+
+
+singleflight = SingleFlight(lock_ttl=getattr(settings, 'SINGLEFLIGHT_LOCK_TTL', 60))
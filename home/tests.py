@@ -1,3 +1,1160 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock
+from xml.etree.ElementTree import XMLPullParser
 
-# Create your tests here.
+import httpx
+from django.conf import settings
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import jobs, workqueue
+from .cache import LRUCache, ManifestCache, TranscriptCache, manifest_cache, transcript_cache
+from .cache_backends import UnculledFileBasedCache
+from .channels import get_channel_video_urls, mark_exported
+from .engine import FetchEngine, StageTimeout, TranscriptResult, iter_transcripts
+from .extractors import ExtractionError, extract_watch_page, parse_watch_page
+from .hedging import HedgePolicy
+from .http_client import close_shared_async_client
+from .jobs import run_job
+from .metadata import SOURCES
+from .management.commands.transcribe import Manifest, transcribe_shard
+from .management.commands.worker import Command as WorkerCommand
+from .models import Channel, TranscriptionJob, Video, WorkItem
+from .output import JsonlSink, TextSink, ZipSink, export_available, render_dataset_record, stream
+from .resolver import video_key
+from .search import index_transcript, search_segments
+from .singleflight import SingleFlight, singleflight
+from .throttle import AIMDLimiter, upstream
+from .timedtext import parse_timedtext, format_timestamp
+from .views import (
+    job_download_async_view,
+    job_download_view,
+    job_events_async_view,
+    job_events_view,
+    job_submit_view,
+    transcription_async_view,
+    transcription_options,
+)
+from .writer import TranscriptWriter, WriteError, write_transcripts
+from .youtube import parse_track_spec, parse_track_specs, track_key
+
+
+class EngineTestCase(TestCase):
+    # Testes que rodam o engine: cache em arquivo e locks do single-flight
+    # num diretório temporário (nada lido nem deixado em media/) e camadas
+    # locais vazias a cada teste
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        transcripts = dict(settings.CACHES['transcripts'], LOCATION=os.path.join(tmp, 'transcript_cache'))
+        override = override_settings(CACHES=dict(settings.CACHES, transcripts=transcripts),
+                                     SINGLEFLIGHT_LOCK_DIR=os.path.join(tmp, 'singleflight'))
+        override.enable()
+        self.addCleanup(override.disable)
+        transcript_cache.local.clear()
+        manifest_cache.local.clear()
+
+
+class SendLimiterTests(TestCase):
+    # Todo acquire() do AIMD termina em um release() ou cancel()
+    def send(self, fake_request):
+        engine = FetchEngine(concurrency=2)
+
+        async def go():
+            engine._global = asyncio.Semaphore(2)
+            with mock.patch('home.engine.async_request', fake_request):
+                return await engine._send(None, 'GET', 'http://upstream.test/watch', 'page')
+
+        return asyncio.run(go())
+
+    def test_unexpected_error_releases_slot(self):
+        async def broken(client, method, url, **kwargs):
+            raise ValueError('resposta inválida')
+
+        with self.assertRaises(ValueError):
+            self.send(broken)
+        self.assertEqual(upstream.limiter.snapshot()['inflight'], 0)
+
+    def test_transport_error_counts_as_error(self):
+        async def refused(client, method, url, **kwargs):
+            raise httpx.ConnectError('recusada')
+
+        before = upstream.limiter.snapshot()['errors']
+        with self.assertRaises(httpx.ConnectError):
+            self.send(refused)
+        snapshot = upstream.limiter.snapshot()
+        self.assertEqual(snapshot['inflight'], 0)
+        self.assertEqual(snapshot['errors'], before + 1)
+
+    def test_throttled_response_releases_slot(self):
+        async def throttled(client, method, url, **kwargs):
+            return httpx.Response(429)
+
+        before = upstream.limiter.snapshot()['throttled']
+        self.assertEqual(self.send(throttled).status_code, 429)
+        snapshot = upstream.limiter.snapshot()
+        self.assertEqual(snapshot['inflight'], 0)
+        self.assertEqual(snapshot['throttled'], before + 1)
+
+
+class AIMDLimiterTests(TestCase):
+    def limiter(self, **options):
+        return AIMDLimiter(**dict(dict(initial=2, min_limit=1, max_limit=4, latency_target=1.0, cooldown=1.0), **options))
+
+    def test_additive_increase(self):
+        limiter = self.limiter()
+        # +1/limite por sucesso: uma vaga a mais a cada "janela" inteira
+        for _ in range(2):
+            limiter.inflight += 1
+            limiter.release(ok=True, latency=0.1)
+        self.assertAlmostEqual(limiter.limit, 2.9)
+        # Lento demais: sucesso, mas sem aumento
+        limiter.inflight += 1
+        limiter.release(ok=True, latency=5)
+        self.assertAlmostEqual(limiter.limit, 2.9)
+        for _ in range(50):
+            limiter.inflight += 1
+            limiter.release(ok=True, latency=0.1)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_multiplicative_decrease_once_per_cooldown(self):
+        limiter = self.limiter(initial=4)
+        for _ in range(3):
+            limiter.inflight += 1
+            limiter.release(ok=False, throttled=True)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.snapshot()['decreases'], 1)
+        # Passado o cooldown, corta de novo, até o mínimo
+        for delay in (2, 4):
+            with mock.patch('home.throttle.time.monotonic', return_value=time.monotonic() + delay):
+                limiter.inflight += 1
+                limiter.release(ok=False)
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.snapshot()['throttled'], 3)
+
+    def test_release_wakes_waiter(self):
+        limiter = self.limiter(initial=1)
+
+        async def go():
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.2)
+            self.assertFalse(waiter.done())
+            self.assertEqual(limiter.snapshot()['waiting'], 1)
+            start = time.monotonic()
+            limiter.cancel()
+            await waiter
+            return time.monotonic() - start
+
+        # Bem antes do WAKEUP_TIMEOUT: acordou pelo release, não pelo prazo
+        self.assertLess(asyncio.run(go()), 0.1)
+        self.assertEqual(limiter.snapshot()['inflight'], 1)
+
+    def test_release_from_another_loop(self):
+        limiter = self.limiter(initial=1)
+        acquired = threading.Event()
+
+        async def hold():
+            await limiter.acquire()
+            acquired.set()
+            await asyncio.sleep(0.2)
+            limiter.release(ok=True, latency=0.1)
+
+        async def wait():
+            start = time.monotonic()
+            await limiter.acquire()
+            return time.monotonic() - start
+
+        thread = threading.Thread(target=asyncio.run, args=(hold(),))
+        thread.start()
+        acquired.wait()
+        self.assertLess(asyncio.run(wait()), 0.5)
+        thread.join()
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        limiter = self.limiter(initial=1)
+
+        async def go():
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+
+        asyncio.run(go())
+        snapshot = limiter.snapshot()
+        self.assertEqual((snapshot['inflight'], snapshot['waiting']), (1, 0))
+
+
+class HedgePolicyTests(TestCase):
+    def test_interleaved_stages_get_thresholds(self):
+        policy = HedgePolicy(min_samples=20, min_delay=0.01)
+        for i in range(200):
+            policy.observe('page', 0.5)
+            policy.observe('caption', 0.2)
+        self.assertEqual(policy.delay('page'), 0.5)
+        self.assertEqual(policy.delay('caption'), 0.2)
+
+    def test_no_threshold_before_min_samples(self):
+        policy = HedgePolicy(min_samples=20)
+        for i in range(19):
+            policy.observe('page', 1.0)
+        self.assertIsNone(policy.delay('page'))
+        self.assertIsNone(HedgePolicy(enabled=False).delay('page'))
+
+    def test_threshold_follows_percentile(self):
+        policy = HedgePolicy(percentile=90, min_samples=10, min_delay=0.0)
+        for i in range(100):
+            policy.observe('page', i / 100)
+        self.assertEqual(policy.delay('page'), 0.9)
+
+    def test_hedges_are_capped(self):
+        policy = HedgePolicy(max_ratio=0.1)
+        for i in range(100):
+            policy.observe('page', 0.1)
+        allowed = sum(policy.allow() for _ in range(100))
+        self.assertEqual(allowed, 11)
+
+
+class MetadataFallbackTests(TestCase):
+    def fetch(self, failures):
+        engine = FetchEngine(source='player_api')
+
+        async def request(client, method, url, stage=None, **kwargs):
+            if stage in failures:
+                raise failures[stage]
+            return httpx.Response(200, content=b'<html></html>')
+
+        with mock.patch.object(engine, '_request', request), \
+                mock.patch.object(SOURCES['watch_page'], 'parse', return_value=('Título', '2024', [])):
+            return asyncio.run(engine._fetch_metadata(None, 'https://www.youtube.com/watch?v=abcdefghijk',
+                                                      'abcdefghijk'))
+
+    def test_transport_error_tries_next_source(self):
+        metadata, status = self.fetch({SOURCES['player_api'].stage: httpx.ConnectError('recusada')})
+        self.assertEqual((metadata, status), (('Título', '2024', []), 200))
+
+    def test_timeout_tries_next_source(self):
+        metadata, _ = self.fetch({SOURCES['player_api'].stage: StageTimeout('player')})
+        self.assertEqual(metadata[0], 'Título')
+
+    def test_last_error_is_raised(self):
+        with self.assertRaises(StageTimeout):
+            self.fetch({SOURCES['player_api'].stage: httpx.ConnectError('recusada'),
+                        SOURCES['watch_page'].stage: StageTimeout('page')})
+
+    def player_without_date(self, page_failures):
+        body = json.dumps({'videoDetails': {'title': 'Do player'},
+                           'captions': {'playerCaptionsTracklistRenderer': {'captionTracks': ['pt']}}})
+
+        async def request(client, method, url, stage=None, **kwargs):
+            if stage == SOURCES['watch_page'].stage:
+                if page_failures:
+                    raise page_failures
+                return httpx.Response(200, content=b'<html></html>')
+            return httpx.Response(200, content=body.encode())
+
+        engine = FetchEngine(source='player_api')
+        with mock.patch.object(engine, '_request', request), \
+                mock.patch.object(SOURCES['watch_page'], 'parse', return_value=('Da página', '3 de mar. de 2024', [])):
+            return asyncio.run(engine._fetch_metadata(None, 'https://www.youtube.com/watch?v=abcdefghijk',
+                                                      'abcdefghijk'))
+
+    def test_missing_date_comes_from_watch_page(self):
+        metadata, status = self.player_without_date(None)
+        self.assertEqual((metadata, status), (('Do player', '3 de mar. de 2024', ['pt']), 200))
+
+    def test_missing_date_keeps_player_result(self):
+        metadata, status = self.player_without_date(httpx.ConnectError('recusada'))
+        self.assertEqual((metadata, status), (('Do player', None, ['pt']), 200))
+
+    @override_settings(YOUTUBE_PLAYER_API_HL='en')
+    def test_player_language_is_configurable(self):
+        _, _, kwargs = SOURCES['player_api'].request('https://www.youtube.com/watch?v=abcdefghijk', None)
+        self.assertEqual(kwargs['json']['context']['client']['hl'], 'en')
+
+
+async def fake_upstream(client, method, url, **kwargs):
+    # 'fast' responde na hora (404); o resto fica pendurado
+    if 'fast' in url:
+        return httpx.Response(404)
+    await asyncio.sleep(30)
+    return httpx.Response(404)
+
+
+class IterTranscriptsTests(EngineTestCase):
+    @mock.patch('home.engine.async_request', fake_upstream)
+    def test_early_close_frees_limiter(self):
+        # Mais resultados prontos do que cabem na fila: o close() pega o
+        # pump parado no put(), fora do gerador do engine
+        urls = ([f'https://www.youtube.com/watch?v=fast{i}abcdef' for i in range(4)]
+                + [f'https://www.youtube.com/watch?v=slow{i}abcdef' for i in range(2)])
+        results = iter_transcripts(urls, concurrency=2, source='watch_page')
+        self.assertEqual(next(results).error, 'status 404')
+        deadline = time.monotonic() + 2
+        while not upstream.limiter.snapshot()['inflight'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(upstream.limiter.snapshot()['inflight'], 0)
+        results.close()
+        self.assertEqual(upstream.limiter.snapshot()['inflight'], 0)
+        # Os fetches cancelados não deixam ninguém esperando no single-flight
+        self.assertEqual(singleflight._calls, {})
+
+        # Uma chamada seguinte não fica esperando por vagas vazadas
+        start = time.monotonic()
+        results = list(iter_transcripts(['http://upstream.test/watch?v=fast'], source='watch_page'))
+        self.assertEqual(results[0].error, 'status 404')
+        self.assertLess(time.monotonic() - start, 5)
+
+
+CAPTION_XML = b'<transcript><text start="0" dur="1">ol\xc3\xa1</text></transcript>'
+
+
+class FakeYouTube:
+    # Player API + legenda; conta as requisições de cada tipo
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = {'player': 0, 'caption': 0}
+
+    async def __call__(self, client, method, url, **kwargs):
+        await asyncio.sleep(self.delay)
+        if 'timedtext' in url:
+            self.calls['caption'] += 1
+            return httpx.Response(200, content=CAPTION_XML)
+        self.calls['player'] += 1
+        video_id = kwargs['json']['videoId']
+        return httpx.Response(200, json={
+            'videoDetails': {'title': f'Vídeo {video_id}'},
+            'microformat': {'playerMicroformatRenderer': {'publishDate': '2024-01-02'}},
+            'captions': {'playerCaptionsTracklistRenderer': {'captionTracks': [
+                {'languageCode': 'pt', 'kind': 'asr', 'baseUrl': f'http://upstream.test/timedtext?v={video_id}'},
+            ]}},
+        })
+
+
+@override_settings(SINGLEFLIGHT_SHARED_LOCK=False, TRANSCRIPT_INDEX_ENABLED=False)
+class EngineCacheTests(EngineTestCase):
+    def test_cached_result_keeps_track(self):
+        url = f'https://www.youtube.com/watch?v=c{int(time.time() * 1000) % 10 ** 10:010d}'
+        fake = FakeYouTube()
+        with mock.patch('home.engine.async_request', fake):
+            first = list(iter_transcripts([url], source='player_api'))[0]
+            transcript_cache.local.clear()
+            second = list(iter_transcripts([url], source='player_api'))[0]
+        self.assertEqual((first.lang, first.kind), ('pt', 'asr'))
+        self.assertTrue(second.cached)
+        self.assertEqual(fake.calls, {'player': 1, 'caption': 1})
+        record = json.loads(render_dataset_record(second))
+        self.assertEqual((record['lang'], record['kind'], record['upload_date']), ('pt', 'asr', '2024-01-02'))
+
+    @override_settings(TRANSCRIPT_INDEX_ENABLED=True)
+    def test_index_row_keyed_by_resolved_track(self):
+        # '' e 'pt' resolvem para a mesma faixa: uma linha só no índice
+        video_id = f'r{int(time.time() * 1000) % 10 ** 10:010d}'
+        rows = []
+        with mock.patch('home.engine.async_request', FakeYouTube()), \
+                mock.patch('home.engine.transcript_writer.put', lambda *row, **kwargs: rows.append(row) or True):
+            list(iter_transcripts([f'https://www.youtube.com/watch?v={video_id}'], lang=['', 'pt']))
+        self.assertEqual({row[:2] for row in rows}, {(video_id, 'pt:asr')})
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        self.flight = SingleFlight(lock_dir=tempfile.mkdtemp(), lock_ttl=60)
+
+    def test_one_leader_per_key(self):
+        is_leader, future = self.flight.begin('abc:pt')
+        self.assertTrue(is_leader)
+        follower, same = self.flight.begin('abc:pt')
+        self.assertFalse(follower)
+        self.assertIs(same, future)
+        self.flight.finish('abc:pt', 'valor')
+        self.assertEqual(same.result(timeout=1), 'valor')
+        self.assertEqual(self.flight.stats()['coalesced'], 1)
+
+    def test_shared_lock_is_exclusive(self):
+        # Vários "processos" disputando ao mesmo tempo: um só vence
+        others = [SingleFlight(lock_dir=self.flight.lock_dir) for _ in range(8)]
+        barrier = threading.Barrier(len(others))
+        won = []
+
+        def contend(flight):
+            barrier.wait()
+            won.append(flight.try_lock('abc:pt'))
+
+        threads = [threading.Thread(target=contend, args=(flight,)) for flight in others]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(won), [False] * 7 + [True])
+
+    def test_unlock_releases_only_own_lock(self):
+        other = SingleFlight(lock_dir=self.flight.lock_dir)
+        self.assertTrue(self.flight.try_lock('abc:pt'))
+        self.assertTrue(other.is_locked('abc:pt'))
+        other.unlock('abc:pt')
+        self.assertTrue(other.is_locked('abc:pt'))
+        self.flight.unlock('abc:pt')
+        self.assertFalse(other.is_locked('abc:pt'))
+        self.assertTrue(other.try_lock('abc:pt'))
+
+    def test_stale_lock_is_taken_over(self):
+        self.assertTrue(self.flight.try_lock('abc:pt'))
+        path = self.flight.lock_path('abc:pt')
+        os.utime(path, (time.time() - 120, time.time() - 120))
+        other = SingleFlight(lock_dir=self.flight.lock_dir, lock_ttl=60)
+        self.assertFalse(other.is_locked('abc:pt'))
+        self.assertTrue(other.try_lock('abc:pt'))
+        self.assertEqual(other.stats()['stale_locks'], 1)
+        self.assertEqual(os.listdir(self.flight.lock_dir), [os.path.basename(path)])
+
+
+@override_settings(TRANSCRIPT_INDEX_ENABLED=False)
+class FollowerDeadlineTests(EngineTestCase):
+    def url(self, tag):
+        return f'https://www.youtube.com/watch?v={tag}{int(time.time() * 1000) % 10 ** 8:08d}'
+
+    @override_settings(SINGLEFLIGHT_SHARED_LOCK=False)
+    def test_follower_of_timed_out_leader_times_out(self):
+        url = self.url('fol')
+        with mock.patch('home.engine.async_request', FakeYouTube(delay=5)):
+            start = time.monotonic()
+            results = list(iter_transcripts([url, url], concurrency=2, stage_timeout=0.3))
+        self.assertLess(time.monotonic() - start, 3)
+        self.assertEqual([result.timed_out for result in results], [True, True])
+        self.assertEqual({result.error for result in results}, {'tempo esgotado'})
+
+    def test_remote_wait_respects_deadline(self):
+        # Outro processo segura o lock e não termina dentro do prazo
+        url = self.url('rem')
+        other = SingleFlight()
+        self.assertTrue(other.try_lock(f'{url[-11:]}:default'))
+        with mock.patch('home.engine.async_request', FakeYouTube()):
+            start = time.monotonic()
+            result, = iter_transcripts([url], stage_timeout=0.5)
+        self.assertLess(time.monotonic() - start, 3)
+        self.assertTrue(result.timed_out)
+        self.assertTrue(result.coalesced)
+
+
+class SharedClientTests(EngineTestCase):
+    def recorder(self, seen):
+        async def request(client, method, url, **kwargs):
+            seen.append(client)
+            return httpx.Response(404)
+        return request
+
+    async def test_runs_on_a_loop_share_the_client(self):
+        seen = []
+        with mock.patch('home.engine.async_request', self.recorder(seen)):
+            for i in range(2):
+                async for result in FetchEngine(source='watch_page').run([f'http://upstream.test/watch?v=share{i}']):
+                    self.assertEqual(result.error, 'status 404')
+        self.assertIs(seen[0], seen[1])
+        self.assertFalse(seen[0].is_closed)
+        await close_shared_async_client()
+        self.assertTrue(seen[0].is_closed)
+
+    def test_iter_transcripts_closes_its_client(self):
+        seen = []
+        with mock.patch('home.engine.async_request', self.recorder(seen)):
+            list(iter_transcripts(['http://upstream.test/watch?v=share'], source='watch_page'))
+        self.assertTrue(seen[0].is_closed)
+
+
+class TrackSpecTests(TestCase):
+    def test_form_field_is_split(self):
+        # O campo do formulário chega como ['pt, en:asr']
+        self.assertEqual(parse_track_specs(['pt, en:asr']), ['pt', 'en:asr'])
+        self.assertEqual(parse_track_specs(['pt', 'en:asr, pt']), ['pt', 'en:asr'])
+        self.assertEqual(parse_track_specs('asr'), ['asr'])
+
+    def test_default_track(self):
+        self.assertEqual(parse_track_specs(None), [None])
+        self.assertEqual(parse_track_specs(['']), [None])
+        self.assertEqual(parse_track_specs([' , ']), [None])
+
+    def test_overlong_code(self):
+        with self.assertRaises(ValueError):
+            parse_track_spec('p' * 17 + ':asr')
+        self.assertEqual(parse_track_spec('zh-Hant:asr'), ('zh-Hant', 'asr'))
+
+    def test_track_key(self):
+        self.assertEqual(track_key('pt', 'asr'), 'pt:asr')
+        self.assertEqual(track_key('pt', 'manual'), 'pt')
+        self.assertEqual(track_key(None, None), '')
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            parse_track_specs(['pt, en:auto'])
+
+    def test_transcription_options(self):
+        request = RequestFactory().post('/', {'video_url': 'https://youtu.be/abcdefghijk', 'lang': 'pt, en:asr'})
+        options, error = transcription_options(request)
+        self.assertIsNone(error)
+        self.assertEqual(options['langs'], ['pt', 'en:asr'])
+
+        request = RequestFactory().post('/', {'video_url': 'https://youtu.be/abcdefghijk', 'lang': 'pt:auto'})
+        self.assertEqual(transcription_options(request), (None, 'Idioma ou tipo de legenda inválido.'))
+
+
+class JobSubmitTests(TestCase):
+    @mock.patch('home.jobs._executor')
+    def test_job_keeps_form_options(self, executor):
+        request = RequestFactory().post('/jobs/', {
+            'video_url': 'https://youtu.be/abcdefghijk', 'lang': 'pt, en:asr',
+            'format': 'zip', 'entry_format': 'jsonl', 'source': 'watch_page',
+        })
+        response = job_submit_view(request)
+        self.assertEqual(response.status_code, 202)
+        job = TranscriptionJob.objects.get()
+        self.assertEqual((job.lang, job.export_format, job.entry_format, job.source),
+                         ('pt,en:asr', 'zip', 'jsonl', 'watch_page'))
+        executor.submit.assert_called_once()
+
+    def test_invalid_format(self):
+        request = RequestFactory().post('/jobs/', {'video_url': 'https://youtu.be/abcdefghijk', 'format': 'pdf'})
+        self.assertEqual(job_submit_view(request).status_code, 400)
+        self.assertFalse(TranscriptionJob.objects.exists())
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_job_writes_requested_format(self):
+        job = TranscriptionJob.objects.create(urls=['https://youtu.be/abcdefghijk'], lang='pt,en:asr',
+                                              export_format='zip', entry_format='jsonl')
+        transcript = parse_timedtext(b'<transcript><text start="1" dur="2">oi</text></transcript>')
+        results = [
+            TranscriptResult(url=job.urls[0], video_id='abcdefghijk', title='Vídeo', transcript=transcript, track=track)
+            for track in ('pt', 'en:asr')
+        ]
+        with mock.patch('home.jobs.iter_video_urls', return_value=iter(job.urls)), \
+                mock.patch('home.jobs.iter_transcripts', return_value=iter(results)) as fetch:
+            run_job(job.pk)
+        self.assertEqual(fetch.call_args.kwargs['lang'], ['pt', 'en:asr'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, TranscriptionJob.STATUS_DONE)
+        self.assertEqual(job.file_name, 'transcriptions.zip')
+        with zipfile.ZipFile(job.artifact) as archive:
+            self.assertEqual(sorted(archive.namelist()), [
+                'manifest.json', 'video-abcdefghijk-enasr.jsonl', 'video-abcdefghijk-pt.jsonl',
+            ])
+        os.remove(job.artifact)
+
+
+class JobMaintenanceTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def dead_pid(self):
+        import subprocess
+        import sys
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        return process.pid
+
+    @mock.patch('home.jobs._executor')
+    def test_queue_depth_counter(self, executor):
+        jobs.submit_job(['https://youtu.be/abcdefghijk'])
+        self.assertEqual(jobs.executor_queue_depth(), 1)
+        start, job_id = executor.submit.call_args.args
+        with mock.patch('home.jobs.run_job') as run:
+            start(job_id)
+        run.assert_called_once_with(job_id)
+        self.assertEqual(jobs.executor_queue_depth(), 0)
+
+    def test_orphaned_jobs_fail(self):
+        host = jobs.socket.gethostname()
+        dead = TranscriptionJob.objects.create(status=TranscriptionJob.STATUS_RUNNING, owner=f'{host}:{self.dead_pid()}')
+        mine = TranscriptionJob.objects.create(status=TranscriptionJob.STATUS_RUNNING, owner=jobs.job_owner())
+        remote = TranscriptionJob.objects.create(owner='outro-no:1')
+        stale = TranscriptionJob.objects.create(owner='outro-no:2')
+        TranscriptionJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        partial = jobs.artifact_path(dead)
+        open(partial, 'w').close()
+
+        self.assertEqual(jobs.recover_jobs(), 2)
+        status = dict(TranscriptionJob.objects.values_list('pk', 'status'))
+        self.assertEqual([status[job.pk] for job in (dead, mine, remote, stale)],
+                         ['failed', 'running', 'pending', 'failed'])
+        self.assertEqual(TranscriptionJob.objects.get(pk=dead.pk).error, jobs.ORPHANED)
+        self.assertFalse(os.path.exists(partial))
+
+    def test_orphan_is_not_run_later(self):
+        job = TranscriptionJob.objects.create(status=TranscriptionJob.STATUS_FAILED, error=jobs.ORPHANED)
+        with mock.patch('home.jobs.iter_transcripts') as fetch:
+            run_job(job.pk)
+        fetch.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, TranscriptionJob.STATUS_FAILED)
+
+    def test_expired_artifacts_are_removed(self):
+        old = timezone.now() - timedelta(days=8)
+        job = TranscriptionJob.objects.create(status=TranscriptionJob.STATUS_DONE, finished_at=old)
+        job.artifact = jobs.artifact_path(job)
+        job.save()
+        leftover = os.path.join(jobs.jobs_dir(), 'sobra.txt')
+        for path in (job.artifact, leftover):
+            open(path, 'w').close()
+            os.utime(path, (old.timestamp(), old.timestamp()))
+        recent = os.path.join(jobs.jobs_dir(), 'recente.txt')
+        open(recent, 'w').close()
+
+        self.assertEqual(jobs.expire_artifacts(), 2)
+        self.assertEqual(os.listdir(jobs.jobs_dir()), ['recente.txt'])
+        job.refresh_from_db()
+        self.assertEqual(job.artifact, '')
+        self.assertEqual(job_download_view(RequestFactory().get('/'), job.pk).status_code, 410)
+
+    def test_maintenance_is_throttled(self):
+        with mock.patch('home.jobs.recover_jobs') as recover, mock.patch('home.jobs.expire_artifacts'):
+            jobs.maintain_jobs(force=True)
+            jobs.maintain_jobs()
+        self.assertEqual(recover.call_count, 1)
+
+    def test_wsgi_events_return_snapshot(self):
+        job = TranscriptionJob.objects.create(status=TranscriptionJob.STATUS_RUNNING)
+        body = job_events_view(RequestFactory().get('/'), job.pk).content.decode()
+        self.assertIn('"status": "running"', body)
+        self.assertNotIn('event: end', body)
+
+
+def sample_transcript():
+    return parse_timedtext(b'<transcript><text start="1" dur="2">oi</text></transcript>')
+
+
+class AsyncViewTests(TestCase):
+    async def test_disconnect_closes_engine(self):
+        closed = asyncio.Event()
+
+        class FakeEngine:
+            def __init__(self, **options):
+                pass
+
+            async def run(self, urls):
+                try:
+                    for url in urls:
+                        yield TranscriptResult(url=url, video_id='abcdefghijk', title='Vídeo',
+                                               transcript=sample_transcript())
+                        await asyncio.sleep(30)
+                finally:
+                    closed.set()
+
+        urls = ['https://youtu.be/abcdefghijk', 'https://youtu.be/abcdefghijl']
+        request = RequestFactory().post('/', {'video_url': urls})
+        with mock.patch('home.views.FetchEngine', FakeEngine), \
+                mock.patch('home.views.iter_video_urls', return_value=iter(urls)):
+            response = await transcription_async_view(request)
+            self.assertTrue(await anext(aiter(response)))
+            # Cliente desconectado: o Django fecha a resposta numa thread
+            await asyncio.to_thread(response.close)
+        self.assertTrue(closed.is_set())
+
+    async def test_download_in_chunks(self):
+        artifact = os.path.join(tempfile.mkdtemp(), 'job.txt')
+        with open(artifact, 'wb') as f:
+            f.write(b'x' * 200_000)
+        job = await TranscriptionJob.objects.acreate(status=TranscriptionJob.STATUS_DONE, artifact=artifact,
+                                                     file_name='video.txt')
+        response = await job_download_async_view(RequestFactory().get('/'), job.pk)
+        chunks = [chunk async for chunk in response]
+        await asyncio.to_thread(response.close)
+        self.assertEqual(response['Content-Length'], '200000')
+        self.assertIn('video.txt', response['Content-Disposition'])
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), b'x' * 200_000)
+
+    async def test_events_end_when_job_finished(self):
+        job = await TranscriptionJob.objects.acreate(status=TranscriptionJob.STATUS_FAILED)
+        response = await job_events_async_view(RequestFactory().get('/'), job.pk)
+        body = b''.join([chunk async for chunk in response]).decode()
+        self.assertIn('"status": "failed"', body)
+        self.assertTrue(body.endswith('event: end\ndata: {}\n\n'))
+
+
+class WorkQueueTests(TestCase):
+    def setUp(self):
+        workqueue.enqueue(['https://youtu.be/abcdefghijk', 'https://youtu.be/abcdefghijl'], lang='pt, en:asr',
+                          max_attempts=2)
+
+    def test_enqueue_skips_duplicates(self):
+        self.assertEqual(workqueue.enqueue(['https://youtu.be/abcdefghijk'], lang='pt,en:asr'), 0)
+        self.assertEqual(WorkItem.objects.get(url='https://youtu.be/abcdefghijk').lang, 'pt,en:asr')
+
+    def test_claim_is_exclusive(self):
+        token, items = workqueue.claim('a', 1, lease=60)
+        self.assertEqual(len(items), 1)
+        self.assertEqual((items[0].status, items[0].worker, items[0].attempts), (WorkItem.STATUS_RUNNING, 'a', 1))
+        _, others = workqueue.claim('b', 10, lease=60)
+        self.assertEqual([item.url for item in others], ['https://youtu.be/abcdefghijl'])
+        _, none = workqueue.claim('c', 10, lease=60)
+        self.assertEqual(none, [])
+
+    def test_heartbeat_extends_lease(self):
+        token, items = workqueue.claim('a', 10, lease=1)
+        self.assertEqual(workqueue.heartbeat(token, lease=600), 2)
+        item = WorkItem.objects.get(pk=items[0].pk)
+        self.assertGreater(item.lease_expires_at, timezone.now() + timedelta(seconds=500))
+
+    def test_expired_lease_is_reclaimed(self):
+        token, items = workqueue.claim('a', 10, lease=60)
+        WorkItem.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        new_token, reclaimed = workqueue.claim('b', 10, lease=60)
+        self.assertEqual(len(reclaimed), 2)
+        self.assertTrue(all(item.attempts == 2 and item.worker == 'b' for item in reclaimed))
+        # O worker antigo perdeu a reserva: não conclui mais nada
+        self.assertFalse(workqueue.complete(items[0], token))
+        self.assertTrue(workqueue.complete(reclaimed[0], new_token))
+
+    def test_expired_lease_without_attempts_fails(self):
+        workqueue.claim('a', 10, lease=60)
+        WorkItem.objects.update(attempts=2, lease_expires_at=timezone.now() - timedelta(seconds=1))
+        _, items = workqueue.claim('b', 10, lease=60)
+        self.assertEqual(items, [])
+        self.assertEqual(workqueue.queue_summary()['failed'], 2)
+
+    @override_settings(WORK_QUEUE_RETRY_DELAY=0)
+    def test_fail_retries_until_max_attempts(self):
+        token, items = workqueue.claim('a', 1, lease=60)
+        self.assertTrue(workqueue.fail(items[0], token, 'status 503'))
+        item = WorkItem.objects.get(pk=items[0].pk)
+        self.assertEqual((item.status, item.error, item.attempts), (WorkItem.STATUS_PENDING, 'status 503', 1))
+
+        token, items = workqueue.claim('a', 10, lease=60)
+        retried = next(claimed for claimed in items if claimed.pk == item.pk)
+        self.assertEqual(retried.attempts, 2)
+        workqueue.fail(retried, token, 'status 503')
+        self.assertEqual(WorkItem.objects.get(pk=item.pk).status, WorkItem.STATUS_FAILED)
+        self.assertEqual(workqueue.queue_summary()['retries'], 1)
+
+    def test_permanent_failure(self):
+        token, items = workqueue.claim('a', 1, lease=60)
+        workqueue.fail(items[0], token, 'sem transcrição', retry=False)
+        self.assertEqual(WorkItem.objects.get(pk=items[0].pk).status, WorkItem.STATUS_FAILED)
+
+    def test_release_returns_attempt(self):
+        token, items = workqueue.claim('a', 10, lease=60)
+        self.assertEqual(workqueue.release(token), 2)
+        self.assertEqual(set(WorkItem.objects.values_list('status', 'attempts')), {(WorkItem.STATUS_PENDING, 0)})
+
+    @override_settings(WORK_QUEUE_RETRY_DELAY=0)
+    def test_partial_failure_requeues_failed_tracks(self):
+        token, items = workqueue.claim('a', 1, lease=60)
+        results = [
+            TranscriptResult(url=items[0].url, track='pt', transcript=sample_transcript()),
+            TranscriptResult(url=items[0].url, track='en:asr', error='status 503'),
+        ]
+        WorkerCommand().settle(items[0], token, results, single=False)
+        item = WorkItem.objects.get(pk=items[0].pk)
+        self.assertEqual((item.status, item.lang), (WorkItem.STATUS_PENDING, 'en:asr'))
+
+    def test_missing_track_completes(self):
+        token, items = workqueue.claim('a', 1, lease=60)
+        results = [
+            TranscriptResult(url=items[0].url, track='pt', transcript=sample_transcript()),
+            TranscriptResult(url=items[0].url, track='en:asr', error='sem transcrição'),
+        ]
+        WorkerCommand().settle(items[0], token, results, single=False)
+        self.assertEqual(WorkItem.objects.get(pk=items[0].pk).status, WorkItem.STATUS_DONE)
+
+
+class TranscriptWriterTests(TestCase):
+    def test_overlong_track_does_not_sink_the_batch(self):
+        written = write_transcripts([
+            ('abcdefghijk', 'pt:asr', sample_transcript(), 'Título', None),
+            ('abcdefghijl', 'x' * 40, sample_transcript(), 'Título', None),
+        ])
+        self.assertEqual(written, 1)
+        self.assertEqual(list(Video.objects.values_list('video_id', 'lang')), [('abcdefghijk', 'pt:asr')])
+
+    def test_flush_reports_discarded_batch(self):
+        writer = TranscriptWriter(batch_size=10, flush_interval=0.01)
+        with mock.patch('home.writer.write_transcripts', side_effect=RuntimeError('banco fora')):
+            writer.put('abcdefghijk', 'pt', sample_transcript(), block=True)
+            with self.assertRaises(WriteError) as raised:
+                writer.flush(5)
+        self.assertEqual(raised.exception.keys, {('abcdefghijk', 'pt')})
+        self.assertEqual(writer.stats()['errors'], 1)
+        # A falha é informada uma vez só
+        with mock.patch('home.writer.write_transcripts', return_value=1):
+            writer.put('abcdefghijl', None, sample_transcript(), block=True)
+            self.assertTrue(writer.flush(5))
+
+
+CHANNEL = 'https://www.youtube.com/@canal'
+
+
+class ChannelWatermarkTests(TestCase):
+    def listing(self, *video_ids):
+        return mock.patch('home.channels.iter_channel_video_ids', return_value=iter(video_ids))
+
+    def test_watermark_waits_for_export(self):
+        watermarks = {}
+        with self.listing('abcdefghijk'):
+            urls = get_channel_video_urls(CHANNEL, only_new=True, watermarks=watermarks)
+        self.assertEqual(urls, ['https://www.youtube.com/watch?v=abcdefghijk'])
+        channel = Channel.objects.get()
+        self.assertIsNone(channel.last_exported_at)
+        self.assertEqual(list(watermarks), [channel.pk])
+
+        # Exportação que não terminou: os mesmos vídeos continuam novos
+        with self.listing('abcdefghijk'):
+            self.assertEqual(len(get_channel_video_urls(CHANNEL, only_new=True, watermarks={})), 1)
+
+        mark_exported(watermarks)
+        with self.listing('abcdefghijl', 'abcdefghijk'):
+            urls = get_channel_video_urls(CHANNEL, only_new=True, watermarks={})
+        self.assertEqual(urls, ['https://www.youtube.com/watch?v=abcdefghijl'])
+
+    def run_channel_job(self, results):
+        channel = Channel.objects.create(url=CHANNEL)
+        job = TranscriptionJob.objects.create(urls=[CHANNEL], only_new=True)
+
+        def resolve(urls, only_new, watermarks):
+            watermarks[channel.pk] = timezone.now()
+            return iter(['https://www.youtube.com/watch?v=abcdefghijk'])
+
+        with mock.patch('home.jobs.iter_video_urls', side_effect=resolve), \
+                mock.patch('home.jobs.iter_transcripts', return_value=iter(results)):
+            run_job(job.pk)
+        job.refresh_from_db()
+        channel.refresh_from_db()
+        return job, channel
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_failed_job_keeps_watermark(self):
+        job, channel = self.run_channel_job([])
+        self.assertEqual(job.status, TranscriptionJob.STATUS_FAILED)
+        self.assertIsNone(channel.last_exported_at)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_finished_job_moves_watermark(self):
+        job, channel = self.run_channel_job([TranscriptResult(
+            url='https://www.youtube.com/watch?v=abcdefghijk', title='Vídeo', transcript=sample_transcript())])
+        self.assertEqual(job.status, TranscriptionJob.STATUS_DONE)
+        self.assertIsNotNone(channel.last_exported_at)
+        os.remove(job.artifact)
+
+
+class TimedTextTests(TestCase):
+    XML = (b'<?xml version="1.0" encoding="utf-8" ?><transcript>'
+           b'<text start="0.5" dur="1.5">Ol\xc3\xa1 &amp;#39;mundo&amp;#39;</text>'
+           b'<text start="62" dur="2">segunda linha</text></transcript>')
+
+    def test_parse(self):
+        transcript = parse_timedtext(self.XML)
+        self.assertEqual(list(transcript), [(0.5, 1.5, "Olá 'mundo'"), (62.0, 2.0, 'segunda linha')])
+        self.assertEqual(str(transcript), "00:00 Olá 'mundo'\n01:02 segunda linha")
+
+    def test_parse_chunks(self):
+        chunks = [self.XML[i:i + 7] for i in range(0, len(self.XML), 7)]
+        self.assertEqual(list(parse_timedtext(iter(chunks))), list(parse_timedtext(self.XML)))
+
+    def test_segments_leave_the_tree(self):
+        roots = []
+
+        class Parser(XMLPullParser):
+            def read_events(self):
+                for event, element in super().read_events():
+                    if event == 'start' and not roots:
+                        roots.append(element)
+                    yield event, element
+
+        chunks = [self.XML[i:i + 7] for i in range(0, len(self.XML), 7)]
+        with mock.patch('home.timedtext.XMLPullParser', Parser):
+            self.assertEqual(len(parse_timedtext(iter(chunks))), 2)
+        self.assertEqual(len(roots[0]), 0)
+
+    def test_malformed_falls_back_to_soup(self):
+        # '&' solto não é XML válido
+        transcript = parse_timedtext(b'<transcript><text start="1" dur="2">a & b</text>'
+                                     b'<text start="3" dur="1">c</text></transcript>')
+        self.assertEqual(list(transcript), [(1.0, 2.0, 'a & b'), (3.0, 1.0, 'c')])
+
+    def test_malformed_stream_is_read_to_the_end(self):
+        content = (b'<transcript><text start="1" dur="2">a & b</text>'
+                   + b''.join(b'<text start="%d" dur="1">c</text>' % n for n in range(3, 50))
+                   + b'</transcript>')
+        chunks = (content[i:i + 16] for i in range(0, len(content), 16))
+        transcript = parse_timedtext(chunks)
+        self.assertEqual(len(transcript), 48)
+        self.assertEqual(transcript.segment_text(47), 'c')
+
+    def test_format_timestamp(self):
+        self.assertEqual(format_timestamp(59.9), '00:59')
+        self.assertEqual(format_timestamp(3725), '01:02:05')
+
+
+class ExtractorTests(TestCase):
+    PLAYER = {
+        'videoDetails': {'title': 'Vídeo'},
+        'microformat': {'description': 'chaves {dentro} de "strings"};'},
+        'captions': {'playerCaptionsTracklistRenderer': {'captionTracks': [{'languageCode': 'pt'}]}},
+    }
+
+    def page(self, player=PLAYER, date='"dateText": {"simpleText": "3 de mar. de 2024"}'):
+        script = f'var ytInitialPlayerResponse = {json.dumps(player)};' if player is not None else ''
+        return (f'<html><head><meta property="og:title" content="Ol&aacute; &amp; tchau"></head><body>'
+                f'<script>var ytInitialData = {{{date}}};</script><script>{script}</script></body></html>').encode()
+
+    def test_extract_reads_whole_player_response(self):
+        title, upload_date, data = extract_watch_page(self.page())
+        self.assertEqual((title, upload_date), ('Olá & tchau', '3 de mar. de 2024'))
+        self.assertEqual(data, self.PLAYER)
+
+    def test_date_span_wins_over_date_text(self):
+        page = self.page().replace(b'<body>', '<body><span class="style-scope yt-formatted-string bold">'
+                                   'Estreou em 1 de jan. de 2024</span>'.encode())
+        self.assertEqual(extract_watch_page(page)[1], 'Estreou em 1 de jan. de 2024')
+
+    def test_parse_returns_caption_tracks(self):
+        self.assertEqual(parse_watch_page(self.page()), ('Olá & tchau', '3 de mar. de 2024', [{'languageCode': 'pt'}]))
+        without_captions = dict(self.PLAYER, captions=None)
+        self.assertIsNone(parse_watch_page(self.page(without_captions))[2])
+
+    def test_unknown_page_falls_back_to_soup(self):
+        page = self.page(player=None)
+        with self.assertRaises(ExtractionError):
+            extract_watch_page(page)
+        with mock.patch('home.extractors.parse_watch_page_soup', return_value=('soup', None, None)) as soup:
+            self.assertEqual(parse_watch_page(page), ('soup', None, None))
+        soup.assert_called_once_with(page)
+        self.assertEqual(parse_watch_page(page), ('Olá & tchau', '3 de mar. de 2024', None))
+
+
+class VideoKeyTests(TestCase):
+    def test_video_key(self):
+        for url in ('https://www.youtube.com/watch?v=abcdefghijk&t=10s', 'https://youtu.be/abcdefghijk',
+                    'youtube.com/shorts/abcdefghijk'):
+            self.assertEqual(video_key(url), 'abcdefghijk')
+        self.assertEqual(video_key('https://example.com/video'), 'https://example.com/video')
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_lru_eviction_and_ttl(self):
+        cache = LRUCache(max_size=2, ttl=10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        with mock.patch('home.cache.time.monotonic', return_value=time.monotonic() + 11):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 1)
+
+    def test_transcript_tiers(self):
+        cache = TranscriptCache(alias='default')
+        self.assertIsNone(cache.get('abcdefghijk', 'pt'))
+        cache.set('abcdefghijk', ('transcrição', 'Título', '2024', 'pt', 'asr'), lang='pt')
+        self.assertEqual(cache.get('abcdefghijk', 'pt')[1], 'Título')
+        # Outro processo: só o cache compartilhado tem o valor
+        cache.local.clear()
+        self.assertEqual(cache.get('abcdefghijk', 'pt')[1], 'Título')
+        self.assertEqual(len(cache.local), 1)
+        self.assertIsNone(cache.get('abcdefghijk', 'en'))
+        stats = cache.stats()
+        self.assertEqual((stats['local_hits'], stats['shared_hits'], stats['misses']), (1, 1, 2))
+
+    def manifest(self, expire):
+        tracks = [{'languageCode': 'pt', 'baseUrl': f'https://www.youtube.com/api/timedtext?v=x&expire={expire}'}]
+        return ('Título', '2024', tracks)
+
+    def test_manifest_ttl_follows_expire(self):
+        cache = ManifestCache(alias='default', max_ttl=3600, margin=300)
+        now = time.time()
+        self.assertEqual(cache.ttl(self.manifest(int(now) + 1300)[2], now=int(now)), 1000)
+        self.assertEqual(cache.ttl(self.manifest(int(now) + 99999)[2], now=int(now)), 3600)
+        self.assertEqual(cache.ttl([{'baseUrl': 'https://www.youtube.com/api/timedtext?v=x'}]), 3600)
+
+    def test_manifest_expired_urls_not_cached(self):
+        cache = ManifestCache(alias='default', margin=300)
+        cache.set('abcdefghijk', self.manifest(int(time.time()) + 100))
+        self.assertIsNone(cache.get('abcdefghijk'))
+        # Sem legendas também não entra
+        cache.set('abcdefghijl', ('Título', '2024', []))
+        self.assertIsNone(cache.get('abcdefghijl'))
+
+    def test_manifest_shared_entry_expires(self):
+        cache = ManifestCache(alias='default', margin=300)
+        value = self.manifest(int(time.time()) + 1000)
+        cache.set('abcdefghijk', value)
+        cache.local.clear()
+        self.assertEqual(cache.get('abcdefghijk'), value)
+        cache.local.clear()
+        # Lido depois de os baseUrl vencerem: vale como falta
+        with mock.patch('home.cache.time.time', return_value=time.time() + 800):
+            self.assertIsNone(cache.get('abcdefghijk'))
+
+    def test_manifest_invalidate(self):
+        cache = ManifestCache(alias='default')
+        cache.set('abcdefghijk', self.manifest(int(time.time()) + 5000))
+        cache.invalidate('abcdefghijk')
+        self.assertIsNone(cache.get('abcdefghijk'))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+
+def sample_result(n=0, **fields):
+    fields.setdefault('title', f'Vídeo {n}')
+    fields.setdefault('transcript', sample_transcript())
+    return TranscriptResult(url=f'https://www.youtube.com/watch?v=abcdefghij{n}', video_id=f'abcdefghij{n}',
+                            upload_date='20240101', lang='pt', kind='manual', **fields)
+
+
+class UnculledFileBasedCacheTests(TestCase):
+    def cache(self, max_entries=3):
+        return UnculledFileBasedCache(tempfile.mkdtemp(), {'OPTIONS': {'MAX_ENTRIES': max_entries, 'CULL_FREQUENCY': 2}})
+
+    def test_set_does_not_scan_directory(self):
+        cache = self.cache()
+        with mock.patch.object(cache, '_list_cache_files', side_effect=AssertionError('varreu o diretório')):
+            cache.set('a', 1)
+            self.assertTrue(cache.add('b', 2))
+            self.assertFalse(cache.add('b', 3))
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_prune(self):
+        cache = self.cache(max_entries=4)
+        for i in range(6):
+            cache.set(f'k{i}', i)
+        cache.set('velha', 0, timeout=1)
+        with mock.patch('django.core.cache.backends.filebased.time.time', return_value=time.time() + 10):
+            self.assertEqual(cache.prune(), (1, 3))
+        self.assertEqual(len(cache._list_cache_files()), 3)
+        self.assertIsNone(cache.get('velha'))
+
+
+class SinkTests(TestCase):
+    def results(self):
+        return [sample_result(0), sample_result(1, title=None, transcript=None, timed_out=True), sample_result(2)]
+
+    def test_text(self):
+        text = ''.join(stream(TextSink(), self.results()))
+        self.assertIn('Título do Vídeo: Vídeo 0\nData de Envio: 20240101\n\n00:01 oi', text)
+        self.assertIn('Tempo esgotado: https://www.youtube.com/watch?v=abcdefghij1', text)
+        self.assertEqual(text.count('=' * 50), 3)
+        self.assertNotIn('=' * 50, ''.join(stream(TextSink(separator=False), self.results()[:1])))
+
+    def records(self, data):
+        return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+    def test_jsonl(self):
+        records = self.records(b''.join(stream(JsonlSink(), self.results())))
+        self.assertEqual([record['video_id'] for record in records], ['abcdefghij0', 'abcdefghij1', 'abcdefghij2'])
+        self.assertEqual(records[0]['segments'], [{'start': 1.0, 'duration': 2.0, 'text': 'oi'}])
+        self.assertEqual(records[1]['error'], 'timed_out')
+
+    def test_jsonl_gz(self):
+        data = b''.join(stream(JsonlSink('gz'), self.results()))
+        self.assertEqual(self.records(gzip.decompress(data)), self.records(b''.join(stream(JsonlSink(), self.results()))))
+
+    def test_jsonl_zst(self):
+        if not export_available('jsonl.zst'):
+            self.skipTest('zstandard não instalado')
+        import zstandard
+
+        data = b''.join(stream(JsonlSink('zst'), self.results()))
+        plain = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        self.assertEqual(self.records(plain), self.records(b''.join(stream(JsonlSink(), self.results()))))
+
+    def test_zip(self):
+        data = b''.join(stream(ZipSink('jsonl'), self.results()))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertIsNone(archive.testzip())
+            manifest = json.loads(archive.read('manifest.json'))
+            self.assertEqual([entry['file'] for entry in manifest],
+                             ['video-0-abcdefghij0.jsonl', None, 'video-2-abcdefghij2.jsonl'])
+            self.assertEqual(manifest[1]['error'], 'timed_out')
+            line = json.loads(archive.read('video-0-abcdefghij0.jsonl'))
+            self.assertEqual(line, {'start': 1.0, 'duration': 2.0, 'text': 'oi'})
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        index_transcript('abcdefghijk', 'pt', parse_timedtext(
+            b'<transcript><text start="5" dur="2">receita de bolo de cenoura</text>'
+            b'<text start="75" dur="2">cobertura de chocolate</text></transcript>'), title='Bolo')
+
+    def test_search(self):
+        results = search_segments('chocolate')
+        self.assertFalse(results['has_next'])
+        self.assertEqual(len(results['results']), 1)
+        hit = results['results'][0]
+        self.assertEqual((hit['video_id'], hit['title'], hit['timestamp']), ('abcdefghijk', 'Bolo', '01:15'))
+        self.assertEqual(hit['url'], 'https://www.youtube.com/watch?v=abcdefghijk&t=75s')
+
+    def test_pagination(self):
+        first = search_segments('de', page=1, per_page=1)
+        second = search_segments('de', page=2, per_page=1)
+        self.assertTrue(first['has_next'])
+        self.assertFalse(second['has_next'])
+        self.assertNotEqual(first['results'][0]['start'], second['results'][0]['start'])
+
+    def test_empty_query(self):
+        self.assertEqual(search_segments('  ')['results'], [])
+        # Sintaxe do FTS não vaza para o usuário
+        self.assertEqual(search_segments('"bolo*')['results'][0]['video_id'], 'abcdefghijk')
+
+
+class TranscribeCheckpointTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.shard = os.path.join(self.dir, 'transcripts-00000.txt')
+        self.urls = [f'https://www.youtube.com/watch?v=abcdefghij{n}' for n in range(3)]
+
+    def test_shard_joins_tracks(self):
+        results = [
+            sample_result(0, track='pt'), sample_result(1, track='pt', title=None, transcript=None, error='status 503'),
+            sample_result(0, track='en:asr', title=None, transcript=None, error='sem transcrição'),
+            sample_result(1, track='en:asr', title=None, transcript=None, error='sem transcrição'),
+        ]
+        with mock.patch('home.management.commands.transcribe.iter_transcripts', return_value=iter(results)):
+            done, failed, _ = transcribe_shard(self.shard, self.urls[:2], {'lang': 'pt,en:asr'})
+        # Uma faixa basta para o vídeo contar como concluído
+        self.assertEqual(done, {'abcdefghij0': 'transcripts-00000.txt'})
+        self.assertEqual(failed, {'abcdefghij1': 'status 503; sem transcrição'})
+        with open(f'{self.shard}.progress') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_interrupted_shard_is_recovered(self):
+        def interrupted():
+            yield sample_result(0)
+            yield sample_result(1, title=None, transcript=None, error='sem transcrição')
+            raise KeyboardInterrupt
+
+        manifest = Manifest(os.path.join(self.dir, 'manifest.json'))
+        manifest.pending = self.urls
+        manifest.save()
+        with mock.patch('home.management.commands.transcribe.iter_transcripts', return_value=interrupted()):
+            with self.assertRaises(KeyboardInterrupt):
+                transcribe_shard(self.shard, self.urls, {})
+        size = os.path.getsize(self.shard)
+        # Metade de um bloco e uma linha de registro cortada
+        with open(self.shard, 'ab') as f:
+            f.write(b'Titulo do Video: parcial')
+        with open(f'{self.shard}.progress', 'a') as f:
+            f.write('{"key": "abcdefghij2", "off')
+
+        manifest = Manifest(manifest.path)
+        manifest.recover_shards()
+        manifest.remove_orphan_shards()
+        self.assertEqual(manifest.completed, {'abcdefghij0': 'transcripts-00000.txt'})
+        self.assertEqual(manifest.failed, {'abcdefghij1': 'sem transcrição'})
+        self.assertEqual(manifest.pending, self.urls[2:])
+        self.assertEqual(os.path.getsize(self.shard), size)
+        self.assertFalse(os.path.exists(f'{self.shard}.progress'))
@@ -0,0 +1,195 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+
+# Controle de concorrência/ritmo para o upstream, compartilhado por todas as
+# execuções do engine no processo. Cada execução pode ter seu próprio event
+# loop (iter_transcripts roda numa thread), então o estado é protegido por
+# threading.Lock; quem espera por vaga fica num Future do próprio loop,
+# resolvido por release()/cancel() com call_soon_threadsafe.
+
+# Quem espera confere a vaga de novo depois disso, mesmo sem aviso
+WAKEUP_TIMEOUT = 1.0
+
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AIMDLimiter:
+    # Aumento aditivo enquanto latência e erros estão saudáveis; corte
+    # multiplicativo em 429/5xx (no máximo um corte por janela de cooldown).
+    def __init__(self, initial, min_limit, max_limit, latency_target, decrease=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self.counters = {'successes': 0, 'throttled': 0, 'errors': 0, 'decreases': 0}
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self.inflight < int(self.limit):
+                    self.inflight += 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await asyncio.wait((waiter,), timeout=WAKEUP_TIMEOUT)
+            except asyncio.CancelledError:
+                # Acordada e cancelada ao mesmo tempo: o aviso passa adiante
+                if waiter.done() and not waiter.cancelled():
+                    with self._lock:
+                        self._wake(1)
+                raise
+            finally:
+                with self._lock:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+
+    def _wake(self, count):
+        # Com o lock: acorda até `count` esperas, na ordem de chegada
+        while count > 0 and self._waiters:
+            loop, waiter = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError:
+                continue  # loop já fechado
+            count -= 1
+
+    def _free(self):
+        self._wake(int(self.limit) - self.inflight)
+
+    def release(self, ok, latency=None, throttled=False):
+        with self._lock:
+            self.inflight -= 1
+            if ok:
+                self.counters['successes'] += 1
+                if latency is None or latency <= self.latency_target:
+                    # +1 por "janela" completa de requisições bem-sucedidas
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self._free()
+                return
+            self.counters['throttled' if throttled else 'errors'] += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                self._last_decrease = now
+                self.counters['decreases'] += 1
+            self._free()
+
+    def cancel(self):
+        # Requisição cancelada (hedge perdedor, prazo): não mexe no limite
+        with self._lock:
+            self.inflight -= 1
+            self._free()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters, limit=round(self.limit, 2), inflight=self.inflight, waiting=len(self._waiters))
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_time(self):
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            with self._lock:
+                wait = self._wait_time()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        # Retry-After: ninguém fala com este host até o prazo passar
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamController:
+    def __init__(self):
+        self.limiter = AIMDLimiter(
+            initial=settings.UPSTREAM_CONCURRENCY_INITIAL,
+            min_limit=settings.UPSTREAM_CONCURRENCY_MIN,
+            max_limit=settings.UPSTREAM_CONCURRENCY_MAX,
+            latency_target=settings.UPSTREAM_LATENCY_TARGET,
+        )
+        self.max_retries = settings.UPSTREAM_MAX_RETRIES
+        self.retry_base = settings.UPSTREAM_RETRY_BASE
+        self.retry_max = settings.UPSTREAM_RETRY_MAX
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.gave_up = 0
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(settings.UPSTREAM_RATE_PER_HOST, settings.UPSTREAM_BURST_PER_HOST)
+            return self._buckets[host]
+
+    def retry_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.retry_max)
+        # Backoff exponencial com "full jitter"
+        return random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+
+    def record_retry(self, gave_up=False):
+        with self._lock:
+            if gave_up:
+                self.gave_up += 1
+            else:
+                self.retries += 1
+
+    def snapshot(self):
+        stats = self.limiter.snapshot()
+        with self._lock:
+            stats['retries'] = self.retries
+            stats['gave_up'] = self.gave_up
+        return stats
+
+
+upstream = UpstreamController()
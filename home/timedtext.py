@@ -0,0 +1,122 @@
+import html
+import logging
+from array import array
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+logger = logging.getLogger(__name__)
+
+
+def format_timestamp(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours > 0:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    else:
+        return f"{minutes:02d}:{seconds:02d}"
+
+
+class Transcript:
+    # Estrutura compacta: tempos em array('d') e todos os textos num único
+    # buffer, com offsets[i]:offsets[i + 1] delimitando o segmento i.
+    __slots__ = ('starts', 'durations', 'offsets', 'text')
+
+    def __init__(self, starts, durations, offsets, text):
+        self.starts = starts
+        self.durations = durations
+        self.offsets = offsets
+        self.text = text
+
+    def __len__(self):
+        return len(self.starts)
+
+    def segment_text(self, i):
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        # (start, dur, text) por segmento
+        for i in range(len(self.starts)):
+            yield self.starts[i], self.durations[i], self.segment_text(i)
+
+    def render(self, batch_size=512):
+        # Gera o formato "mm:ss texto" em blocos, sem montar a string inteira
+        n = len(self.starts)
+        for begin in range(0, n, batch_size):
+            lines = '\n'.join(
+                f"{format_timestamp(self.starts[i])} {self.segment_text(i)}"
+                for i in range(begin, min(begin + batch_size, n))
+            )
+            yield lines if begin == 0 else '\n' + lines
+
+    def __str__(self):
+        return ''.join(self.render())
+
+
+class TranscriptBuilder:
+    def __init__(self):
+        self.starts = array('d')
+        self.durations = array('d')
+        self.offsets = array('Q', [0])
+        self.parts = []
+        self.size = 0
+
+    def add(self, start, duration, text):
+        self.starts.append(start)
+        self.durations.append(duration)
+        self.parts.append(text)
+        self.size += len(text)
+        self.offsets.append(self.size)
+
+    def build(self):
+        return Transcript(self.starts, self.durations, self.offsets, ''.join(self.parts))
+
+
+def parse_timedtext(source):
+    # Parser incremental (pull) do XML de legendas. Aceita bytes ou um
+    # iterável de chunks; as entidades HTML (&#39; etc.) são decodificadas
+    # no mesmo passo. Cada <text> lido sai da árvore (clear() só esvazia o
+    # elemento; sem o remove() o pai continua guardando um por segmento).
+    if isinstance(source, (bytes, str)):
+        source = (source,)
+
+    builder = TranscriptBuilder()
+    parser = XMLPullParser(events=('start', 'end'))
+    chunks = iter(source)
+    received = []
+    parents = []
+    try:
+        for chunk in chunks:
+            received.append(chunk)
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == 'start':
+                    parents.append(element)
+                    continue
+                parents.pop()
+                if element.tag == 'text':
+                    builder.add(
+                        float(element.get('start', 0)),
+                        float(element.get('dur', 0)),
+                        html.unescape(element.text or ''),
+                    )
+                    element.clear()
+                    if parents:
+                        parents[-1].remove(element)
+        parser.close()
+    except ParseError as e:
+        logger.debug(f"XML de legendas malformado ({e}), usando BeautifulSoup.")
+        # O erro pode vir no meio do stream: o BeautifulSoup precisa do resto
+        received.extend(chunks)
+        return parse_timedtext_soup(b''.join(c if isinstance(c, bytes) else c.encode() for c in received))
+    return builder.build()
+
+def parse_timedtext_soup(content):
+    from bs4 import BeautifulSoup
+
+    builder = TranscriptBuilder()
+    for segment in BeautifulSoup(content, 'html.parser').find_all('text'):
+        builder.add(
+            float(segment.get('start', 0)),
+            float(segment.get('dur', 0)),
+            html.unescape(segment.get_text()),
+        )
+    return builder.build()
@@ -1,6 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.transcription_view, name='index'),
+    path('', views.transcription_async_view if settings.ASYNC_VIEWS else views.transcription_view, name='index'),
+    path('jobs/', views.job_submit_view, name='job_submit'),
+    path('jobs/<uuid:job_id>/', views.job_status_view, name='job_status'),
+    path('jobs/<uuid:job_id>/events/', views.job_events_async_view if settings.ASYNC_VIEWS else views.job_events_view,
+         name='job_events'),
+    path('jobs/<uuid:job_id>/download/',
+         views.job_download_async_view if settings.ASYNC_VIEWS else views.job_download_view, name='job_download'),
+    path('search/', views.search_view, name='search'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
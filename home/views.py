@@ -1,308 +1,328 @@
 # .TXT
 
-import os
-import requests
-from bs4 import BeautifulSoup
-import re
+import asyncio
+import contextlib
 import json
-import youtube_dl
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from django.shortcuts import render
-from django.http import HttpResponse
+import os
+import time
+from itertools import chain, islice
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
+from django.http import HttpResponse, StreamingHttpResponse, JsonResponse, FileResponse
+from django.urls import reverse
+from django.conf import settings
 from .forms import YouTubeURLForm
 from django.views.decorators.csrf import csrf_exempt
 import logging
 from urllib.parse import quote
-from django.http import FileResponse
-from django.conf import settings
-from django.utils.text import slugify
+from django.utils.http import content_disposition_header
+from . import metrics
+from .cache import transcript_cache, manifest_cache
+from .engine import FetchEngine, iter_transcripts
+from .http_client import http_stats
+from .throttle import upstream
+from .singleflight import singleflight
+from .writer import transcript_writer
+from .hedging import hedging
+from .jobs import submit_job
+from .models import TranscriptionJob
+from .metadata import SOURCES
+from .output import (
+    deliverable,
+    adeliverable,
+    stream,
+    astream,
+    make_sink,
+    export_file_name,
+    export_available,
+    ENTRY_RENDERERS,
+    EXPORT_FORMATS,
+)
+from .channels import mark_exported
+from .resolver import iter_video_urls
+from .search import search_segments
+from .youtube import parse_track_specs
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_youtube_transcript_and_title(video_url):
+def log_fetch_stats(summary=None):
+    logger.info(f"Cache de transcrições: {transcript_cache.stats()}")
+    logger.info(f"Cache de legendas disponíveis: {manifest_cache.stats()}")
+    logger.info(f"HTTP: {http_stats.snapshot()}")
+    logger.info(f"Upstream: {upstream.snapshot()}")
+    logger.info(f"Single-flight: {singleflight.stats()}")
+    logger.info(f"Writer: {transcript_writer.stats()}")
+    logger.info(f"Hedge: {hedging.stats()}")
+    if summary is not None:
+        logger.info(f"Tempos por etapa: {summary.as_dict()}")
+
+def with_stats_logging(content, summary=None, watermarks=None):
+    yield from metrics.count_output(content)
+    log_fetch_stats(summary)
+    # Só com a resposta inteira entregue os vídeos deixam de ser "novos"
+    if watermarks:
+        mark_exported(watermarks)
+
+async def awith_stats_logging(content, summary=None, watermarks=None):
+    async for chunk in metrics.acount_output(content):
+        yield chunk
+    log_fetch_stats(summary)
+    if watermarks:
+        await asyncio.to_thread(mark_exported, watermarks)
+
+def transcription_options(request):
+    # Campos do formulário, validados; retorna (opções, mensagem de erro)
+    urls = request.POST.getlist('video_url')
+    if not urls:
+        return None, 'Nenhuma URL fornecida.'
+    source = request.POST.get('source') or None
+    if source and source not in SOURCES:
+        return None, 'Fonte de metadados inválida.'
+    export_format = request.POST.get('format', 'txt')
+    entry_format = request.POST.get('entry_format', 'txt')
+    if not export_available(export_format) or entry_format not in ENTRY_RENDERERS:
+        return None, 'Formato de exportação inválido.'
     try:
-        response = requests.get(video_url)
-        if response.status_code != 200:
-            logger.error(f"Falha ao acessar a página do vídeo. Status code: {response.status_code}")
-            return None, None
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        title_element = soup.find("meta", property="og:title")
-        title = title_element["content"] if title_element else "sem_titulo"
-
-                # Extrair a data de envio
-        upload_date = None
-        date_span = soup.find("span", class_="style-scope yt-formatted-string bold", string=re.compile("Transmitido ao vivo em|Estreou em|Enviado em"))
-        if date_span:
-            upload_date = date_span.text.strip()
-        else:
-            # Tentar encontrar a data em um formato alternativo
-            script_data = soup.find("script", string=re.compile("dateText"))
-            if script_data:
-                date_match = re.search(r'"dateText":\s*{\s*"simpleText":\s*"([^"]+)"', script_data.string)
-                if date_match:
-                    upload_date = date_match.group(1)
-
-        script = soup.find("script", string=re.compile("ytInitialPlayerResponse"))
-        if not script:
-            logger.error("Não foi possível encontrar o script de dados iniciais.")
-            return None, title
-
-        json_text = re.search(r"ytInitialPlayerResponse\s*=\s*({.*?});", script.string)
-        if not json_text:
-            logger.error("Não foi possível extrair os dados JSON.")
-            return None, title
-
-        data = json.loads(json_text.group(1))
-        captions = data.get('captions')
-        if not captions:
-            logger.error("Nenhuma transcrição disponível para este vídeo.")
-            return None, title
-
-        caption_tracks = captions['playerCaptionsTracklistRenderer']['captionTracks']
-        transcript_url = caption_tracks[0]['baseUrl']
-
-        transcript_response = requests.get(transcript_url)
-        transcript_soup = BeautifulSoup(transcript_response.content, 'html.parser')
-        transcript_segments = transcript_soup.find_all('text')
-        
-        full_transcript = []
-        for segment in transcript_segments:
-            timestamp = segment.get('start')
-            text = segment.get_text()
-            formatted_timestamp = format_timestamp(float(timestamp))
-            full_transcript.append(f"{formatted_timestamp} {text}")
-        
-        full_transcript = '\n'.join(full_transcript)
-        
-        return full_transcript, title, upload_date
-
-    except Exception as e:
-        logger.error(f"Erro ao extrair a transcrição: {e}")
-        return None, None, None
-    
-def format_timestamp(seconds):
-    minutes, seconds = divmod(int(seconds), 60)
-    hours, minutes = divmod(minutes, 60)
-    if hours > 0:
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-    else:
-        return f"{minutes:02d}:{seconds:02d}"
-
-def get_video_urls_from_channel(channel_url):
-    ydl_opts = {
-        'quiet': True,
-        'extract_flat': True,
-        'skip_download': True
-    }
-    
-    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-        result = ydl.extract_info(channel_url, download=False)
-        if 'entries' in result:
-            video_urls = [entry['url'] for entry in result['entries'] if 'url' in entry]
-            video_urls = [f"https://www.youtube.com/watch?v={url.split('v=')[-1]}" if "youtube" not in url else url for url in video_urls]
-            return video_urls
-        else:
-            return []
-
-def fetch_and_append_transcript(url):
-    transcript, title, upload_date = get_youtube_transcript_and_title(url)
-    if transcript:
-        return title, transcript, upload_date
-    else:
-        logger.warning(f"Transcrição não encontrada para o vídeo: {url}")
-        return None, None, None
+        langs = parse_track_specs(request.POST.getlist('lang'))
+    except ValueError:
+        return None, 'Idioma ou tipo de legenda inválido.'
+    return {
+        'urls': urls,
+        'source': source,
+        'langs': langs,
+        'export_format': export_format,
+        'entry_format': entry_format,
+        'only_new': bool(request.POST.get('only_new')),
+    }, None
+
+def transcription_response(content, options, single, title):
+    export_format = options['export_format']
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    file_name = export_file_name(export_format, single, title)
+    response['Content-Disposition'] = content_disposition_header(as_attachment=True, filename=file_name)
+    return response
+
+def error_page(request, error):
+    return render(request, 'index.html', {'form': YouTubeURLForm(), 'error': error})
 
-def is_channel_url(url):
-    return '/channel/' in url or '/@' in url or '/c/' in url or '/user/' in url
-
-@csrf_exempt
 @csrf_exempt
 def transcription_view(request):
     if request.method == 'POST':
-        urls = request.POST.getlist('video_url')
-        if not urls:
-            return render(request, 'index.html', {'form': YouTubeURLForm(), 'error': 'Nenhuma URL fornecida.'})
-
-        all_video_urls = []
-        for url in urls:
-            if is_channel_url(url):
-                channel_videos = get_video_urls_from_channel(url)
-                all_video_urls.extend(channel_videos)
-            else:
-                all_video_urls.append(url)
-
-        if not all_video_urls:
-            return render(request, 'index.html', {'form': YouTubeURLForm(), 'error': 'Nenhum vídeo encontrado.'})
-
-        transcripts = []
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_url = {executor.submit(fetch_and_append_transcript, url): url for url in all_video_urls}
-            for future in as_completed(future_to_url):
-                title, transcript, upload_date = future.result()
-                if title and transcript:
-                    transcripts.append((title, transcript, upload_date))
-
-        if transcripts:
-            temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp_transcripts')
-            os.makedirs(temp_dir, exist_ok=True)
-
-            if len(transcripts) == 1:
-                # Se houver apenas uma transcrição, use o nome do vídeo
-                title, transcript, upload_date = transcripts[0]
-                safe_title = slugify(title)
-                file_name = f"{safe_title}.txt"
-                file_path = os.path.join(temp_dir, file_name)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(f"Título do Vídeo: {title}\n")
-                    if upload_date:
-                        f.write(f"Data de Envio: {upload_date}\n")
-                    f.write("\n")
-                    f.write(transcript)
-            else:
-                # Se houver múltiplas transcrições, use 'all_transcriptions.txt'
-                file_name = 'all_transcriptions.txt'
-                file_path = os.path.join(temp_dir, file_name)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    for title, transcript, upload_date in transcripts:
-                        f.write(f"Título do Vídeo: {title}\n")
-                        if upload_date:
-                            f.write(f"Data de Envio: {upload_date}\n")
-                        f.write("\n")
-                        f.write(transcript)
-                        f.write("\n\n" + "="*50 + "\n\n")  # Separador entre transcrições
-
-            return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=file_name)
-        else:
-            return render(request, 'index.html', {'form': YouTubeURLForm(), 'error': 'Nenhuma transcrição disponível para os vídeos fornecidos.'})
+        options, error = transcription_options(request)
+        if error:
+            return error_page(request, error)
+
+        summary = metrics.start_summary()
+        # Canais inteiros não viram uma lista: as URLs alimentam o engine
+        # conforme são enumeradas. As duas primeiras dizem se é um vídeo só.
+        watermarks = {}
+        video_urls = iter_video_urls(options['urls'], only_new=options['only_new'], watermarks=watermarks)
+        head = list(islice(video_urls, 2))
+        if not head:
+            return error_page(request, 'Nenhum vídeo encontrado.')
+        # Um vídeo com várias faixas também sai como vários blocos
+        single = len(head) == 1 and len(options['langs']) == 1
+
+        results = deliverable(iter_transcripts(chain(head, video_urls), source=options['source'], lang=options['langs']))
+        # Espera só pelo primeiro resultado válido; o resto é transmitido
+        # conforme cada vídeo termina.
+        first = next(results, None)
+        if first is None:
+            log_fetch_stats(summary)
+            return error_page(request, 'Nenhuma transcrição disponível para os vídeos fornecidos.')
+
+        sink = make_sink(options['export_format'], options['entry_format'], single)
+        content = stream(sink, chain([first], results))
+        return transcription_response(with_stats_logging(content, summary, watermarks), options, single, first.title)
 
     else:
         form = YouTubeURLForm()
     
     return render(request, 'index.html', {'form': form})
 
-## JSONL
-
-
-# import os
-# import requests
-# from bs4 import BeautifulSoup
-# import re
-# import json
-# import youtube_dl
-# from concurrent.futures import ThreadPoolExecutor, as_completed
-# from django.shortcuts import render
-# from django.http import HttpResponse, JsonResponse
-# from .forms import YouTubeURLForm
-# from django.views.decorators.csrf import csrf_exempt
-# import logging
-
-# logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-# logger = logging.getLogger(__name__)
-
-# def get_youtube_transcript_and_title(video_url):
-#     try:
-#         response = requests.get(video_url)
-#         if response.status_code != 200:
-#             logger.error(f"Falha ao acessar a página do vídeo. Status code: {response.status_code}")
-#             return None
-
-#         soup = BeautifulSoup(response.content, 'html.parser')
-#         title_element = soup.find("meta", property="og:title")
-#         title = title_element["content"] if title_element else "sem_titulo"
-
-#         script = soup.find("script", string=re.compile("ytInitialPlayerResponse"))
-#         if not script:
-#             logger.error("Não foi possível encontrar o script de dados iniciais.")
-#             return None
-
-#         json_text = re.search(r"ytInitialPlayerResponse\s*=\s*({.*?});", script.string)
-#         if not json_text:
-#             logger.error("Não foi possível extrair os dados JSON.")
-#             return None
-
-#         data = json.loads(json_text.group(1))
-#         captions = data.get('captions')
-#         if not captions:
-#             logger.error("Nenhuma transcrição disponível para este vídeo.")
-#             return None
-
-#         caption_tracks = captions['playerCaptionsTracklistRenderer']['captionTracks']
-#         transcript_url = caption_tracks[0]['baseUrl']
-
-#         transcript_response = requests.get(transcript_url)
-#         transcript_soup = BeautifulSoup(transcript_response.content, 'html.parser')
-#         transcript_segments = transcript_soup.find_all('text')
-#         full_transcript = ' '.join([segment.get_text() for segment in transcript_segments])
-        
-#         return {"theme": title, "content": full_transcript}
-
-#     except Exception as e:
-#         logger.error(f"Erro ao extrair a transcrição: {e}")
-#         return None
-
-# def get_video_urls_from_channel(channel_url):
-#     ydl_opts = {
-#         'quiet': True,
-#         'extract_flat': True,
-#         'skip_download': True
-#     }
-    
-#     with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-#         result = ydl.extract_info(channel_url, download=False)
-#         if 'entries' in result:
-#             video_urls = [entry['url'] for entry in result['entries'] if 'url' in entry]
-#             video_urls = [f"https://www.youtube.com/watch?v={url.split('v=')[-1]}" if "youtube" not in url else url for url in video_urls]
-#             return video_urls
-#         else:
-#             return []
-
-# def fetch_transcript(url):
-#     return get_youtube_transcript_and_title(url)
-
-# def is_channel_url(url):
-#     return '/channel/' in url or '/@' in url or '/c/' in url or '/user/' in url
-
-# @csrf_exempt
-# def transcription_view(request):
-#     if request.method == 'POST':
-#         urls = request.POST.getlist('video_url')
-#         if not urls:
-#             return JsonResponse({'error': 'Nenhuma URL fornecida.'}, status=400)
-
-#         all_video_urls = []
-#         for url in urls:
-#             if is_channel_url(url):
-#                 channel_videos = get_video_urls_from_channel(url)
-#                 all_video_urls.extend(channel_videos)
-#             else:
-#                 all_video_urls.append(url)
-
-#         if not all_video_urls:
-#             return JsonResponse({'error': 'Nenhum vídeo encontrado.'}, status=404)
-
-#         dataset = []
-#         with ThreadPoolExecutor(max_workers=10) as executor:
-#             future_to_url = {executor.submit(fetch_transcript, url): url for url in all_video_urls}
-#             for future in as_completed(future_to_url):
-#                 result = future.result()
-#                 if result:
-#                     dataset.append(result)
-
-#         if dataset:
-#             response = HttpResponse(content_type='application/json')
-#             response['Content-Disposition'] = 'attachment; filename="youtube_transcriptions_dataset.jsonl"'
-            
-#             for item in dataset:
-#                 json.dump(item, response, ensure_ascii=False)
-#                 response.write('\n')
-            
-#             return response
-#         else:
-#             return JsonResponse({'error': 'Nenhuma transcrição disponível para os vídeos fornecidos.'}, status=404)
-
-#     else:
-#         form = YouTubeURLForm()
-    
-#     return render(request, 'index.html', {'form': form})
\ No newline at end of file
+@csrf_exempt
+async def transcription_async_view(request):
+    # Contraparte assíncrona, usada sob ASGI (ASYNC_VIEWS): o engine roda no
+    # event loop do servidor em vez de numa thread por requisição, então um
+    # worker atende muitos downloads presos no upstream ao mesmo tempo.
+    if request.method != 'POST':
+        return render(request, 'index.html', {'form': YouTubeURLForm()})
+    options, error = transcription_options(request)
+    if error:
+        return error_page(request, error)
+
+    summary = metrics.start_summary()
+    watermarks = {}
+    video_urls = iter_video_urls(options['urls'], only_new=options['only_new'], watermarks=watermarks)
+    # A enumeração de canais é bloqueante (youtube_dl, banco)
+    head = await asyncio.to_thread(lambda: list(islice(video_urls, 2)))
+    if not head:
+        return error_page(request, 'Nenhum vídeo encontrado.')
+    single = len(head) == 1 and len(options['langs']) == 1
+
+    engine = FetchEngine(source=options['source'], lang=options['langs'])
+    run = engine.run(chain(head, video_urls))
+    results = adeliverable(run)
+    first = await anext(results, None)
+    if first is None:
+        log_fetch_stats(summary)
+        return error_page(request, 'Nenhuma transcrição disponível para os vídeos fornecidos.')
+
+    async def remaining():
+        yield first
+        async for result in results:
+            yield result
+
+    sink = make_sink(options['export_format'], options['entry_format'], single)
+
+    async def body():
+        # O corpo é dono do engine: fechado (fim ou cliente desconectado),
+        # o run() cancela os workers e devolve as vagas do upstream na hora
+        async with contextlib.aclosing(run):
+            async for chunk in awith_stats_logging(astream(sink, remaining()), summary, watermarks):
+                yield chunk
+
+    return transcription_response(ClosingStream(body()), options, single, first.title)
+
+class ClosingStream:
+    # Corpo assíncrono de StreamingHttpResponse que o Django fecha: o
+    # ASGIHandler só fecha o próprio iterador, mas chama response.close()
+    # (numa thread, também quando o cliente desconecta), e aqui isso fecha
+    # o gerador da view no event loop do servidor.
+    def __init__(self, body):
+        self.body = body
+        self.loop = asyncio.get_running_loop()
+
+    def __aiter__(self):
+        return self.body
+
+    def close(self):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.loop.create_task(self.body.aclose())
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.body.aclose(), self.loop).result()
+        except RuntimeError:
+            pass  # o loop já terminou
+
+SSE_MAX_DURATION = 25  # segundos; o EventSource reconecta sozinho
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+def job_payload(job):
+    payload = job.progress()
+    payload['status_url'] = reverse('job_status', args=[job.pk])
+    payload['events_url'] = reverse('job_events', args=[job.pk])
+    if job.status == TranscriptionJob.STATUS_DONE and job.artifact:
+        payload['download_url'] = reverse('job_download', args=[job.pk])
+    return payload
+
+def job_unavailable(job):
+    # Resposta de download para job não concluído ou com arquivo expirado
+    if job.status != TranscriptionJob.STATUS_DONE:
+        return JsonResponse(job_payload(job), status=409)
+    if not job.artifact:
+        return JsonResponse(dict(job_payload(job), error='Arquivo expirado.'), status=410)
+    return None
+
+@csrf_exempt
+def job_submit_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método não permitido.'}, status=405)
+    # Mesmos campos (e validação) do formulário síncrono
+    options, error = transcription_options(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    job = submit_job(
+        options['urls'], only_new=options['only_new'], source=options['source'], langs=options['langs'],
+        export_format=options['export_format'], entry_format=options['entry_format'],
+    )
+    return JsonResponse(job_payload(job), status=202)
+
+def job_status_view(request, job_id):
+    job = get_object_or_404(TranscriptionJob, pk=job_id)
+    return JsonResponse(job_payload(job))
+
+def job_events_view(request, job_id):
+    # Sob WSGI cada conexão aberta prende um worker: a resposta leva só o
+    # estado atual e fecha; o EventSource reconecta depois do `retry`
+    job = get_object_or_404(TranscriptionJob, pk=job_id)
+    events = f"retry: 1000\n\ndata: {json.dumps(job_payload(job))}\n\n"
+    if job.finished:
+        events += "event: end\ndata: {}\n\n"
+    response = HttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def job_events_async_view(request, job_id):
+    # Sob ASGI: o laço espera com asyncio.sleep em vez de prender uma
+    # thread por cliente conectado, e cada evento sai assim que é gerado
+    await aget_object_or_404(TranscriptionJob, pk=job_id)
+
+    async def events():
+        yield "retry: 1000\n\n"
+        last = None
+        deadline = time.monotonic() + SSE_MAX_DURATION
+        while time.monotonic() < deadline:
+            job = await TranscriptionJob.objects.aget(pk=job_id)
+            payload = job_payload(job)
+            if payload != last:
+                yield f"data: {json.dumps(payload)}\n\n"
+                last = payload
+            if job.finished:
+                yield "event: end\ndata: {}\n\n"
+                return
+            await asyncio.sleep(1)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def job_download_view(request, job_id):
+    job = get_object_or_404(TranscriptionJob, pk=job_id)
+    unavailable = job_unavailable(job)
+    if unavailable:
+        return unavailable
+    return FileResponse(open(job.artifact, 'rb'), as_attachment=True, filename=job.file_name,
+                        content_type=EXPORT_FORMATS[job.export_format])
+
+async def job_download_async_view(request, job_id):
+    # FileResponse sob ASGI é lido inteiro numa thread antes de sair; aqui o
+    # arquivo vai em blocos, lidos fora do event loop
+    job = await aget_object_or_404(TranscriptionJob, pk=job_id)
+    unavailable = job_unavailable(job)
+    if unavailable:
+        return unavailable
+
+    async def chunks(f):
+        try:
+            while chunk := await asyncio.to_thread(f.read, DOWNLOAD_CHUNK_SIZE):
+                yield chunk
+        finally:
+            f.close()
+
+    f = await asyncio.to_thread(open, job.artifact, 'rb')
+    response = StreamingHttpResponse(ClosingStream(chunks(f)), content_type=EXPORT_FORMATS[job.export_format])
+    response['Content-Length'] = os.fstat(f.fileno()).st_size
+    response['Content-Disposition'] = content_disposition_header(as_attachment=True, filename=job.file_name)
+    return response
+
+def search_view(request):
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    results = search_segments(request.GET.get('q', ''), page=page, per_page=settings.SEARCH_PAGE_SIZE)
+    if results['has_next']:
+        results['next_url'] = f"{reverse('search')}?q={quote(results['query'])}&page={page + 1}"
+    return JsonResponse(results)
+
+def metrics_view(request):
+    if not metrics.ENABLED:
+        return HttpResponse(status=404)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,163 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import WorkItem
+from .youtube import parse_track_specs
+
+logger = logging.getLogger(__name__)
+
+# Fila de trabalho no banco (WorkItem) para a frota de `manage.py worker`.
+# No Postgres a reserva usa FOR UPDATE SKIP LOCKED: workers concorrentes
+# pegam itens diferentes sem esperar uns pelos outros. Em bancos sem SKIP
+# LOCKED (SQLite) o UPDATE condicional com o token da reserva mantém um
+# item com um worker só.
+
+
+def normalize_lang(lang):
+    specs = parse_track_specs(lang)
+    return ','.join(spec for spec in specs if spec)
+
+def enqueue(urls, lang=None, source='', max_attempts=None, batch_size=1000):
+    # URLs já na fila (mesma url/lang/fonte) são ignoradas; retorna quantas
+    # entraram. urls pode ser um gerador (ex.: a enumeração de um canal).
+    lang = normalize_lang(lang)
+    max_attempts = max_attempts or settings.WORK_QUEUE_MAX_ATTEMPTS
+    now = timezone.now()
+    added = 0
+    batch = []
+
+    def flush():
+        if not batch:
+            return 0
+        before = WorkItem.objects.filter(url__in=[item.url for item in batch], lang=lang, source=source).count()
+        WorkItem.objects.bulk_create(batch, ignore_conflicts=True)
+        after = WorkItem.objects.filter(url__in=[item.url for item in batch], lang=lang, source=source).count()
+        batch.clear()
+        return after - before
+
+    for url in urls:
+        batch.append(WorkItem(url=url, lang=lang, source=source or '', max_attempts=max_attempts, available_at=now))
+        if len(batch) >= batch_size:
+            added += flush()
+    added += flush()
+    return added
+
+def _claimable(now):
+    return (
+        Q(status=WorkItem.STATUS_PENDING, available_at__lte=now)
+        | Q(status=WorkItem.STATUS_RUNNING, lease_expires_at__lt=now)
+    )
+
+def claim(worker, limit, lease=None):
+    # Reserva até `limit` itens para `worker`; retorna (token, itens)
+    lease = lease or settings.WORK_QUEUE_LEASE
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        # Leases vencidas sem tentativas restantes não voltam para a fila
+        WorkItem.objects.filter(
+            status=WorkItem.STATUS_RUNNING, lease_expires_at__lt=now, attempts__gte=F('max_attempts'),
+        ).update(status=WorkItem.STATUS_FAILED, error='lease expirada', finished_at=now)
+        pks = list(
+            WorkItem.objects.select_for_update(skip_locked=True)
+            .filter(_claimable(now))
+            .order_by('available_at', 'id')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if pks:
+            WorkItem.objects.filter(_claimable(now), pk__in=pks).update(
+                status=WorkItem.STATUS_RUNNING,
+                worker=worker,
+                claim=token,
+                attempts=F('attempts') + 1,
+                lease_expires_at=now + timedelta(seconds=lease),
+                heartbeat_at=now,
+                started_at=now,
+            )
+    return token, list(WorkItem.objects.filter(claim=token))
+
+def heartbeat(token, lease=None):
+    # Renova a lease de tudo o que ainda está com esta reserva
+    lease = lease or settings.WORK_QUEUE_LEASE
+    now = timezone.now()
+    return WorkItem.objects.filter(claim=token, status=WorkItem.STATUS_RUNNING).update(
+        heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease),
+    )
+
+def complete(item, token):
+    # False se a lease foi perdida (outro worker reservou o item)
+    return WorkItem.objects.filter(pk=item.pk, claim=token, status=WorkItem.STATUS_RUNNING).update(
+        status=WorkItem.STATUS_DONE, error='', finished_at=timezone.now(),
+    ) > 0
+
+def fail(item, token, error, retry=True, lang=None):
+    # Volta para a fila com espera exponencial enquanto houver tentativas.
+    # lang: só essas faixas voltam (as outras do item já foram gravadas).
+    now = timezone.now()
+    items = WorkItem.objects.filter(pk=item.pk, claim=token, status=WorkItem.STATUS_RUNNING)
+    if retry and item.attempts < item.max_attempts:
+        delay = settings.WORK_QUEUE_RETRY_DELAY * 2 ** (item.attempts - 1)
+        fields = dict(
+            status=WorkItem.STATUS_PENDING, error=error, lease_expires_at=None,
+            available_at=now + timedelta(seconds=delay),
+        )
+        if lang is not None:
+            try:
+                with transaction.atomic():
+                    return items.update(lang=normalize_lang(lang), **fields) > 0
+            except IntegrityError:
+                # Já existe um item só com essas faixas: este volta inteiro
+                pass
+        return items.update(**fields) > 0
+    return items.update(status=WorkItem.STATUS_FAILED, error=error, finished_at=now) > 0
+
+def release(token):
+    # Worker encerrado: devolve o que não terminou sem gastar a tentativa
+    return WorkItem.objects.filter(claim=token, status=WorkItem.STATUS_RUNNING).update(
+        status=WorkItem.STATUS_PENDING, attempts=F('attempts') - 1, lease_expires_at=None,
+        available_at=timezone.now(),
+    )
+
+def has_work():
+    # Pendentes (mesmo os que esperam nova tentativa) ou em andamento
+    return WorkItem.objects.filter(status__in=[WorkItem.STATUS_PENDING, WorkItem.STATUS_RUNNING]).exists()
+
+def queue_summary():
+    now = timezone.now()
+    summary = {status: 0 for status, _ in WorkItem.STATUS_CHOICES}
+    for row in WorkItem.objects.values('status').annotate(count=Count('pk')):
+        summary[row['status']] = row['count']
+    summary['expired_leases'] = WorkItem.objects.filter(
+        status=WorkItem.STATUS_RUNNING, lease_expires_at__lt=now,
+    ).count()
+    summary['retries'] = WorkItem.objects.filter(attempts__gt=1).aggregate(
+        total=Sum(F('attempts') - 1))['total'] or 0
+    return summary
+
+def worker_throughput(minutes=60):
+    # Painel: itens concluídos/falhos por worker na janela e vídeos/minuto
+    since = timezone.now() - timedelta(minutes=minutes)
+    rows = (
+        WorkItem.objects.filter(finished_at__gte=since)
+        .exclude(worker='')
+        .values('worker')
+        .annotate(
+            done=Count('pk', filter=Q(status=WorkItem.STATUS_DONE)),
+            failed=Count('pk', filter=Q(status=WorkItem.STATUS_FAILED)),
+            first_started=Min('started_at'),
+            last_finished=Max('finished_at'),
+        )
+        .order_by('-done', 'worker')
+    )
+    report = []
+    for row in rows:
+        elapsed = (row['last_finished'] - row['first_started']).total_seconds() if row['first_started'] else 0
+        row['per_minute'] = round(row['done'] * 60 / elapsed, 1) if elapsed > 0 else None
+        report.append(row)
+    return report
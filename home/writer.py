@@ -0,0 +1,225 @@
+import atexit
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import Video, Segment
+
+logger = logging.getLogger(__name__)
+
+# Persistência das transcrições fora das threads de fetch. O engine só
+# enfileira; uma thread própria junta os vídeos e grava em lote (por
+# tamanho ou por tempo): upsert dos Video por (video_id, lang) e os
+# segmentos via COPY no Postgres ou bulk_create nos outros bancos.
+
+
+def _copy_segments(rows):
+    # COPY ... FROM STDIN (psycopg2); None se o driver não suportar
+    raw = connection.cursor().cursor
+    if not hasattr(raw, 'copy_expert'):
+        return None
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(Segment._meta.get_field(name).column)
+                        for name in ('video', 'position', 'start', 'duration', 'text'))
+    raw.copy_expert(f"COPY {quote(Segment._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return len(rows)
+
+def write_transcripts(items):
+    # items: (video_id, lang, transcript, title, upload_date). Vídeos já
+    # gravados com a mesma quantidade de segmentos são ignorados.
+    latest = {}
+    max_lang = Video._meta.get_field('lang').max_length
+    for video_id, lang, transcript, title, upload_date in items:
+        if len(lang or '') > max_lang:
+            # Uma linha inválida derrubaria o lote inteiro
+            logger.warning(f"Faixa '{lang}' de {video_id} não cabe no índice; ignorada")
+            continue
+        latest[(video_id, lang or '')] = (transcript, title, upload_date)
+
+    existing = {}
+    for video_id, lang, count in Video.objects.filter(
+        video_id__in={video_id for video_id, _ in latest}
+    ).values_list('video_id', 'lang', 'segment_count'):
+        existing[(video_id, lang)] = count
+    changed = {key: value for key, value in latest.items() if existing.get(key) != len(value[0])}
+    if not changed:
+        return 0
+
+    now = timezone.now()
+    videos = [
+        Video(video_id=video_id, lang=lang, title=title or '', upload_date=upload_date or '',
+              segment_count=len(transcript), indexed_at=now)
+        for (video_id, lang), (transcript, title, upload_date) in changed.items()
+    ]
+    with transaction.atomic():
+        Video.objects.bulk_create(
+            videos,
+            update_conflicts=True,
+            unique_fields=['video_id', 'lang'],
+            update_fields=['title', 'upload_date', 'segment_count', 'indexed_at'],
+        )
+        if any(video.pk is None for video in videos):
+            # Banco sem RETURNING no upsert: busca as chaves
+            pks = {(video_id, lang): pk for pk, video_id, lang in Video.objects.filter(
+                video_id__in={video.video_id for video in videos}
+            ).values_list('pk', 'video_id', 'lang')}
+            for video in videos:
+                video.pk = pks[(video.video_id, video.lang)]
+
+        updated = [video.pk for video in videos if (video.video_id, video.lang) in existing]
+        if updated:
+            Segment.objects.filter(video__in=updated).delete()
+
+        rows = [
+            (video.pk, position, start, duration, text)
+            for video in videos
+            for position, (start, duration, text) in enumerate(changed[(video.video_id, video.lang)][0])
+        ]
+        if connection.vendor != 'postgresql' or _copy_segments(rows) is None:
+            Segment.objects.bulk_create(
+                (Segment(video_id=pk, position=position, start=start, duration=duration, text=text)
+                 for pk, position, start, duration, text in rows),
+                batch_size=1000,
+            )
+    return len(videos)
+
+
+class WriteError(Exception):
+    # Lotes descartados desde o último flush(); keys: {(video_id, lang)}
+    def __init__(self, keys):
+        super().__init__(f"{len(keys)} transcrições não gravadas")
+        self.keys = keys
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+        self.failed = set()
+
+
+class TranscriptWriter:
+    def __init__(self, batch_size=100, flush_interval=2.0, max_queue=1000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._queue = None
+        self._failed = set()
+        self.counters = {'videos': 0, 'batches': 0, 'errors': 0, 'waits': 0}
+
+    def _ensure_started(self):
+        # Recriado após fork (pool de processos do comando transcribe)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._thread = threading.Thread(target=self._run, name='transcript-writer', daemon=True)
+                self._thread.start()
+                # A thread é daemon: o que ainda estiver na fila é gravado na saída
+                atexit.register(self._flush_at_exit)
+            return self._queue
+
+    def put(self, video_id, lang, transcript, title=None, upload_date=None, block=False):
+        # Sem bloquear, retorna False com a fila cheia: quem chama decide
+        # esperar (fora do event loop) em vez de perder a transcrição.
+        pending = self._ensure_started()
+        try:
+            pending.put((video_id, lang, transcript, title, upload_date), block=block)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.counters['waits'] += 1
+            return False
+
+    def flush(self, timeout=None):
+        # Espera tudo o que foi enfileirado até aqui ser gravado. Retorna
+        # False se o prazo acabar; levanta WriteError se algum lote foi
+        # descartado desde o último flush(), para quem chama tentar de novo.
+        request = _FlushRequest()
+        self._ensure_started().put(request)
+        if not request.done.wait(timeout):
+            return False
+        if request.failed:
+            raise WriteError(request.failed)
+        return True
+
+    def _flush_at_exit(self):
+        try:
+            self.flush(self.flush_interval * 5)
+        except WriteError as e:
+            logger.error(f"Writer encerrado: {e}")
+
+    def _write(self, batch):
+        try:
+            with metrics.timer('persist'):
+                written = write_transcripts(batch)
+        except Exception as e:
+            # A thread precisa continuar viva: o lote é descartado, registrado
+            # e informado ao próximo flush()
+            logger.error(f"Falha ao gravar {len(batch)} transcrições: {e}")
+            self._failed.update((video_id, lang or '') for video_id, lang, *_ in batch)
+            with self._lock:
+                self.counters['errors'] += 1
+            return
+        with self._lock:
+            self.counters['videos'] += written
+            self.counters['batches'] += 1
+
+    def _run(self):
+        pending = self._queue
+        batch, waiting = [], []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = pending.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, _FlushRequest):
+                waiting.append(item)
+            elif item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or waiting or time.monotonic() >= deadline):
+                self._write(batch)
+                batch, deadline = [], None
+                # Conexão desta thread: não fica presa entre lotes espaçados
+                connection.close_if_unusable_or_obsolete()
+            if waiting:
+                for request in waiting:
+                    request.failed = set(self._failed)
+                    request.done.set()
+                self._failed.clear()
+            waiting = []
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['queued'] = self.queue_depth()
+        return stats
+
+
+transcript_writer = TranscriptWriter(
+    batch_size=settings.TRANSCRIPT_WRITER_BATCH_SIZE,
+    flush_interval=settings.TRANSCRIPT_WRITER_FLUSH_INTERVAL,
+    max_queue=settings.TRANSCRIPT_WRITER_QUEUE_SIZE,
+)
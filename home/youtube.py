@@ -0,0 +1,127 @@
+import re
+import logging
+from urllib.parse import urlparse, parse_qs
+
+from . import metrics
+from .timedtext import parse_timedtext
+
+logger = logging.getLogger(__name__)
+
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+def extract_video_id(url):
+    parsed = urlparse(url if '//' in url else f"https://{url}")
+    host = parsed.netloc.lower()
+    candidate = None
+    if host.endswith('youtu.be'):
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif 'youtube' in host:
+        query = parse_qs(parsed.query)
+        if 'v' in query:
+            candidate = query['v'][0]
+        else:
+            parts = [p for p in parsed.path.split('/') if p]
+            if len(parts) >= 2 and parts[0] in ('shorts', 'embed', 'live', 'v'):
+                candidate = parts[1]
+    if candidate and VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+def canonical_video_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+TRACK_KINDS = ('asr', 'manual')
+# Códigos de idioma do YouTube ('pt', 'pt-BR', 'zh-Hant') cabem folgados
+MAX_LANG_CODE = 16
+
+def parse_track_spec(spec):
+    # 'pt', 'pt:asr', 'en:manual' ou só 'asr'/'manual' -> (idioma, tipo);
+    # 'asr' são as legendas automáticas
+    if not spec:
+        return None, None
+    code, _, kind = spec.partition(':')
+    if not kind and code in TRACK_KINDS:
+        code, kind = '', code
+    if kind and kind not in TRACK_KINDS:
+        raise ValueError(f"Tipo de legenda desconhecido: {kind}")
+    if len(code) > MAX_LANG_CODE:
+        raise ValueError(f"Código de idioma longo demais: {code[:MAX_LANG_CODE]}...")
+    return code or None, kind or None
+
+def parse_track_specs(value):
+    # 'pt, en:asr' (ou lista, cujos itens também podem vir separados por
+    # vírgula, como no campo do formulário) -> faixas pedidas, sem repetir;
+    # [None] = padrão
+    if isinstance(value, str):
+        value = [value]
+    specs = []
+    for item in value or ():
+        for spec in (item or '').split(','):
+            spec = spec.strip() or None
+            if spec:
+                parse_track_spec(spec)
+            if spec not in specs:
+                specs.append(spec)
+    return [spec for spec in specs if spec] or [None]
+
+def track_kind(track):
+    return 'asr' if track.get('kind') == 'asr' else 'manual'
+
+def track_key(lang, kind):
+    # Faixa resolvida, como é gravada no banco: 'pt' (manual) ou 'pt:asr'.
+    # Pedir '' ou 'pt' e receber a mesma faixa dá a mesma linha.
+    return f"{lang or ''}:asr" if kind == 'asr' else (lang or '')
+
+def select_caption_track(caption_tracks, lang=None):
+    if not caption_tracks:
+        return None
+    if not lang:
+        return caption_tracks[0]
+    code, kind = parse_track_spec(lang)
+    for track in caption_tracks:
+        if code and track.get('languageCode') != code:
+            continue
+        if kind and track_kind(track) != kind:
+            continue
+        return track
+    logger.error(f"Nenhuma transcrição '{lang}' para este vídeo.")
+    return None
+
+def parse_transcript_xml(content):
+    with metrics.timer('xml_parse'):
+        return parse_timedtext(content)
+
+def iter_channel_video_ids(channel_url):
+    # Listagem preguiçosa (mais recentes primeiro): com process=False o
+    # youtube_dl só busca a próxima página quando o gerador avança.
+    import youtube_dl
+
+    ydl_opts = {
+        'quiet': True,
+        'extract_flat': True,
+        'skip_download': True
+    }
+
+    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+        result = ydl.extract_info(channel_url, download=False, process=False)
+        # /@canal etc. redirecionam para a aba de vídeos
+        for _ in range(3):
+            if result.get('_type') not in ('url', 'url_transparent'):
+                break
+            result = ydl.extract_info(result['url'], download=False, process=False, ie_key=result.get('ie_key'))
+        for entry in result.get('entries') or []:
+            video_id = entry.get('id') or extract_video_id(entry.get('url', ''))
+            if video_id:
+                yield video_id
+
+def iter_playlist_video_ids(playlist_url):
+    # Mesma listagem preguiçosa dos canais, na ordem da playlist
+    return iter_channel_video_ids(playlist_url)
+
+def is_channel_url(url):
+    return '/channel/' in url or '/@' in url or '/c/' in url or '/user/' in url
+
+def is_playlist_url(url):
+    # watch?v=X&list=Y é o vídeo X; só /playlist?list=Y é a playlist
+    parsed = urlparse(url if '//' in url else f"https://{url}")
+    return 'youtube' in parsed.netloc.lower() and parsed.path.rstrip('/') == '/playlist' and 'list' in parse_qs(parsed.query)
@@ -12,5 +12,24 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yt_transcription.settings")
+# Sob ASGI a página principal usa a view assíncrona (home/views.py)
+os.environ.setdefault("ASYNC_VIEWS", "true")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from home.http_client import close_shared_async_client  # noqa: E402 (depois do setup do Django)
+
+
+async def application(scope, receive, send):
+    # O Django não trata o "lifespan" do ASGI; aqui ele serve para fechar,
+    # no desligamento, o cliente HTTP compartilhado do event loop do servidor
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_shared_async_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
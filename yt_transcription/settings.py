@@ -89,9 +89,108 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Cache compartilhado de transcrições (entre workers e reinícios). A
+    # gravação não varre o diretório; a limpeza roda à parte, com
+    # `manage.py prunecache` (cron ou --interval)
+    'transcripts': {
+        'BACKEND': 'home.cache_backends.UnculledFileBasedCache',
+        'LOCATION': os.environ.get('TRANSCRIPT_CACHE_DIR', os.path.join(BASE_DIR, 'media', 'transcript_cache')),
+        'TIMEOUT': int(os.environ.get('TRANSCRIPT_CACHE_SHARED_TTL', '86400')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('TRANSCRIPT_CACHE_MAX_ENTRIES', '100000')),
+        },
+    },
 }
 
+TRANSCRIPT_CACHE_SIZE = int(os.environ.get('TRANSCRIPT_CACHE_SIZE', '1024'))
+TRANSCRIPT_CACHE_TTL = int(os.environ.get('TRANSCRIPT_CACHE_TTL', '3600'))
+TRANSCRIPT_CACHE_SHARED_TTL = int(os.environ.get('TRANSCRIPT_CACHE_SHARED_TTL', '86400'))
+# Lista de legendas por vídeo: vale até o vencimento dos baseUrl assinados
+MANIFEST_CACHE_SIZE = int(os.environ.get('MANIFEST_CACHE_SIZE', '4096'))
+MANIFEST_CACHE_MAX_TTL = int(os.environ.get('MANIFEST_CACHE_MAX_TTL', '21600'))
+MANIFEST_CACHE_MARGIN = int(os.environ.get('MANIFEST_CACHE_MARGIN', '300'))
+
+# Engine assíncrono de download (home/engine.py)
+TRANSCRIPT_FETCH_CONCURRENCY = int(os.environ.get('TRANSCRIPT_FETCH_CONCURRENCY', '32'))
+TRANSCRIPT_FETCH_PER_HOST = int(os.environ.get('TRANSCRIPT_FETCH_PER_HOST', '16'))
+
+# Coalescência de fetches do mesmo vídeo (home/singleflight.py); o lock
+# compartilhado é um arquivo por vídeo, criado com O_EXCL, para coordenar
+# os processos da máquina
+SINGLEFLIGHT_SHARED_LOCK = os.environ.get('SINGLEFLIGHT_SHARED_LOCK', 'true').lower() == 'true'
+SINGLEFLIGHT_LOCK_DIR = os.environ.get('SINGLEFLIGHT_LOCK_DIR', os.path.join(BASE_DIR, 'media', 'singleflight'))
+SINGLEFLIGHT_LOCK_TTL = int(os.environ.get('SINGLEFLIGHT_LOCK_TTL', '60'))
+
+# Controle adaptativo do upstream (home/throttle.py)
+UPSTREAM_CONCURRENCY_INITIAL = int(os.environ.get('UPSTREAM_CONCURRENCY_INITIAL', '8'))
+UPSTREAM_CONCURRENCY_MIN = int(os.environ.get('UPSTREAM_CONCURRENCY_MIN', '1'))
+UPSTREAM_CONCURRENCY_MAX = int(os.environ.get('UPSTREAM_CONCURRENCY_MAX', str(TRANSCRIPT_FETCH_CONCURRENCY)))
+UPSTREAM_LATENCY_TARGET = float(os.environ.get('UPSTREAM_LATENCY_TARGET', '2.0'))
+UPSTREAM_RATE_PER_HOST = float(os.environ.get('UPSTREAM_RATE_PER_HOST', '20'))
+UPSTREAM_BURST_PER_HOST = int(os.environ.get('UPSTREAM_BURST_PER_HOST', '40'))
+UPSTREAM_MAX_RETRIES = int(os.environ.get('UPSTREAM_MAX_RETRIES', '3'))
+UPSTREAM_RETRY_BASE = float(os.environ.get('UPSTREAM_RETRY_BASE', '0.5'))
+UPSTREAM_RETRY_MAX = float(os.environ.get('UPSTREAM_RETRY_MAX', '30'))
+
+# Expansão simultânea de canais/playlists antes do fetch (home/resolver.py)
+RESOLVER_WORKERS = int(os.environ.get('RESOLVER_WORKERS', '8'))
+
+# Jobs em segundo plano (home/jobs.py)
+TRANSCRIPTION_JOB_WORKERS = int(os.environ.get('TRANSCRIPTION_JOB_WORKERS', '2'))
+# Job pendente/em andamento sem progresso por tanto tempo (de outro nó) é
+# dado como órfão; os arquivos prontos são apagados depois do TTL
+TRANSCRIPTION_JOB_STALE_AFTER = int(os.environ.get('TRANSCRIPTION_JOB_STALE_AFTER', '3600'))
+TRANSCRIPTION_JOB_ARTIFACT_TTL = int(os.environ.get('TRANSCRIPTION_JOB_ARTIFACT_TTL', str(7 * 86400)))
+TRANSCRIPTION_JOB_MAINTENANCE_INTERVAL = int(os.environ.get('TRANSCRIPTION_JOB_MAINTENANCE_INTERVAL', '600'))
+
+# Fila de trabalho no banco para `manage.py worker` (home/workqueue.py)
+WORK_QUEUE_BATCH = int(os.environ.get('WORK_QUEUE_BATCH', '50'))
+WORK_QUEUE_LEASE = int(os.environ.get('WORK_QUEUE_LEASE', '120'))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.environ.get('WORK_QUEUE_MAX_ATTEMPTS', '5'))
+WORK_QUEUE_RETRY_DELAY = float(os.environ.get('WORK_QUEUE_RETRY_DELAY', '30'))
+
+# Cliente HTTP compartilhado (home/http_client.py)
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', str(TRANSCRIPT_FETCH_CONCURRENCY)))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '30'))
+
+# Fonte padrão de título/data/legendas (home/metadata.py): 'player_api'
+# busca só o JSON do player; 'watch_page' baixa a página HTML inteira e é
+# sempre usada como fallback
+METADATA_SOURCE = os.environ.get('METADATA_SOURCE', 'player_api')
+YOUTUBE_PLAYER_API_URL = os.environ.get('YOUTUBE_PLAYER_API_URL', 'https://www.youtube.com/youtubei/v1/player')
+YOUTUBE_PLAYER_API_CLIENT = os.environ.get('YOUTUBE_PLAYER_API_CLIENT', 'ANDROID')
+YOUTUBE_PLAYER_API_CLIENT_VERSION = os.environ.get('YOUTUBE_PLAYER_API_CLIENT_VERSION', '20.10.38')
+YOUTUBE_PLAYER_API_HL = os.environ.get('YOUTUBE_PLAYER_API_HL', 'pt')
+
+# Transcrições buscadas são gravadas como segmentos e indexadas para a
+# busca em /search/ (home/search.py)
+TRANSCRIPT_INDEX_ENABLED = os.environ.get('TRANSCRIPT_INDEX_ENABLED', 'true').lower() == 'true'
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', '20'))
+# Writer em lote (home/writer.py): grava a cada N vídeos ou N segundos
+TRANSCRIPT_WRITER_BATCH_SIZE = int(os.environ.get('TRANSCRIPT_WRITER_BATCH_SIZE', '100'))
+TRANSCRIPT_WRITER_FLUSH_INTERVAL = float(os.environ.get('TRANSCRIPT_WRITER_FLUSH_INTERVAL', '2'))
+TRANSCRIPT_WRITER_QUEUE_SIZE = int(os.environ.get('TRANSCRIPT_WRITER_QUEUE_SIZE', '1000'))
+
+# Prazos do engine: por download (inclui novas tentativas e hedge) e, se
+# > 0, para a execução inteira. Vídeos fora do prazo saem como "tempo esgotado".
+TRANSCRIPT_STAGE_TIMEOUT = float(os.environ.get('TRANSCRIPT_STAGE_TIMEOUT', '30'))
+TRANSCRIPT_JOB_BUDGET = float(os.environ.get('TRANSCRIPT_JOB_BUDGET', '0'))
+# Hedge (home/hedging.py): cópia da requisição acima do percentil recente
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'true').lower() == 'true'
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', '0.1'))
+HEDGE_MAX_RATIO = float(os.environ.get('HEDGE_MAX_RATIO', '0.1'))
+
+# View assíncrona na página principal; ligada por padrão em asgi.py
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'false').lower() == 'true'
+
+# Métricas por etapa (home/metrics.py, exposto em /metrics/). O resumo por
+# requisição registra no log o tempo de cada etapa ao final do download/job.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_REQUEST_SUMMARY = os.environ.get('METRICS_REQUEST_SUMMARY', 'false').lower() == 'true'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {